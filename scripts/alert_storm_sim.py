@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Simulate alert storms through the per-card alert aggregation window
+(app.services.alert_window).
+
+Runs --seconds of simulated time on a simulated clock: background traffic
+of --tps transactions over --cards cards with a --false-positive rate of
+flagged transactions, plus --attacks card attacks starting at random times,
+each flagging --attack-tx transactions of one card over --attack-seconds.
+Optionally a --flood of distinct flagged cards in one second exercises the
+ALERT_WINDOW_MAX_KEYS bound.
+
+Every flagged transaction is offered to an AlertAggregator and closed
+windows are collected every ALERT_WINDOW_FLUSH_SECONDS, as the API does.
+Reports alert writes and /ws broadcasts without aggregation (one per flagged
+transaction) and with it (one per window, plus one update per window that
+merged alerts), the peak number of open windows and evictions.
+"""
+
+import argparse
+import heapq
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.config import settings  # noqa: E402
+from app.services.alert_window import DEFAULT_REASON, AlertAggregator  # noqa: E402
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def flagged_events(args, rng):
+    """(time, card_id, p_fraud) of every flagged transaction, in time order"""
+    events = []
+    for _ in range(int(args.seconds * args.tps * args.false_positive)):
+        events.append((rng.uniform(0, args.seconds), f"card_{rng.randrange(args.cards)}", rng.uniform(0.7, 0.9)))
+    for attack in range(args.attacks):
+        start = rng.uniform(0, max(args.seconds - args.attack_seconds, 0))
+        card_id = f"attacked_{attack}"
+        for _ in range(args.attack_tx):
+            events.append((start + rng.uniform(0, args.attack_seconds), card_id, rng.uniform(0.75, 0.99)))
+    if args.flood:
+        start = rng.uniform(0, args.seconds - 1)
+        for card in range(args.flood):
+            events.append((start + card / args.flood, f"flood_{card}", 0.8))
+    heapq.heapify(events)
+    return [heapq.heappop(events) for _ in range(len(events))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=3600.0, help='simulated time')
+    parser.add_argument('--tps', type=float, default=2000.0, help='background transactions per second')
+    parser.add_argument('--cards', type=int, default=1_000_000)
+    parser.add_argument('--false-positive', type=float, default=0.001, help='flagged fraction of background traffic')
+    parser.add_argument('--attacks', type=int, default=200)
+    parser.add_argument('--attack-tx', type=int, default=150, help='flagged transactions per attacked card')
+    parser.add_argument('--attack-seconds', type=float, default=300.0, help='duration of an attack')
+    parser.add_argument('--flood', type=int, default=0, help='distinct flagged cards in one second')
+    parser.add_argument('--window-seconds', type=float, default=settings.ALERT_WINDOW_SECONDS)
+    parser.add_argument('--max-keys', type=int, default=settings.ALERT_WINDOW_MAX_KEYS)
+    parser.add_argument('--flush-seconds', type=float, default=settings.ALERT_WINDOW_FLUSH_SECONDS)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    events = flagged_events(args, random.Random(args.seed))
+    clock = SimulatedClock()
+    aggregator = AlertAggregator(args.window_seconds, args.max_keys, clock=clock)
+    emitted = updates = peak_windows = 0
+    next_flush = args.flush_seconds
+    for tx_id, (t, card_id, p_fraud) in enumerate(events):
+        while next_flush <= t:
+            clock.now = next_flush
+            updates += len(aggregator.due())
+            next_flush += args.flush_seconds
+        clock.now = t
+        emitted += aggregator.offer(card_id, DEFAULT_REASON, tx_id, p_fraud)
+        peak_windows = max(peak_windows, aggregator.stats()["open_windows"])
+    updates += len(aggregator.drain())
+
+    flagged = len(events)
+    writes = emitted + updates
+    stats = aggregator.stats()
+    print(f"🚨 {flagged:,} flagged transactions in {args.seconds:,.0f}s: {args.attacks} attacks of "
+          f"{args.attack_tx} over {args.attack_seconds:.0f}s, background {args.false_positive:.2%} of "
+          f"{args.tps:,.0f} tps" + (f", flood of {args.flood:,} cards" if args.flood else ""))
+    print(f"   without window:   {flagged:>10,} alert writes   {flagged:>10,} broadcasts")
+    print(f"   {args.window_seconds:>4.0f}s window:     {writes:>10,} alert writes   {writes:>10,} broadcasts "
+          f"({emitted:,} new + {updates:,} updates)")
+    saved = flagged - writes
+    print(f"   saved {saved:,} writes and broadcasts ({saved / flagged:.1%})" if flagged else "   nothing flagged")
+    print(f"🪟 peak {peak_windows:,} open windows (max {args.max_keys:,}), {stats['evicted']:,} closed early")
+    print("✅ done")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark the analyst alert queue (app.services.alert_service).
+
+Seeds --alerts OPEN alerts (and --assigned per analyst) into the configured
+DATABASE_URL, loads them into an AlertService and compares:
+
+1. "next alert": the in-memory heap against the Postgres fallback (one
+   idx_alerts_status_severity lookup per severity);
+2. "my queue": the per-analyst index against the Postgres query;
+3. claims: --claims "next alert" claims through the queue (one conditional
+   UPDATE each) against the fallback (locked SELECT per severity + UPDATE).
+
+Then changes rows behind the service's back (a new alert, a resolved one)
+and checks that one sync brings the queue up to date. The seeded rows use
+tx_ids from --first-id and are deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import func
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.database import Alert, Transaction  # noqa: E402
+from app.services.alert_service import AlertService, assigned_from_db, next_open_from_db  # noqa: E402
+from app.services.outbox import alert_severity  # noqa: E402
+
+
+def seed(args):
+    rng = random.Random(7)
+    db = SessionLocal()
+    try:
+        cleanup(db, args)
+        start = datetime.utcnow() - timedelta(hours=6)
+        total = args.alerts + args.analysts * args.assigned
+        db.bulk_insert_mappings(Transaction, [
+            {"id": tx_id, "ts": start, "card_id": f"card_{tx_id % 20000}", "merchant_id": "merchant_1",
+             "amount": 42.0, "mcc": "5411"} for tx_id in range(args.first_id, args.first_id + total)
+        ])
+        alerts = []
+        for i, tx_id in enumerate(range(args.first_id, args.first_id + total)):
+            p_fraud = rng.uniform(0.7, 1.0)
+            assigned = i >= args.alerts
+            alerts.append({
+                "tx_id": tx_id, "card_id": f"card_{tx_id % 20000}", "severity": alert_severity(p_fraud),
+                "reason": "bench", "status": "ASSIGNED" if assigned else "OPEN",
+                "assigned_to": f"analyst_{i % args.analysts}" if assigned else None,
+                "alert_count": 1, "max_p_fraud": p_fraud,
+                "created_at": start + timedelta(seconds=rng.randint(0, 6 * 3600))
+            })
+        db.bulk_insert_mappings(Alert, alerts)
+        db.commit()
+    finally:
+        db.close()
+
+
+def cleanup(db, args):
+    db.query(Alert).filter(Alert.tx_id >= args.first_id).delete(synchronize_session=False)
+    db.query(Transaction).filter(Transaction.id >= args.first_id).delete(synchronize_session=False)
+    db.commit()
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.percentile(times, [50, 99]) * 1e6
+
+
+def with_db(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.rollback()
+        db.close()
+
+
+async def claims(label, service, args):
+    start = time.perf_counter()
+    claimed = []
+    for i in range(args.claims):
+        alert = await service.claim_next(f"claimer_{i % args.analysts}")
+        claimed.append(alert["id"])
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<10} {args.claims / elapsed:>8,.0f} claims/s   "
+          f"{elapsed / args.claims * 1e3:.2f}ms per claim")
+    return claimed
+
+
+async def main_async(args):
+    Base.metadata.create_all(bind=engine)
+    print(f"🌱 seeding {args.alerts:,} open alerts and {args.assigned} assigned to each of {args.analysts} analysts")
+    seed(args)
+
+    service = AlertService(SessionLocal)
+    start = time.perf_counter()
+    await service.sync()
+    print(f"📥 loaded {len(service.queue):,} alerts in {time.perf_counter() - start:.2f}s")
+
+    p50, p99 = timed(service.queue.peek, args.repeat)
+    print(f"⏭️  next alert   memory   p50 {p50:8.1f}µs   p99 {p99:8.1f}µs")
+    p50, p99 = timed(lambda: with_db(next_open_from_db), args.repeat)
+    print(f"               postgres p50 {p50:8.1f}µs   p99 {p99:8.1f}µs")
+    p50, p99 = timed(lambda: service.queue.assigned("analyst_0", 50), args.repeat)
+    print(f"📋 my queue     memory   p50 {p50:8.1f}µs   p99 {p99:8.1f}µs")
+    p50, p99 = timed(lambda: with_db(assigned_from_db, "analyst_0"), args.repeat)
+    print(f"               postgres p50 {p50:8.1f}µs   p99 {p99:8.1f}µs")
+
+    expected = [alert.id for alert in sorted(
+        (a for a in service.queue.alerts.values() if a.status == "OPEN"), key=lambda a: a.key
+    )[:args.claims]]
+    print(f"🙋 {args.claims} claims each")
+    claimed = await claims("memory", service, args)
+    service.synced_at = None
+    claimed += await claims("postgres", service, args)
+    await service.sync()
+    in_order = claimed[:args.claims] == expected
+    print(f"   claimed in priority order: {'yes' if in_order else 'NO'}, "
+          f"{len(set(claimed))} distinct of {len(claimed)}")
+
+    db = SessionLocal()
+    resolved = service.queue.peek().id
+    db.query(Alert).filter(Alert.id == resolved).update({Alert.status: "RESOLVED", Alert.updated_at: func.now()})
+    db.add(Alert(tx_id=args.first_id, card_id="card_new", severity="CRITICAL", reason="bench", status="OPEN",
+                 max_p_fraud=1.0))
+    db.commit()
+    db.close()
+    await service.sync()
+    top = service.queue.peek()
+    synced = resolved not in service.queue.alerts and top.card_id == "card_new"
+    print(f"🔄 external resolve and insert visible after one sync: {'yes' if synced else 'NO'}")
+    print(f"   {service.stats()}")
+
+    db = SessionLocal()
+    cleanup(db, args)
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--alerts', type=int, default=100_000)
+    parser.add_argument('--analysts', type=int, default=50)
+    parser.add_argument('--assigned', type=int, default=20, help='alerts assigned to each analyst')
+    parser.add_argument('--claims', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--first-id', type=int, default=60_000_000, help='tx_ids used by the run')
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+    print("✅ done")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark the sync-Session-plus-executor DB path against the native async path.
+
+Drives the DB-bound part of feature generation (device, merchant and risk
+features: the pre-built hot-path statements) through FeatureService at
+several concurrency levels, once with sync Sessions on the bounded DB
+executor and once with AsyncSessions on asyncpg. Reports throughput, request
+latency percentiles and event-loop lag for each run.
+
+Uses DATABASE_URL / ASYNC_DATABASE_URL from the API settings; --seed creates
+the tables and a small synthetic data set first.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.core.executor import LoopLagMonitor, run_db  # noqa: E402
+from app.database import AsyncSessionLocal, Base, SessionLocal, dispose_async_engine, engine  # noqa: E402
+from app.models.database import Card, Device, Merchant, Transaction  # noqa: E402
+from app.models.schemas import TransactionRequest  # noqa: E402
+from app.services.feature_service import FeatureService  # noqa: E402
+
+
+def seed(cards, merchants, devices, transactions):
+    """Create tables and insert synthetic entities if the cards table is empty"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(Card).first() is not None:
+            print("ℹ️  Data already present, skipping seed")
+            return
+        rng = random.Random(7)
+        db.bulk_insert_mappings(Card, [
+            {"id": f"card_{i}", "account_id": f"acct_{i}", "age_days": rng.randint(1, 2000),
+             "home_country": "US", "home_city": "New York"} for i in range(cards)
+        ])
+        db.bulk_insert_mappings(Merchant, [
+            {"id": f"merchant_{i}", "mcc": rng.choice(["5411", "5812", "7995"]),
+             "risk_bucket": rng.choice(["LOW", "MEDIUM", "HIGH"])} for i in range(merchants)
+        ])
+        db.bulk_insert_mappings(Device, [
+            {"id": f"device_{i}", "is_vpn": rng.random() < 0.05} for i in range(devices)
+        ])
+        start = datetime.utcnow() - timedelta(days=30)
+        db.bulk_insert_mappings(Transaction, [
+            {"ts": start + timedelta(seconds=rng.randint(0, 30 * 86400)),
+             "card_id": f"card_{rng.randrange(cards)}", "merchant_id": f"merchant_{rng.randrange(merchants)}",
+             "amount": round(rng.lognormvariate(3.5, 1.0), 2), "mcc": "5411",
+             "device_id": f"device_{rng.randrange(devices)}"} for _ in range(transactions)
+        ])
+        db.commit()
+        print(f"🌱 Seeded {cards} cards, {merchants} merchants, {devices} devices, {transactions} transactions")
+    finally:
+        db.close()
+
+
+def make_transaction(i, args):
+    rng = random.Random(i)
+    return TransactionRequest(
+        id=i,
+        timestamp=datetime.utcnow(),
+        card_id=f"card_{rng.randrange(args.cards)}",
+        merchant_id=f"merchant_{rng.randrange(args.merchants)}",
+        amount=round(rng.lognormvariate(3.5, 1.0), 2) + 0.01,
+        mcc="5411",
+        device_id=f"device_{rng.randrange(args.devices)}"
+    )
+
+
+async def db_features(feature_service, transaction, db):
+    await feature_service._get_device_features(transaction, db)
+    await feature_service._get_merchant_features(transaction, db)
+    await feature_service._get_risk_features(transaction, db)
+
+
+async def run(use_async, concurrency, args):
+    feature_service = FeatureService()
+    monitor = LoopLagMonitor(interval_ms=10, warn_ms=float('inf'))
+    monitor.start()
+
+    latencies = []
+    remaining = iter(range(args.requests))
+
+    async def worker():
+        for i in remaining:
+            transaction = make_transaction(i, args)
+            started = time.perf_counter()
+            if use_async:
+                async with AsyncSessionLocal() as db:
+                    await db_features(feature_service, transaction, db)
+            else:
+                db = SessionLocal()
+                try:
+                    await db_features(feature_service, transaction, db)
+                finally:
+                    await run_db(db.close)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    lag = monitor.stats()
+    await monitor.stop()
+    await dispose_async_engine()
+    return np.array(latencies), elapsed, lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=str, default='50,200,1000')
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--cards', type=int, default=10000)
+    parser.add_argument('--merchants', type=int, default=2000)
+    parser.add_argument('--devices', type=int, default=8000)
+    parser.add_argument('--transactions', type=int, default=200000)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.cards, args.merchants, args.devices, args.transactions)
+
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        for use_async in (False, True):
+            latencies, elapsed, lag = asyncio.run(run(use_async, concurrency, args))
+            label = "⚡ async (asyncpg)" if use_async else "🧵 sync + DB executor"
+            print(f"\n{label} concurrency={concurrency} ({args.requests} requests)")
+            print(f"   throughput={len(latencies) / elapsed:8.1f} req/s  "
+                  f"p50={np.percentile(latencies, 50):7.2f}ms  p99={np.percentile(latencies, 99):7.2f}ms")
+            print(f"   loop lag p99={lag['p99_ms']:.2f}ms  max={lag['max_ms']:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot-path cost of recording metrics (app.core.metrics).
+
+Times `child.observe_since(start)` for a plain histogram child and for a
+windowed one (STAGE_SECONDS, which also feeds the sliding-window
+percentiles of app.core.slo), alternating the two so both see the same
+machine noise, and the periodic flush of one window series. Reports the
+best of --repeat runs of --number calls.
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+from time import monotonic, perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.core.metrics import HISTOGRAM, STAGE_SECONDS, Metric  # noqa: E402
+from app.core.slo import latency_tracker  # noqa: E402
+
+
+def per_call(stmt, args) -> float:
+    """µs per call of `stmt` over --number calls"""
+    return timeit.timeit(stmt, globals=globals(), number=args.number) / args.number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    plain = Metric(HISTOGRAM, "bench_plain_seconds", "Benchmark", ["stage"]).labels("bench")
+    windowed = STAGE_SECONDS.labels("bench")
+    baseline = min(per_call("perf_counter()", args) for _ in range(args.repeat))
+    results = {"plain": float("inf"), "windowed": float("inf")}
+    for _ in range(args.repeat):
+        for name, child in (("plain", plain), ("windowed", windowed)):
+            globals()["child"] = child
+            results[name] = min(results[name], per_call("child.observe_since(perf_counter())", args))
+
+    print(f"⏱️  perf_counter() alone          {baseline:.3f}µs")
+    for name, cost in results.items():
+        print(f"   {name:<8} observe_since()    {cost:.3f}µs  ({cost - baseline:.3f}µs without perf_counter)")
+
+    series = latency_tracker.series("stage", "bench")
+    globals()["series"] = series
+    flush = min(timeit.repeat("series.flush(monotonic())", globals=globals(), number=1000, repeat=5)) / 1000 * 1e6
+    print(f"🪣 flushing one window series      {flush:.1f}µs (every SLO_FLUSH_SECONDS)")
+    print("✅ done")
+
+
+if __name__ == '__main__':
+    main()
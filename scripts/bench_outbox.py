@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark the transactional outbox (app.services.outbox, app.workers.outbox_relay).
+
+1. Writes: --requests scored transactions from --concurrency concurrent
+   requests, each writing a Decision, an Alert for one in --alert-every and
+   their outbox messages, against the configured DATABASE_URL. Once with a
+   commit per request (the previous behaviour) and once through the
+   DecisionWriter group commit. Reports requests per second, commits and
+   p50 / p99 time to durable.
+2. Relay: publishes the outbox rows written above with OutboxRelay to the
+   in-memory broker stand-in of bench_stream_inference.py (--ack-ms per
+   flush, --compression), and reports rows per second, rows per round and
+   compression ratio.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.config import settings  # noqa: E402
+from app.core.executor import run_db  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.database import OutboxEvent  # noqa: E402
+from app.services.outbox import (  # noqa: E402
+    DecisionRows, DecisionWriter, alert_message, alert_severity, decision_message, outbox_row, write_rows
+)
+from app.workers.outbox_relay import OutboxRelay  # noqa: E402
+from bench_stream_inference import InMemoryBroker, StandInProducer  # noqa: E402
+
+
+def make_rows(tx_id, args):
+    p_fraud = 0.9 if tx_id % args.alert_every == 0 else 0.1
+    card_id = f"card_{tx_id % 5000}"
+    scored_at = datetime.utcnow().isoformat()
+    rows = DecisionRows({
+        "tx_id": tx_id, "p_fraud": p_fraud, "score": p_fraud, "model_version": settings.MODEL_VERSION,
+        "route": "production", "explanation_json": {"component_scores": {"lgbm": p_fraud}}
+    })
+    rows.events.append(outbox_row(settings.INFERENCE_DECISIONS_TOPIC, card_id, decision_message(
+        tx_id, card_id, p_fraud, p_fraud, p_fraud > 0.7, settings.MODEL_VERSION, {"lgbm": p_fraud}, scored_at
+    )))
+    if p_fraud > 0.7:
+        rows.alerts.append({"tx_id": tx_id, "severity": alert_severity(p_fraud), "reason": "bench", "status": "OPEN"})
+        rows.events.append(outbox_row(settings.INFERENCE_ALERTS_TOPIC, card_id, alert_message(
+            tx_id, card_id, "merchant_1", "5411", "US", 42.0, p_fraud, settings.MODEL_VERSION, scored_at
+        )))
+    return rows
+
+
+async def per_request(tx_id, args):
+    def commit():
+        db = SessionLocal()
+        try:
+            write_rows(db, [make_rows(tx_id, args)])
+        finally:
+            db.close()
+    await run_db(commit)
+
+
+async def run_writes(label, write, first_id, args):
+    queue = asyncio.Queue()
+    for tx_id in range(first_id, first_id + args.requests):
+        queue.put_nowait(tx_id)
+    waits = []
+
+    async def client():
+        while not queue.empty():
+            tx_id = queue.get_nowait()
+            start = time.perf_counter()
+            await write(tx_id)
+            waits.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    p50, p99 = np.percentile(waits, [50, 99]) * 1000
+    print(f"   {label:<22} {args.requests / elapsed:>8,.0f} req/s   p50 {p50:6.2f}ms   p99 {p99:6.2f}ms", end="")
+
+
+async def main_async(args):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.query(OutboxEvent).delete()
+    db.commit()
+    db.close()
+
+    print(f"📝 {args.requests} requests, concurrency {args.concurrency}, one alert per {args.alert_every}")
+    await run_writes("commit per request", lambda tx_id: per_request(tx_id, args), args.first_id, args)
+    print(f"   {args.requests} commits")
+
+    writer = DecisionWriter(SessionLocal)
+    writer.start()
+    await run_writes("group commit", lambda tx_id: writer.write(make_rows(tx_id, args)),
+                     args.first_id + args.requests, args)
+    await writer.stop()
+    stats = writer.stats()
+    print(f"   {stats['commits']} commits, avg batch {stats['avg_batch']}, max {stats['max_batch']}")
+
+    broker = InMemoryBroker()
+    producer = StandInProducer(broker, args.partitions, args.ack_ms, args.compression)
+    relay = OutboxRelay(lambda: producer, SessionLocal, batch_size=args.relay_batch, idle_ms=0)
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    published = 0
+    while True:
+        count = await loop.run_in_executor(None, relay.relay_once)
+        if not count:
+            break
+        published += count
+    elapsed = time.perf_counter() - started
+    ratio = producer.bytes_in / producer.bytes_out if producer.bytes_out else 1.0
+    print(f"📤 relay: {published} rows in {elapsed:.2f}s = {published / elapsed:,.0f} rows/s, "
+          f"{relay.stats.rounds} rounds, compression {ratio:.1f}x (ack {args.ack_ms:.0f}ms, {args.compression})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--alert-every', type=int, default=20)
+    parser.add_argument('--first-id', type=int, default=50_000_000, help='tx_ids used by the run')
+    parser.add_argument('--relay-batch', type=int, default=settings.OUTBOX_RELAY_BATCH_SIZE)
+    parser.add_argument('--partitions', type=int, default=6)
+    parser.add_argument('--ack-ms', type=float, default=5.0, help='broker round trip per producer flush')
+    parser.add_argument('--compression', choices=['gzip', 'zlib', 'none'], default='gzip')
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+    print("✅ done")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark hedged Redis reads against local primary/replica stand-ins.
+
+The stand-ins answer GET/ZRANGEBYSCORE after a short random delay and, with
+a small probability, stall for much longer (GC pause, slow command, noisy
+neighbour). Runs the same read load through RedisClient with and without
+hedging and reports latency percentiles together with how often hedges fired
+and how often the replica answer won.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.utils.redis_client import HedgeStats, LatencyWindow, RedisClient  # noqa: E402
+
+
+class StandInRedis:
+    """In-process Redis stand-in with a heavy-tailed latency distribution"""
+
+    def __init__(self, base_ms, stall_probability, stall_ms, seed):
+        self.base_ms = base_ms
+        self.stall_probability = stall_probability
+        self.stall_ms = stall_ms
+        self.random = random.Random(seed)
+        self.data = {}
+
+    async def _delay(self):
+        delay = self.random.expovariate(1.0 / self.base_ms)
+        if self.random.random() < self.stall_probability:
+            delay += self.stall_ms
+        await asyncio.sleep(delay / 1000.0)
+
+    async def get(self, key):
+        await self._delay()
+        return self.data.get(key)
+
+    async def zrangebyscore(self, key, low, high):
+        await self._delay()
+        return []
+
+
+async def run(hedging, args):
+    primary = StandInRedis(args.base_ms, args.stall_probability, args.stall_ms, seed=1)
+    replica = StandInRedis(args.base_ms, args.stall_probability, args.stall_ms, seed=2)
+    stats = HedgeStats()
+    client = RedisClient(primary=primary, replica=replica, hedging=hedging,
+                         latency=LatencyWindow(args.percentile), stats=stats)
+
+    latencies = []
+    timeouts = 0
+    remaining = iter(range(args.reads))
+
+    async def worker():
+        nonlocal timeouts
+        for i in remaining:
+            started = time.perf_counter()
+            try:
+                await client.get_count_in_window(f"velocity:count:card_{i % 1000}:5m", 300)
+            except asyncio.TimeoutError:
+                timeouts += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return np.array(latencies), timeouts, stats, client.hedge_delay()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--reads', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--base-ms', type=float, default=0.5)
+    parser.add_argument('--stall-probability', type=float, default=0.02)
+    parser.add_argument('--stall-ms', type=float, default=15.0)
+    parser.add_argument('--percentile', type=float, default=95.0)
+    args = parser.parse_args()
+
+    for hedging in (False, True):
+        latencies, timeouts, stats, delay = asyncio.run(run(hedging, args))
+        label = "🪝 Hedged reads" if hedging else "📖 Primary only"
+        print(f"\n{label} ({args.reads} reads, concurrency {args.concurrency})")
+        print(f"   p50={np.percentile(latencies, 50):.2f}ms  p99={np.percentile(latencies, 99):.2f}ms  "
+              f"p99.9={np.percentile(latencies, 99.9):.2f}ms  timeouts={timeouts}")
+        if hedging:
+            summary = stats.to_dict(delay)
+            print(f"   hedge delay={summary['current_hedge_delay_ms']:.2f}ms  "
+                  f"fired={summary['hedges_fired']} ({summary['hedge_fire_rate'] * 100:.1f}%)  "
+                  f"won={summary['hedges_won']} ({summary['hedge_win_rate'] * 100:.1f}% of fired)")
+
+
+if __name__ == '__main__':
+    main()
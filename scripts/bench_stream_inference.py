@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Kafka streaming scoring pipeline (app.workers.inference).
+
+Kafka is replaced by an in-memory broker stand-in with the kafka-python
+consumer/producer surface the pipeline uses (poll, commit, send, flush):
+each producer flush pays --ack-ms for the broker round trip and compresses
+the flushed records with --compression, as the real producer would. The
+rest is the real pipeline: ColumnarBatch validation, batch features and
+scoring through FeatureService / ScoringService against the configured
+DATABASE_URL and REDIS_URL (--seed creates a synthetic data set first,
+shared with bench_db_paths.py), decisions and alerts produced, offsets
+committed after the flush. --state keeps velocity in the worker's partition
+state stores (changelog produced to the same in-memory broker) instead of
+Redis.
+
+--replicas processes each own --partitions / --replicas partitions of the
+transactions topic, as the members of one consumer group would, and score
+--transactions records between them. Reports sustained transactions per
+second for each replica and in total.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.config import settings  # noqa: E402
+
+TopicPartition = namedtuple("TopicPartition", "topic partition")
+ConsumerRecord = namedtuple("ConsumerRecord", "topic partition offset key value")
+RecordMetadata = namedtuple("RecordMetadata", "topic partition offset")
+
+
+class InMemoryBroker:
+    def __init__(self):
+        self.partitions = {}
+        self.committed = {}
+
+    def append(self, topic, partition, key, value):
+        log = self.partitions.setdefault(TopicPartition(topic, partition), [])
+        log.append(ConsumerRecord(topic, partition, len(log), key, value))
+        return len(log) - 1
+
+    def reader(self, topic):
+        """Changelog reader over one of this broker's topics"""
+        def read(partition, from_offset):
+            for record in self.partitions.get(TopicPartition(topic, partition), [])[from_offset:]:
+                yield record.offset, record.key, record.value
+        return read
+
+
+class StandInConsumer:
+    """Reads its assigned partitions from the committed offsets; the listener hears of the assignment on first poll"""
+
+    def __init__(self, broker, assignment, listener=None):
+        self.broker = broker
+        self._assignment = list(assignment)
+        self.positions = {tp: broker.committed.get(tp, 0) for tp in self._assignment}
+        self.listener = listener
+
+    def poll(self, timeout_ms=0, max_records=500):
+        if self.listener is not None:
+            self.listener.on_partitions_assigned(self._assignment)
+            self.listener = None
+        polled = {}
+        remaining = max_records
+        for tp in self._assignment:
+            log = self.broker.partitions.get(tp, [])
+            records = log[self.positions[tp]:self.positions[tp] + remaining]
+            if records:
+                polled[tp] = records
+                self.positions[tp] += len(records)
+                remaining -= len(records)
+            if not remaining:
+                break
+        if not polled and timeout_ms:
+            time.sleep(timeout_ms / 1000.0)
+        return polled
+
+    def commit(self):
+        self.broker.committed.update(self.positions)
+
+    def assignment(self):
+        return set(self._assignment)
+
+    def highwater(self, tp):
+        return len(self.broker.partitions.get(tp, []))
+
+    def position(self, tp):
+        return self.positions[tp]
+
+    def close(self, autocommit=True):
+        pass
+
+
+class StandInFuture:
+    __slots__ = ("is_done", "exception", "value")
+
+    def __init__(self):
+        self.is_done = False
+        self.exception = None
+        self.value = None
+
+    def failed(self):
+        return self.exception is not None
+
+
+class StandInProducer:
+    """Buffers sends; flush() compresses the buffer and waits one ack round trip"""
+
+    def __init__(self, broker, partitions, ack_ms, compression):
+        self.broker = broker
+        self.partitions = partitions
+        self.ack_ms = ack_ms
+        self.compression = compression
+        self.buffer = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def send(self, topic, value=None, key=None, partition=None):
+        future = StandInFuture()
+        if partition is None:
+            partition = zlib.crc32(key or b"") % self.partitions
+        self.buffer.append((topic, key, value, partition, future))
+        return future
+
+    def flush(self, timeout=None):
+        if not self.buffer:
+            return
+        payload = b"".join(value or b"" for _, _, value, _, _ in self.buffer)
+        self.bytes_in += len(payload)
+        if self.compression == "gzip":
+            payload = gzip.compress(payload, compresslevel=6)
+        elif self.compression == "zlib":
+            payload = zlib.compress(payload, 1)
+        self.bytes_out += len(payload)
+        time.sleep(self.ack_ms / 1000.0)
+        for topic, key, value, partition, future in self.buffer:
+            offset = self.broker.append(topic, partition, key, value)
+            future.value = RecordMetadata(topic, partition, offset)
+            future.is_done = True
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+
+
+def make_records(replica, count, args):
+    rng = random.Random(replica)
+    now = datetime.utcnow()
+    records = []
+    for i in range(count):
+        tx_id = replica * 10_000_000 + i
+        records.append({
+            "id": tx_id,
+            # Naive with microseconds, as producers using datetime.isoformat() send it
+            "timestamp": (now - timedelta(seconds=count - i, microseconds=rng.randrange(1_000_000))).isoformat(),
+            "card_id": f"card_{rng.randrange(args.cards)}",
+            "merchant_id": f"merchant_{rng.randrange(args.merchants)}",
+            "amount": round(rng.lognormvariate(3.5, 1.0), 2) + 0.01,
+            "mcc": rng.choice(["5411", "5812", "7995"]),
+            "device_id": f"device_{rng.randrange(args.devices)}",
+            "country": rng.choice(["US", "US", "US", "GB", "DE"])
+        })
+    return records
+
+
+def check_timestamp_formats():
+    """The ISO-8601 forms producers emit must all parse; none may be dead-lettered"""
+    from app.services.columnar import ColumnarBatch
+
+    values = ["2024-01-01T10:00:00", "2024-01-01T10:00:00.123456", "2024-01-01T10:00:00Z",
+              "2024-01-01T10:00:00.123456+00:00", "2024-01-01T12:00:00+02:00"]
+    batch, errors = ColumnarBatch.from_records([
+        {"id": i, "timestamp": value, "card_id": "card_1", "merchant_id": "merchant_1", "amount": 10.0, "mcc": "5411"}
+        for i, value in enumerate(values)
+    ])
+    rejected = [value for value, error in zip(values, errors) if error is not None]
+    if rejected:
+        raise SystemExit(f"❌ timestamps dead-lettered: {rejected}")
+    seconds = set(batch.epoch_seconds.tolist())
+    if len(seconds) != 1:
+        raise SystemExit(f"❌ equivalent timestamps parsed differently: {sorted(seconds)}")
+    print(f"🕒 {len(values)} timestamp formats (naive, fractional, Z, offsets) parse to the same instant")
+
+
+async def run_replica(replica, args):
+    from app.database import SessionLocal, engine
+    from app.services.feature_service import FeatureService
+    from app.services.scoring import ScoringService
+    from app.workers.inference import InferencePipeline
+    from app.workers.state import StateStores
+
+    engine.dispose(close=False)  # connections opened before the fork belong to the parent
+    topic = settings.INFERENCE_TRANSACTIONS_TOPIC
+    owned = [p for p in range(args.partitions) if p % args.replicas == replica]
+    per_replica = args.transactions // args.replicas
+
+    broker = InMemoryBroker()
+    for i, record in enumerate(make_records(replica, per_replica, args)):
+        broker.append(topic, owned[i % len(owned)], record["card_id"].encode(), json.dumps(record).encode())
+    assignment = [TopicPartition(topic, p) for p in owned]
+    producer = StandInProducer(broker, args.partitions, args.ack_ms, args.compression)
+
+    state = None
+    if args.state:
+        state = StateStores(topic, broker.reader(settings.STATE_CHANGELOG_TOPIC), state_dir=tempfile.mkdtemp())
+
+    scoring_service = ScoringService()
+    await scoring_service.initialize()
+    pipeline = InferencePipeline(
+        lambda: StandInConsumer(broker, assignment, state), lambda: producer,
+        FeatureService(), scoring_service, SessionLocal, batch_size=args.batch_size, batch_wait_ms=args.wait_ms,
+        state=state
+    )
+
+    async def stop_when_drained():
+        while sum(broker.committed.get(tp, 0) for tp in assignment) < per_replica:
+            await asyncio.sleep(0.01)
+        pipeline.stop()
+
+    started = time.perf_counter()
+    await asyncio.gather(pipeline.run(), stop_when_drained())
+    elapsed = time.perf_counter() - started
+    stats = pipeline.stats.to_dict()
+    return {
+        "replica": replica,
+        "partitions": len(owned),
+        "transactions": stats["transactions"],
+        "alerts": stats["alerts"],
+        "batches": stats["batches"],
+        "seconds": elapsed,
+        "tx_per_second": stats["transactions"] / elapsed,
+        "compression_ratio": producer.bytes_in / producer.bytes_out if producer.bytes_out else 1.0
+    }
+
+
+def replica_main(job):
+    replica, args = job
+    return asyncio.run(run_replica(replica, args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--replicas', type=int, default=2)
+    parser.add_argument('--partitions', type=int, default=6)
+    parser.add_argument('--transactions', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=settings.INFERENCE_BATCH_SIZE)
+    parser.add_argument('--wait-ms', type=float, default=settings.INFERENCE_BATCH_WAIT_MS)
+    parser.add_argument('--ack-ms', type=float, default=5.0, help='broker round trip per producer flush')
+    parser.add_argument('--compression', choices=['gzip', 'zlib', 'none'], default='gzip')
+    parser.add_argument('--state', action='store_true', help='velocity from partition state stores instead of Redis')
+    parser.add_argument('--cards', type=int, default=5000)
+    parser.add_argument('--merchants', type=int, default=500)
+    parser.add_argument('--devices', type=int, default=5000)
+    parser.add_argument('--seed', action='store_true', help='create tables and synthetic entities first')
+    args = parser.parse_args()
+
+    if args.seed:
+        from bench_db_paths import seed
+        from app.database import engine
+        seed(args.cards, args.merchants, args.devices, transactions=args.cards * 4)
+        engine.dispose()
+
+    check_timestamp_formats()
+    print(f"🌊 {args.transactions} transactions over {args.partitions} partitions, {args.replicas} replicas, "
+          f"batches of {args.batch_size} (wait {args.wait_ms:.0f}ms), ack {args.ack_ms:.0f}ms, {args.compression}"
+          f"{', partition state stores' if args.state else ''}")
+    with multiprocessing.get_context("fork").Pool(args.replicas) as pool:
+        results = pool.map(replica_main, [(replica, args) for replica in range(args.replicas)])
+
+    for r in results:
+        print(f"   replica {r['replica']}: {r['transactions']} tx in {r['seconds']:.2f}s "
+              f"= {r['tx_per_second']:,.0f} tx/s  ({r['partitions']} partitions, {r['batches']} batches, "
+              f"{r['alerts']} alerts, compression {r['compression_ratio']:.1f}x)")
+    total = sum(r['transactions'] for r in results)
+    wall = max(r['seconds'] for r in results)
+    print(f"✅ total {total} tx in {wall:.2f}s = {total / wall:,.0f} tx/s")
+
+
+if __name__ == '__main__':
+    main()
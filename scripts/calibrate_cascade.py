@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Fit the cascade first-stage model and pick its cutoff for a target recall.
+
+Reads the labelled transactions.csv produced by generate_sample_data.py,
+replays it in time order to compute the same cheap features the API computes
+online, fits a small logistic regression on the earliest 70% of traffic and
+chooses the clearing cutoff on the remaining 30%.
+"""
+
+import argparse
+import csv
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.config import settings  # noqa: E402
+from app.services.cascade import (  # noqa: E402
+    CHEAP_FEATURE_NAMES,
+    FirstStageModel,
+    LocalVelocityTracker,
+    cheap_features,
+)
+
+
+def load_transactions(path):
+    """Load (timestamp, card_id, amount, label) rows sorted by timestamp"""
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            rows.append((
+                datetime.fromisoformat(row['ts']),
+                row['card_id'],
+                float(row['amount']),
+                int(row['label'])
+            ))
+    rows.sort(key=lambda r: r[0])
+    return rows
+
+
+def build_features(rows):
+    """Replay transactions through the in-process velocity tracker"""
+    tracker = LocalVelocityTracker(settings.VELOCITY_WINDOW_MINUTES, max_cards=len(rows) + 1)
+    X = np.zeros((len(rows), len(CHEAP_FEATURE_NAMES)), dtype=np.float64)
+    y = np.zeros(len(rows), dtype=np.float64)
+
+    for i, (ts, card_id, amount, label) in enumerate(rows):
+        velocity = tracker.observe(card_id, ts, amount)
+        X[i] = cheap_features(amount, ts, velocity)
+        y[i] = label
+
+    return X, y
+
+
+def fit_logistic(X, y, epochs=500, learning_rate=0.1, l2=1e-3):
+    """Class-balanced logistic regression fitted by full-batch gradient descent"""
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Xs = (X - mean) / scale
+
+    pos = max(y.sum(), 1.0)
+    neg = max(len(y) - y.sum(), 1.0)
+    sample_weight = np.where(y == 1, len(y) / (2 * pos), len(y) / (2 * neg))
+
+    w = np.zeros(X.shape[1])
+    b = 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(Xs @ w + b)))
+        err = (p - y) * sample_weight
+        w -= learning_rate * (Xs.T @ err / len(y) + l2 * w)
+        b -= learning_rate * err.mean()
+
+    return w, b, mean, scale
+
+
+def pick_cutoff(scores, y, target_recall):
+    """Largest cutoff that keeps at least target_recall of fraud on the full path"""
+    fraud_scores = np.sort(scores[y == 1])
+    if len(fraud_scores) == 0:
+        return 0.0
+
+    # Clearing everything strictly below the k-th lowest fraud score misses k frauds
+    max_missed = int(np.floor((1.0 - target_recall) * len(fraud_scores)))
+    max_missed = min(max(max_missed, 0), len(fraud_scores) - 1)
+    return float(fraud_scores[max_missed])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data', default='data/sample/transactions.csv')
+    parser.add_argument('--output', default='data/models/cascade_first_stage.json',
+                        help='docker-compose mounts data/models as the API\'s models/ (CASCADE_MODEL_PATH)')
+    parser.add_argument('--target-recall', type=float, default=0.995)
+    parser.add_argument('--train-fraction', type=float, default=0.7)
+    args = parser.parse_args()
+
+    print(f"📥 Loading {args.data}...")
+    rows = load_transactions(args.data)
+    X, y = build_features(rows)
+
+    split = int(len(rows) * args.train_fraction)
+    X_train, y_train = X[:split], y[:split]
+    X_val, y_val = X[split:], y[split:]
+
+    print(f"🧮 Fitting first stage on {len(y_train)} transactions ({int(y_train.sum())} fraud)...")
+    w, b, mean, scale = fit_logistic(X_train, y_train)
+
+    model = FirstStageModel(w, b, mean, scale, cutoff=0.0)
+    val_scores = model.predict(X_val)
+    cutoff = pick_cutoff(val_scores, y_val, args.target_recall)
+
+    cleared = val_scores < cutoff
+    n_fraud = max(int(y_val.sum()), 1)
+    recall = 1.0 - float(((y_val == 1) & cleared).sum()) / n_fraud
+    fast_path_fraction = float(cleared.mean()) if len(cleared) else 0.0
+
+    model.cutoff = cutoff
+    model.metrics = {
+        'target_recall': args.target_recall,
+        'validation_recall': recall,
+        'validation_fast_path_fraction': fast_path_fraction,
+        'validation_size': int(len(y_val)),
+        'trained_at': datetime.utcnow().isoformat()
+    }
+    model.save(Path(args.output))
+
+    print(f"\n📊 Validation on {len(y_val)} transactions ({int(y_val.sum())} fraud):")
+    print(f"   Cutoff: {cutoff:.6f}")
+    print(f"   Recall kept on full path: {recall:.4f} (target {args.target_recall})")
+    print(f"   Traffic on fast path: {fast_path_fraction * 100:.2f}%")
+    print(f"\n✅ Saved first-stage model to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Fault-injection check for the dependency circuit breakers.
+
+Starts local stand-in servers for Redis and the graph backend, drives a
+closed-loop load of simulated scoring requests against them and takes the
+graph stand-in down (it accepts connections but never answers) for the middle
+phase of the run. The same load runs once with per-dependency breakers and
+once with plain per-call timeouts, and the p50/p99 request latency of each
+phase is reported. Exits non-zero if the breaker run's p99 during the outage
+is not below the per-call timeout.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.core.circuit_breaker import CircuitBreaker  # noqa: E402
+
+
+class StandInServer:
+    """Line-based TCP server that answers immediately or blackholes requests"""
+
+    def __init__(self, name):
+        self.name = name
+        self.up = True
+        self.port = None
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if self.up:
+                    writer.write(b'+OK\r\n')
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def call_dependency(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(b'PING\r\n')
+        await writer.drain()
+        return await reader.readline()
+    finally:
+        writer.close()
+
+
+async def guarded_call(port, timeout, breaker):
+    """One dependency call with a fallback, through a breaker if given"""
+    if breaker is not None:
+        return await breaker.call(call_dependency, port, fallback=None, timeout=timeout)
+    try:
+        return await asyncio.wait_for(call_dependency(port), timeout=timeout)
+    except Exception:
+        return None
+
+
+async def simulated_request(redis, graph, timeout, breakers):
+    # Two Redis reads (velocity) and one graph lookup per scoring request
+    await guarded_call(redis.port, timeout, breakers.get('redis'))
+    await guarded_call(redis.port, timeout, breakers.get('redis'))
+    await guarded_call(graph.port, timeout, breakers.get('graph'))
+
+
+async def run(use_breakers, args):
+    redis = StandInServer('redis')
+    graph = StandInServer('graph')
+    await redis.start()
+    await graph.start()
+
+    breakers = {}
+    if use_breakers:
+        breakers = {
+            name: CircuitBreaker(name, failure_rate_threshold=0.5, window_size=20,
+                                 min_calls=5, open_seconds=args.open_seconds)
+            for name in ('redis', 'graph')
+        }
+
+    phases = [('healthy', args.phase_seconds), ('graph down', args.phase_seconds * 2),
+              ('recovered', args.phase_seconds)]
+    latencies = {name: [] for name, _ in phases}
+    current = {'phase': phases[0][0]}
+    stop = asyncio.Event()
+
+    async def worker():
+        while not stop.is_set():
+            phase = current['phase']
+            started = time.perf_counter()
+            await simulated_request(redis, graph, args.timeout_ms / 1000.0, breakers)
+            latencies[phase].append((time.perf_counter() - started) * 1000)
+
+    workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+    for name, seconds in phases:
+        current['phase'] = name
+        graph.up = name != 'graph down'
+        await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*workers)
+
+    await redis.stop()
+    await graph.stop()
+    return latencies, breakers
+
+
+def report(label, latencies, breakers):
+    print(f"\n{label}")
+    for phase, values in latencies.items():
+        arr = np.array(values) if values else np.zeros(1)
+        print(f"   {phase:<11} requests={len(values):>6}  p50={np.percentile(arr, 50):7.2f}ms  "
+              f"p99={np.percentile(arr, 99):7.2f}ms")
+    for name, breaker in breakers.items():
+        stats = breaker.stats()
+        print(f"   breaker {name}: state={stats['state']} opened={stats['times_opened']} "
+              f"short_circuited={stats['short_circuited']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--timeout-ms', type=float, default=200.0)
+    parser.add_argument('--phase-seconds', type=float, default=2.0)
+    parser.add_argument('--open-seconds', type=float, default=1.0)
+    args = parser.parse_args()
+
+    baseline, _ = asyncio.run(run(False, args))
+    report("⏱️  Per-call timeouts only", baseline, {})
+
+    guarded, breakers = asyncio.run(run(True, args))
+    report("🔌 With circuit breakers", guarded, breakers)
+
+    outage_p99 = float(np.percentile(guarded['graph down'], 99))
+    if outage_p99 >= args.timeout_ms:
+        print(f"\n❌ p99 during outage {outage_p99:.2f}ms is not below the {args.timeout_ms}ms timeout")
+        sys.exit(1)
+    print(f"\n✅ p99 during outage stayed at {outage_p99:.2f}ms (timeout {args.timeout_ms}ms)")
+
+
+if __name__ == '__main__':
+    main()
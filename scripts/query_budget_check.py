@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Check the per-transaction query budget of FeatureService.generate_features().
+
+Runs feature generation for a few transactions against an in-memory SQLite
+session (seeded with a card, merchant, device and some history) and an
+in-process Redis stand-in, each under app.core.query_stats.assert_query_budget:
+
+- known card, device and merchant: every lookup and aggregate runs;
+- unknown device and merchant: the follow-up queries are skipped;
+- an exhausted deadline: the DB aggregates are skipped.
+
+Statements are counted by the same SQLAlchemy cursor events and RedisClient
+accounting that production requests use. Exits non-zero if any case goes
+over --db statements or --redis round trips, or repeats one statement more
+than --max-repeats times.
+"""
+
+import argparse
+import asyncio
+import math
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.core.deadline import Deadline  # noqa: E402
+from app.core.query_stats import assert_query_budget  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.models.database import Card, Device, Merchant, Transaction  # noqa: E402
+from app.models.schemas import TransactionRequest  # noqa: E402
+from app.services.feature_service import FeatureService  # noqa: E402
+from app.utils.redis_client import RedisClient  # noqa: E402
+
+
+class StandInRedis:
+    """The Redis commands the feature path uses, answered in-process"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def zrangebyscore(self, key, low, high):
+        return []
+
+    def pipeline(self, transaction=False):
+        return StandInPipeline(self)
+
+
+class StandInPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def incrbyfloat(self, key, amount):
+        self.commands.append((key, amount))
+
+    def expire(self, key, ttl, nx=False):
+        pass
+
+    async def execute(self):
+        for key, amount in self.commands:
+            self.redis.data[key] = str(float(self.redis.data.get(key) or 0.0) + amount)
+
+
+class StdDev:
+    """stddev() aggregate, which SQLite lacks (CARD_AMOUNT_STATS uses it)"""
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        if len(self.values) < 2:
+            return None
+        mean = sum(self.values) / len(self.values)
+        return math.sqrt(sum((v - mean) ** 2 for v in self.values) / (len(self.values) - 1))
+
+
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _register(dbapi_connection, record):
+        dbapi_connection.create_aggregate("stddev", 1, StdDev)
+
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    now = datetime.utcnow()
+    db.add_all([
+        Card(id="card_1", account_id="acct_1", age_days=400, home_country="US", home_city="New York"),
+        Merchant(id="merchant_1", name="Grocer", mcc="5411", country="US", avg_ticket_size=40.0),
+        Device(id="device_1", type="mobile")
+    ])
+    db.add_all([
+        Transaction(id=i, ts=now - timedelta(hours=i), card_id="card_1", merchant_id="merchant_1",
+                    amount=20.0 + i, mcc="5411", device_id="device_1", country="US")
+        for i in range(1, 21)
+    ])
+    db.commit()
+    db.close()
+    return Session
+
+
+def transaction(tx_id, **overrides):
+    values = {
+        "id": tx_id, "timestamp": datetime.utcnow(), "card_id": "card_1", "merchant_id": "merchant_1",
+        "amount": 55.0, "mcc": "5411", "device_id": "device_1", "country": "US", "city": "New York"
+    }
+    values.update(overrides)
+    return TransactionRequest(**values)
+
+
+async def check(name, service, Session, tx, deadline, args):
+    db = Session()
+    try:
+        with assert_query_budget(db=args.db, redis=args.redis, max_repeats=args.max_repeats) as stats:
+            await service.generate_features(tx, db, deadline)
+        print(f"✅ {name}: {stats.db_count} DB statements, {stats.redis_count} Redis calls")
+        return True
+    except AssertionError as e:
+        print(f"❌ {name}: {e}")
+        return False
+    finally:
+        db.close()
+
+
+async def main_async(args):
+    Session = session_factory()
+    service = FeatureService()
+    redis = StandInRedis()
+    service.redis = RedisClient(primary=redis, replica=redis, hedging=False)
+
+    expired = Deadline(0)
+    results = [
+        await check("known card, device and merchant", service, Session, transaction(1000), None, args),
+        await check("unknown device and merchant", service, Session,
+                    transaction(1001, device_id="device_new", merchant_id="merchant_new"), None, args),
+        await check("exhausted deadline", service, Session, transaction(1002), expired, args)
+    ]
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', type=int, default=8, help='DB statements allowed per transaction')
+    parser.add_argument('--redis', type=int, default=17, help='Redis round trips allowed per transaction')
+    parser.add_argument('--max-repeats', type=int, default=2, help='executions allowed per distinct statement')
+    args = parser.parse_args()
+    print(f"📏 budget per transaction: {args.db} DB statements, {args.redis} Redis calls, "
+          f"each statement at most {args.max_repeats} times")
+    ok = asyncio.run(main_async(args))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+-- Upgrade an existing database to the current models (app/models/database.py).
+--
+-- Base.metadata.create_all() only creates missing tables: it adds no column
+-- or index to a table that already exists. Run this once against databases
+-- created by an earlier version, with psql in autocommit mode (the default):
+--
+--     psql "$DATABASE_URL" -f scripts/upgrade_schema.sql
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, and does
+-- not block writes to the table while it builds. Every statement is safe to
+-- re-run; if a concurrent build fails, DROP INDEX the invalid index it leaves
+-- and run the file again.
+
+-- Transactional outbox (app/services/outbox.py). create_all() creates this
+-- table on startup too; it is here for databases managed without it.
+CREATE TABLE IF NOT EXISTS outbox (
+    id SERIAL PRIMARY KEY,
+    topic VARCHAR(100) NOT NULL,
+    key VARCHAR(100),
+    payload TEXT NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now()
+);
+
+-- Alert aggregation window and analyst queue columns. Without them every
+-- flagged /score request fails in write_rows().
+ALTER TABLE alerts
+    ADD COLUMN IF NOT EXISTS card_id VARCHAR(50),
+    ADD COLUMN IF NOT EXISTS alert_count INTEGER,
+    ADD COLUMN IF NOT EXISTS max_p_fraud DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE;
+ALTER TABLE alerts ALTER COLUMN updated_at SET DEFAULT now();
+
+-- Backfill existing alerts: their card, a count of one, and updated_at so
+-- the alert queue's incremental sync sees them
+UPDATE alerts SET card_id = transactions.card_id
+    FROM transactions
+    WHERE alerts.tx_id = transactions.id AND alerts.card_id IS NULL;
+UPDATE alerts SET alert_count = 1 WHERE alert_count IS NULL;
+UPDATE alerts SET updated_at = coalesce(resolved_at, created_at, now()) WHERE updated_at IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_alerts_card_id
+    ON alerts (card_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_updated_at
+    ON alerts (updated_at);
+
+-- Read APIs: keyset pagination on (created_at, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_decisions_created_id
+    ON decisions (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_created_id
+    ON alerts (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_status_severity_created
+    ON alerts (status, severity, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_status_created
+    ON alerts (status, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_drift_metrics_created_id
+    ON drift_metrics (created_at, id);
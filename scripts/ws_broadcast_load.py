@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Load test for WebSocket alert fan-out with many simulated clients.
+
+In-process mode (default): registers --clients stand-in WebSockets with the
+API's ConnectionManager. Most clients accept a frame after a short random
+delay; --slow-fraction of them take --slow-ms per frame, and --stalled of
+them never complete a send. Broadcasts --messages alerts at --rate per
+second and reports, for the healthy clients, the delay from broadcast to
+delivery, plus drops and slow-client disconnects. The same load is then
+run through the previous sequential broadcast (await each client in turn)
+for comparison (fewer broadcasts: each one waits out the stalled clients).
+
+Live mode (--url ws://host:8080/ws): opens --clients real connections to a
+running API and reports how many frames each received over --duration.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.config import settings  # noqa: E402
+from app.core.websocket import ConnectionManager  # noqa: E402
+
+
+# Broadcast time of each serialized frame (clients receive the same string)
+SENT_AT = {}
+
+
+class StandInWebSocket:
+    """Records when each frame was delivered; send latency is configurable"""
+
+    def __init__(self, delay_ms, stalled=False, seed=0):
+        self.delay_ms = delay_ms
+        self.stalled = stalled
+        self.random = random.Random(seed)
+        self.delays = []
+
+    async def accept(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send_text(self, text):
+        if self.stalled:
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.random.expovariate(1.0 / self.delay_ms) / 1000.0)
+        self.delays.append((time.perf_counter() - SENT_AT[text]) * 1000)
+
+
+def make_clients(args):
+    rng = random.Random(7)
+    clients = []
+    for i in range(args.clients):
+        if i < args.stalled:
+            clients.append((StandInWebSocket(args.fast_ms, stalled=True, seed=i), "stalled"))
+        elif rng.random() < args.slow_fraction:
+            clients.append((StandInWebSocket(args.slow_ms, seed=i), "slow"))
+        else:
+            clients.append((StandInWebSocket(args.fast_ms, seed=i), "fast"))
+    return clients
+
+
+def alert(i):
+    return {"type": "alert", "severity": "HIGH", "tx_id": i, "p_fraud": 0.97}
+
+
+async def run_queued(args):
+    manager = ConnectionManager(queue_size=args.queue_size)
+    clients = make_clients(args)
+    for websocket, _ in clients:
+        await manager.connect(websocket)
+
+    broadcast_ms = []
+    for i in range(args.messages):
+        text = json.dumps(alert(i))
+        started = SENT_AT[text] = time.perf_counter()
+        manager.broadcast(text)
+        broadcast_ms.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(1.0 / args.rate)
+    await asyncio.sleep(args.drain_seconds)
+    stats = manager.stats()
+    await manager.close()
+    return clients, np.array(broadcast_ms), stats
+
+
+async def run_sequential(args):
+    """The previous ConnectionManager.broadcast: await every client in turn"""
+    clients = make_clients(args)
+    broadcast_ms = []
+    for i in range(args.sequential_messages):
+        text = json.dumps(alert(i))
+        started = SENT_AT[text] = time.perf_counter()
+        for websocket, _ in clients:
+            try:
+                await asyncio.wait_for(websocket.send_text(text), timeout=settings.WS_SEND_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        broadcast_ms.append((time.perf_counter() - started) * 1000)
+    return clients, np.array(broadcast_ms), None
+
+
+def report(label, clients, broadcast_ms, stats, messages):
+    fast = np.concatenate([ws.delays for ws, kind in clients if kind == "fast" and ws.delays] or [[0.0]])
+    delivered = sum(len(ws.delays) for ws, kind in clients if kind == "fast")
+    expected = messages * sum(1 for _, kind in clients if kind == "fast")
+    print(f"\n{label}")
+    print(f"   broadcast call p50={np.percentile(broadcast_ms, 50):.3f}ms  max={broadcast_ms.max():.3f}ms")
+    print(f"   healthy clients: delivered {delivered}/{expected}  "
+          f"delay p50={np.percentile(fast, 50):.2f}ms  p99={np.percentile(fast, 99):.2f}ms  max={fast.max():.2f}ms")
+    if stats:
+        print(f"   dropped={stats['dropped']}  slow disconnects={stats['slow_disconnects']}  "
+              f"clients left={stats['clients']}")
+
+
+async def run_live(args):
+    import websockets
+
+    received = [0] * args.clients
+
+    async def client(i):
+        async with websockets.connect(args.url, max_queue=None) as ws:
+            deadline = time.monotonic() + args.duration
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    await asyncio.wait_for(ws.recv(), timeout=remaining)
+                    received[i] += 1
+                except asyncio.TimeoutError:
+                    break
+
+    results = await asyncio.gather(*(client(i) for i in range(args.clients)), return_exceptions=True)
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    counts = np.array(received)
+    print(f"\n🌐 {args.clients} live clients on {args.url} for {args.duration:.0f}s ({failed} failed)")
+    print(f"   frames per client min={counts.min()}  p50={np.percentile(counts, 50):.0f}  max={counts.max()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=50.0, help='broadcasts per second')
+    parser.add_argument('--fast-ms', type=float, default=0.5)
+    parser.add_argument('--slow-fraction', type=float, default=0.02)
+    parser.add_argument('--slow-ms', type=float, default=100.0)
+    parser.add_argument('--stalled', type=int, default=5)
+    parser.add_argument('--queue-size', type=int, default=settings.WS_CLIENT_QUEUE_SIZE)
+    parser.add_argument('--drain-seconds', type=float, default=settings.WS_SEND_TIMEOUT_SECONDS + 1.5)
+    parser.add_argument('--sequential-messages', type=int, default=3,
+                        help='broadcasts for the sequential baseline (each waits out stalled clients); 0 skips it')
+    parser.add_argument('--url', type=str, default=None)
+    parser.add_argument('--duration', type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(run_live(args))
+        return
+
+    print(f"📡 {args.clients} clients ({args.slow_fraction * 100:.0f}% slow at {args.slow_ms:.0f}ms/frame, "
+          f"{args.stalled} stalled), {args.messages} broadcasts at {args.rate:.0f}/s")
+    report("🧵 Per-client queues", *asyncio.run(run_queued(args)), args.messages)
+    if args.sequential_messages:
+        report("🐢 Sequential broadcast (previous)", *asyncio.run(run_sequential(args)), args.sequential_messages)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Scaling test for server-side WebSocket alert subscriptions.
+
+For growing subscriber counts, builds the API's SubscriptionIndex from a
+fixed set of --broad subscribers (severity only, e.g. the on-call
+dashboard) plus a growing population of narrow ones (analysts watching
+some MCCs in some countries, optionally a severity set and score band),
+and publishes the same alert stream through it. Reports CPU time per
+message for the indexed matcher and for a full scan that evaluates every
+subscriber's filter, alongside the number of subscribers each message
+actually reaches. The index's cost should stay flat as subscribers whose
+filters reject the message are added; the full scan grows linearly.
+
+With --publish the indexed run goes through ConnectionManager.publish()
+(matching, serialization and batching into frames) instead of the bare
+index.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'services' / 'api'))
+
+from app.core.subscriptions import SubscriptionIndex  # noqa: E402
+from app.core.websocket import ConnectionManager  # noqa: E402
+from app.models.schemas import AlertSubscription  # noqa: E402
+
+SEVERITIES = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+
+class NullWebSocket:
+    async def accept(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send_text(self, text):
+        pass
+
+
+def make_filter(rng, mccs, countries):
+    fields = {
+        "mcc": rng.sample(mccs, rng.randint(1, 3)),
+        "country": rng.sample(countries, rng.randint(1, 2))
+    }
+    if rng.random() < 0.5:
+        fields["severity"] = rng.sample(SEVERITIES, rng.randint(1, 2))
+    if rng.random() < 0.3:
+        fields["min_p_fraud"] = round(rng.uniform(0.5, 0.95), 2)
+    return AlertSubscription(**fields)
+
+
+def make_broad_filter(rng):
+    return AlertSubscription(severity=rng.sample(SEVERITIES[2:], rng.randint(1, 2)))
+
+
+def make_messages(rng, count, mccs, countries):
+    return [
+        {
+            "type": "alert",
+            "tx_id": i,
+            "severity": rng.choice(SEVERITIES),
+            "mcc": rng.choice(mccs),
+            "country": rng.choice(countries),
+            "p_fraud": round(rng.random(), 4)
+        }
+        for i in range(count)
+    ]
+
+
+def cpu_per_message(fn, messages):
+    started = time.process_time()
+    for message in messages:
+        fn(message)
+    return (time.process_time() - started) / len(messages) * 1e6
+
+
+async def publish_cpu(filters, messages):
+    manager = ConnectionManager(frame_interval_ms=50)
+    for subscription in filters:
+        websocket = NullWebSocket()
+        await manager.connect(websocket)
+        manager.subscribe(websocket, subscription)
+    result = cpu_per_message(manager.publish, messages)
+    await manager.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', type=str, default='100,1000,10000,100000')
+    parser.add_argument('--broad', type=int, default=20, help='severity-only subscribers in every run')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--full-scan-messages', type=int, default=200)
+    parser.add_argument('--mccs', type=int, default=300)
+    parser.add_argument('--countries', type=int, default=60)
+    parser.add_argument('--publish', action='store_true')
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    mccs = [str(5000 + i) for i in range(args.mccs)]
+    countries = [chr(65 + i // 26) + chr(65 + i % 26) for i in range(args.countries)]
+    messages = make_messages(rng, args.messages, mccs, countries)
+
+    print(f"🔎 {args.messages} alerts over {args.mccs} MCCs x {args.countries} countries")
+    print(f"{'subscribers':>12} {'filters':>8} {'reached/msg':>12} {'index µs/msg':>13} {'full scan µs/msg':>17}")
+    for count in (int(n) for n in args.subscribers.split(',')):
+        filters = [make_broad_filter(rng) for _ in range(min(args.broad, count))]
+        filters += [make_filter(rng, mccs, countries) for _ in range(count - len(filters))]
+        index = SubscriptionIndex()
+        for key, subscription in enumerate(filters):
+            index.add(key, subscription)
+
+        sample = messages[:50]
+        for message in sample:
+            reached = set().union(*index.match(message))
+            assert reached == index.full_scan(message), "index and full scan disagree"
+        reached = sum(sum(len(m) for m in index.match(message)) for message in messages) / len(messages)
+
+        if args.publish:
+            indexed = asyncio.run(publish_cpu(filters, messages))
+        else:
+            indexed = cpu_per_message(index.match, messages)
+        full = cpu_per_message(index.full_scan, messages[:args.full_scan_messages])
+        print(f"{count:>12} {index.distinct:>8} {reached:>12.1f} {indexed:>13.2f} {full:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
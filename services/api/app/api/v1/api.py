@@ -4,7 +4,7 @@ API v1 router configuration.
 
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import health, scoring, decisions, models, alerts, drift
+from app.api.v1.endpoints import admin, health, scoring, decisions, models, alerts, drift
 
 api_router = APIRouter()
 
@@ -15,3 +15,4 @@ api_router.include_router(decisions.router, prefix="/decisions", tags=["decision
 api_router.include_router(models.router, prefix="/models", tags=["models"])
 api_router.include_router(alerts.router, prefix="/alerts", tags=["alerts"])
 api_router.include_router(drift.router, prefix="/drift", tags=["drift"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
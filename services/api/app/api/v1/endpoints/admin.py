@@ -0,0 +1,59 @@
+"""
+Admin endpoints: on-demand profiling of this worker.
+
+All routes require the X-Admin-Token header (see core.security).
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.config import get_settings
+from app.core.profiler import Profile, ProfilerBusy, get_profile, profile_worker, recent_profiles
+from app.core.security import require_admin
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+settings = get_settings()
+
+
+def _render(profile: Profile, format: str):
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed(), headers={"X-Profile-Id": profile.id})
+    return profile.speedscope()
+
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=settings.PROFILE_MAX_SECONDS),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000),
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed)$")
+):
+    """Sample every thread of the worker serving this request for `seconds`.
+
+    Returns a speedscope document (open at speedscope.app) or collapsed
+    stacks for flamegraph.pl. Only one worker profile runs at a time.
+    """
+    try:
+        result = await profile_worker(seconds, interval_ms or settings.PROFILE_INTERVAL_MS)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _render(result, format)
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """Recent worker and per-request (X-Profile) profiles of this worker, newest first."""
+    return [profile.summary() for profile in reversed(recent_profiles)]
+
+
+@router.get("/profiles/{profile_id}")
+async def fetch_profile(
+    profile_id: str,
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed)$")
+):
+    """A stored profile, e.g. the X-Profile-Id returned by a profiled request."""
+    result = get_profile(profile_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found on this worker")
+    return _render(result, format)
@@ -0,0 +1,89 @@
+"""
+Alert endpoints: the alert history and the analyst queue.
+
+The history is keyset-paginated on (created_at, id), newest first
+(services/pagination.py). "Next alert", an analyst's queue and a card's
+alerts are served from the in-memory AlertService
+(services/alert_service.py); changes are written to the alerts table first
+and then applied to it.
+"""
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.core.executor import run_db
+from app.database import get_db
+from app.models.database import Alert
+from app.models.schemas import AlertPage, AlertResponse, AlertSeverity, AlertStatus, AlertUpdate
+from app.services.alert_service import COLUMNS, alert_service
+from app.services.pagination import keyset_page
+
+router = APIRouter()
+settings = get_settings()
+
+
+@router.get("/", response_model=AlertPage)
+async def list_alerts(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.READ_PAGE_SIZE, ge=1, le=settings.READ_PAGE_MAX),
+    status: Optional[AlertStatus] = None,
+    severity: Optional[AlertSeverity] = None,
+    card_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Alerts newest first; pass the returned next_cursor as `cursor` for the next page.
+
+    status and severity use idx_alerts_status_severity_created / idx_alerts_status_created.
+    """
+    filters = []
+    if status is not None:
+        filters.append(Alert.status == status.value)
+    if severity is not None:
+        filters.append(Alert.severity == severity.value)
+    if card_id is not None:
+        filters.append(Alert.card_id == card_id)
+    try:
+        return await run_db(keyset_page, db, COLUMNS, filters, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/next", response_model=Optional[AlertResponse])
+async def next_alert():
+    """Highest-priority OPEN alert (severity, then p_fraud, then age), without claiming it."""
+    return await alert_service.peek_next()
+
+
+@router.post("/next", response_model=Optional[AlertResponse])
+async def claim_next_alert(analyst: str = Query(..., min_length=1, max_length=100)):
+    """Assign the highest-priority OPEN alert to `analyst`; null when the queue is empty."""
+    return await alert_service.claim_next(analyst)
+
+
+@router.get("/queue", response_model=List[AlertResponse])
+async def analyst_queue(
+    analyst: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """Alerts assigned to `analyst`, highest priority first."""
+    return await alert_service.assigned_to(analyst, limit)
+
+
+@router.get("/card/{card_id}", response_model=List[AlertResponse])
+async def card_alerts(card_id: str):
+    """OPEN and ASSIGNED alerts of a card, highest priority first."""
+    return await alert_service.for_card(card_id)
+
+
+@router.patch("/{alert_id}", response_model=AlertResponse)
+async def update_alert(alert_id: int, update: AlertUpdate):
+    """Assign, release (OPEN), resolve or mark an alert as a false positive."""
+    alert = await alert_service.update(
+        alert_id, update.status.value, update.assigned_to, update.resolution_notes
+    )
+    if alert is None:
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
+    return alert
@@ -0,0 +1,65 @@
+"""
+Decision read endpoints for the dashboard.
+
+Lists are keyset-paginated on (created_at, id), newest first, and select
+compact column projections (services/pagination.py).
+"""
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.core.executor import run_db
+from app.database import get_db
+from app.models.database import Decision
+from app.models.schemas import DecisionPage, DecisionResponse
+from app.services.pagination import keyset_page
+
+router = APIRouter()
+settings = get_settings()
+
+COLUMNS = (
+    Decision.id, Decision.tx_id, Decision.p_fraud, Decision.score, Decision.model_version, Decision.route,
+    Decision.created_at, Decision.latency_ms
+)
+
+
+@router.get("/", response_model=DecisionPage)
+async def list_decisions(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.READ_PAGE_SIZE, ge=1, le=settings.READ_PAGE_MAX),
+    min_score: Optional[float] = Query(None, ge=0, le=1),
+    max_score: Optional[float] = Query(None, ge=0, le=1),
+    route: Optional[str] = None,
+    model_version: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Decisions newest first; pass the returned next_cursor as `cursor` for the next page.
+
+    Every filter walks idx_decisions_created_id: route and model_version have
+    a handful of values, so matching rows are dense among recent decisions.
+    """
+    filters = []
+    if route is not None:
+        filters.append(Decision.route == route)
+    if model_version is not None:
+        filters.append(Decision.model_version == model_version)
+    if min_score is not None:
+        filters.append(Decision.score >= min_score)
+    if max_score is not None:
+        filters.append(Decision.score <= max_score)
+    try:
+        return await run_db(keyset_page, db, COLUMNS, filters, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/transaction/{tx_id}", response_model=List[DecisionResponse])
+async def transaction_decisions(tx_id: int, db: Session = Depends(get_db)):
+    """Every decision recorded for a transaction (production and shadow), newest first."""
+    statement = select(*COLUMNS).where(Decision.tx_id == tx_id).order_by(Decision.created_at.desc(), Decision.id.desc())
+    rows = await run_db(lambda: db.execute(statement).all())
+    return [row._asdict() for row in rows]
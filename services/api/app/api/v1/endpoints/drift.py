@@ -0,0 +1,44 @@
+"""
+Drift metric read endpoints.
+
+Windows are keyset-paginated on (created_at, id), newest first
+(services/pagination.py).
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.core.executor import run_db
+from app.database import get_db
+from app.models.database import DriftMetric
+from app.models.schemas import DriftMetricPage
+from app.services.pagination import keyset_page
+
+router = APIRouter()
+settings = get_settings()
+
+COLUMNS = (
+    DriftMetric.id, DriftMetric.window_start, DriftMetric.window_end, DriftMetric.psi_amount,
+    DriftMetric.psi_hour, DriftMetric.psi_country, DriftMetric.psi_mcc, DriftMetric.js_geo,
+    DriftMetric.ks_amount, DriftMetric.concept_auc, DriftMetric.concept_drift_detected, DriftMetric.created_at
+)
+
+
+@router.get("/", response_model=DriftMetricPage)
+async def list_drift_metrics(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.READ_PAGE_SIZE, ge=1, le=settings.READ_PAGE_MAX),
+    drift_detected: Optional[bool] = None,
+    db: Session = Depends(get_db)
+):
+    """Drift metric windows newest first; pass the returned next_cursor as `cursor` for the next page."""
+    filters = []
+    if drift_detected is not None:
+        filters.append(DriftMetric.concept_drift_detected == drift_detected)
+    try:
+        return await run_db(keyset_page, db, COLUMNS, filters, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
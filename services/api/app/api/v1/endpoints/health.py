@@ -2,8 +2,24 @@
 Health check endpoints.
 """
 
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
 from app.config import get_settings
+from app.core.admission import admission_controller
+from app.core.circuit_breaker import breaker_states
+from app.core.executor import executor_stats, loop_lag_monitor, run_db
+from app.core.readiness import readiness_monitor
+from app.core.slo import WINDOWS, latency_tracker
+from app.core.tracing import tracer
+from app.core.websocket import manager
+from app.database import SessionLocal
+from app.services.idempotency import get_idempotency_cache
+from app.services.alert_service import alert_service
+from app.services.alert_window import alert_aggregator, alert_flusher
+from app.services.outbox import decision_writer, outbox_backlog
+from app.utils.kafka_client import kafka_stats
+from app.utils.redis_client import redis_stats
 
 router = APIRouter()
 settings = get_settings()
@@ -21,13 +37,98 @@ async def health_check():
 
 @router.get("/ready")
 async def readiness_check():
-    """Readiness check endpoint."""
-    # Add checks for database, Redis, Kafka connectivity
+    """Readiness from the last background probe round (see core.readiness)."""
+    body, status_code = readiness_monitor.response()
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
+@router.get("/admission")
+async def admission_status():
+    """Admission control queue depth, rejection counts and wait times."""
+    return admission_controller.stats()
+
+
+@router.get("/breakers")
+async def circuit_breaker_status():
+    """Per-dependency circuit breaker state and counters."""
+    return breaker_states()
+
+
+@router.get("/redis")
+async def redis_status():
+    """Redis per-call timeout and read-hedging counters."""
+    return redis_stats()
+
+
+@router.get("/kafka")
+async def kafka_status():
+    """Kafka consumer batches, lag per partition, decode errors and restarts."""
+    return kafka_stats()
+
+
+@router.get("/idempotency")
+async def idempotency_status():
+    """Idempotency cache size, replays and coalesced duplicates."""
+    cache = get_idempotency_cache()
+    if cache is None:
+        return {"enabled": False}
+    return cache.stats()
+
+
+@router.get("/outbox")
+async def outbox_status():
+    """Decision group commit batches and the outbox rows waiting for the relay."""
+    def backlog():
+        db = SessionLocal()
+        try:
+            return outbox_backlog(db)
+        finally:
+            db.close()
+    
+    return {"writer": decision_writer.stats(), **await run_db(backlog)}
+
+
+@router.get("/alerts")
+async def alert_aggregation_status():
+    """Open alert windows and the writes they saved, and the analyst queue (this worker)."""
     return {
-        "status": "ready",
-        "checks": {
-            "database": "ok",
-            "redis": "ok",
-            "kafka": "ok"
-        }
+        **alert_aggregator.stats(),
+        "flushes": alert_flusher.flushes,
+        "flush_errors": alert_flusher.errors,
+        "queue": alert_service.stats()
     }
+
+
+@router.get("/loop")
+async def event_loop_status():
+    """Event loop scheduling lag and DB executor utilisation."""
+    return {"loop_lag": loop_lag_monitor.stats(), "db_executor": executor_stats()}
+
+
+@router.get("/latency")
+async def latency_percentiles(window: Optional[str] = None):
+    """Live p50 / p95 / p99 per route and per stage over 1m, 5m and 1h windows (this worker)."""
+    if window is not None and window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {', '.join(WINDOWS)}")
+    return latency_tracker.snapshot([window] if window else None)
+
+
+@router.get("/traces")
+async def recent_traces(limit: int = 50):
+    """Most recent kept (slow, failed or sampled) traces, newest first."""
+    return {"stats": tracer.stats(), "traces": tracer.recent(limit)}
+
+
+@router.get("/traces/{tx_id}")
+async def transaction_trace(tx_id: str):
+    """Full span tree of a transaction's kept trace."""
+    trace = tracer.find(tx_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"No kept trace for transaction {tx_id}")
+    return trace
+
+
+@router.get("/websocket")
+async def websocket_status():
+    """WebSocket clients, queue depth, dropped messages and slow-client disconnects."""
+    return manager.stats()
@@ -0,0 +1,46 @@
+"""
+Model registry read endpoints.
+"""
+
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.executor import run_db
+from app.database import get_db
+from app.models.database import Model
+from app.models.schemas import ModelResponse
+
+router = APIRouter()
+
+COLUMNS = (
+    Model.id, Model.version, Model.type, Model.stage, Model.traffic_percentage,
+    Model.metrics_json.label("metrics"), Model.created_at, Model.promoted_at
+)
+
+
+def _model_dict(row) -> dict:
+    model = row._asdict()
+    model["metrics"] = model["metrics"] or {}
+    model["traffic_percentage"] = model["traffic_percentage"] or 0.0
+    return model
+
+
+@router.get("/", response_model=List[ModelResponse])
+async def list_models(db: Session = Depends(get_db)):
+    """Registered models, newest first."""
+    statement = select(*COLUMNS).order_by(Model.created_at.desc(), Model.id.desc())
+    rows = await run_db(lambda: db.execute(statement).all())
+    return [_model_dict(row) for row in rows]
+
+
+@router.get("/{version}", response_model=ModelResponse)
+async def get_model(version: str, db: Session = Depends(get_db)):
+    """One model by version."""
+    statement = select(*COLUMNS).where(Model.version == version)
+    row = await run_db(lambda: db.execute(statement).first())
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Model {version} not found")
+    return _model_dict(row)
@@ -1,15 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Optional, AsyncIterator
+import asyncio
+import json
 import time
 import logging
 from datetime import datetime
 
-from ...database import get_db
+from ...config import settings
+from ...database import get_db, get_scoring_db, SessionLocal
 from ...models.schemas import TransactionRequest, ScoringResponse
 from ...services.scoring import ScoringService
 from ...services.feature_service import FeatureService
+from ...services.cascade import get_cascade
+from ...services.idempotency import get_idempotency_cache
+from ...services.columnar import ARROW_STREAM_MEDIA_TYPE, read_ipc, validate_table, write_scores_ipc
 from ...core.exceptions import ScoringException
+from ...core.deadline import Deadline
+from ...core.executor import run_db
+from ...core.metrics import ERRORS, FLAGGED, REQUEST_SECONDS, SCORED, STAGE_SECONDS
+from ...core.tracing import set_attribute, tracer
+from ...core.query_stats import track_queries
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -18,47 +30,82 @@ logger = logging.getLogger(__name__)
 async def score_transaction(
     transaction: TransactionRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    scoring_service: ScoringService = Depends()
+    response: Response,
+    db: Session = Depends(get_scoring_db),
+    scoring_service: ScoringService = Depends(),
+    deadline_ms: Optional[float] = Header(None, alias="X-Request-Deadline-Ms")
 ):
     """
-    Score a single transaction for fraud probability
+    Score a single transaction for fraud probability.
+    
+    The request runs against a latency budget (X-Request-Deadline-Ms, capped by
+    SCORING_DEADLINE_MS); optional stages are skipped when it runs low.
+    Retries of an already-scored transaction id return the stored response
+    (marked with an Idempotent-Replay header) without rescoring.
     """
     start_time = time.time()
+    deadline = Deadline.for_request(deadline_ms)
     
-    try:
-        # Generate features
+    async def compute() -> ScoringResponse:
         feature_service = FeatureService()
-        features = await feature_service.generate_features(transaction, db)
+        
+        # Cheap first stage clears confidently benign transactions
+        cascade = get_cascade()
+        if cascade is not None:
+            first_stage_score, cleared = cascade.evaluate(transaction)
+            if cleared:
+                set_attribute("route", "cascade")
+                result = await scoring_service.score_cascade_fast_path(
+                    transaction, first_stage_score, cascade.model.version, db
+                )
+                result.latency_ms = (time.time() - start_time) * 1000
+                REQUEST_SECONDS.labels("cascade").observe(result.latency_ms / 1000)
+                background_tasks.add_task(feature_service.record_velocity, transaction)
+                
+                logger.info(f"Transaction {transaction.id} cleared by cascade: {first_stage_score:.4f} ({result.latency_ms:.2f}ms)")
+                return result
+        
+        # Generate features
+        features = await feature_service.generate_features(transaction, db, deadline)
         
         # Score transaction
-        result = await scoring_service.score_transaction(transaction, features, db)
+        result = await scoring_service.score_transaction(transaction, features, db, deadline)
         
         # Calculate latency
         latency_ms = (time.time() - start_time) * 1000
         result.latency_ms = latency_ms
+        REQUEST_SECONDS.labels("production").observe(latency_ms / 1000)
         
-        # Create alert if needed (background task)
-        if result.p_fraud > scoring_service.threshold:
-            background_tasks.add_task(
-                create_alert_if_needed,
-                transaction.id,
-                result.p_fraud,
-                result.reasons,
-                db
-            )
-        
+        if result.degraded_components:
+            logger.info(f"Transaction {transaction.id} scored degraded without {', '.join(result.degraded_components)}")
         logger.info(f"Transaction {transaction.id} scored: {result.p_fraud:.4f} ({latency_ms:.2f}ms)")
         return result
+    
+    try:
+        with tracer.trace("score", tx_id=transaction.id, card_id=transaction.card_id), \
+                track_queries(f"Transaction {transaction.id}"):
+            cache = get_idempotency_cache()
+            if cache is None:
+                return await compute()
+            
+            result, replayed = await cache.get_or_compute(transaction.id, compute)
+            if replayed:
+                set_attribute("replayed", True)
+                result.latency_ms = (time.time() - start_time) * 1000
+                REQUEST_SECONDS.labels("replay").observe(result.latency_ms / 1000)
+                response.headers["Idempotent-Replay"] = "true"
+                logger.info(f"Transaction {transaction.id} replayed from idempotency cache ({result.latency_ms:.2f}ms)")
+            return result
         
     except Exception as e:
+        ERRORS.labels("score").inc()
         logger.error(f"Error scoring transaction {transaction.id}: {e}")
         raise HTTPException(status_code=500, detail=f"Scoring failed: {str(e)}")
 
 @router.post("/batch-score")
 async def batch_score_transactions(
     transactions: list[TransactionRequest],
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_scoring_db),
     scoring_service: ScoringService = Depends()
 ):
     """
@@ -72,10 +119,10 @@ async def batch_score_transactions(
     
     for transaction in transactions:
         try:
-            features = await feature_service.generate_features(transaction, db)
-            result = await scoring_service.score_transaction(transaction, features, db)
+            result = await _score_one(transaction, feature_service, scoring_service, db)
             results.append(result)
         except Exception as e:
+            ERRORS.labels("batch").inc()
             logger.error(f"Error in batch scoring transaction {transaction.id}: {e}")
             results.append({
                 "tx_id": transaction.id,
@@ -85,10 +132,189 @@ async def batch_score_transactions(
     
     return {"results": results, "total": len(results)}
 
-async def create_alert_if_needed(tx_id: int, fraud_prob: float, reasons: list, db: Session):
-    """Background task to create alerts for high-risk transactions"""
-    from ...models.database import Alert
-    from ...services.alert_service import AlertService
+@router.post("/batch-score/stream")
+async def stream_batch_score(
+    request: Request,
+    scoring_service: ScoringService = Depends()
+):
+    """
+    Score an NDJSON stream of transactions of any length.
+    
+    The body is parsed incrementally, up to STREAM_SCORING_CONCURRENCY
+    transactions are scored at once, and each ScoringResponse is streamed back
+    as an NDJSON line as soon as it is ready (completion order, not input
+    order). Bounded queues between the stages give end-to-end backpressure, so
+    a slow reader or writer throttles the other side instead of buffering.
+    """
+    return StreamingResponse(
+        _stream_scores(request, scoring_service),
+        media_type="application/x-ndjson"
+    )
+
+@router.post("/batch-score/arrow")
+async def columnar_batch_score(
+    request: Request,
+    db: Session = Depends(get_db),
+    scoring_service: ScoringService = Depends()
+):
+    """
+    Score a columnar batch sent as an Arrow IPC stream (see docs/API.md).
+    
+    Validation is vectorised over whole columns and the columns go straight
+    into batch feature generation and model scoring; no per-row request or
+    response objects are built. The response is an Arrow IPC stream with one
+    row per request row, in request order.
+    """
+    try:
+        table = read_ipc(await request.body())
+        if table.num_rows > settings.COLUMNAR_MAX_ROWS:
+            raise ValueError(f"Batch size cannot exceed {settings.COLUMNAR_MAX_ROWS}")
+        batch, errors = validate_table(table)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    scores: Dict[str, Any] = {}
+    if len(batch):
+        try:
+            start = time.perf_counter()
+            features = await FeatureService().generate_features_batch(batch, db)
+            STAGE_SECONDS.labels("features_batch").observe_since(start)
+            start = time.perf_counter()
+            scores = await run_db(scoring_service.score_batch, batch.tx_id, features, db, batch)
+            STAGE_SECONDS.labels("score_batch").observe_since(start)
+            SCORED.labels("columnar").inc(len(batch))
+            FLAGGED.labels("columnar").inc(int(scores["is_fraud"].sum()))
+        except Exception as e:
+            ERRORS.labels("columnar").inc()
+            logger.error(f"Error in columnar batch scoring ({len(batch)} rows): {e}")
+            await run_db(db.rollback)
+            scores = {"error": [f"Scoring failed: {e}"] * len(batch)}
+    
+    body = write_scores_ipc(table, batch, scores, errors, settings.MODEL_VERSION)
+    return Response(content=body, media_type=ARROW_STREAM_MEDIA_TYPE)
+
+async def _score_one(
+    transaction: TransactionRequest,
+    feature_service: FeatureService,
+    scoring_service: ScoringService,
+    db: Session
+) -> ScoringResponse:
+    """Score one transaction for the batch paths, taking the cascade fast path if cleared"""
+    async def compute() -> ScoringResponse:
+        cascade = get_cascade()
+        if cascade is not None:
+            first_stage_score, cleared = cascade.evaluate(transaction)
+            if cleared:
+                result = await scoring_service.score_cascade_fast_path(
+                    transaction, first_stage_score, cascade.model.version, db
+                )
+                await feature_service.record_velocity(transaction)
+                return result
+        
+        features = await feature_service.generate_features(transaction, db)
+        return await scoring_service.score_transaction(transaction, features, db)
+    
+    with tracer.trace("score", tx_id=transaction.id, card_id=transaction.card_id, batch=True), \
+            track_queries(f"Transaction {transaction.id}"):
+        cache = get_idempotency_cache()
+        if cache is None:
+            return await compute()
+        result, _ = await cache.get_or_compute(transaction.id, compute)
+        return result
+
+def _check_line_length(line: bytes):
+    if len(line) > settings.STREAM_MAX_LINE_BYTES:
+        raise ValueError(f"NDJSON line exceeds {settings.STREAM_MAX_LINE_BYTES} bytes")
+
+async def _iter_ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into non-empty lines without holding more than one line"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\n" in buffer:
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                _check_line_length(line)
+                if line.strip():
+                    yield line
+        # The unterminated rest, before a huge line accumulates
+        _check_line_length(buffer)
+    if buffer.strip():
+        yield buffer
+
+async def _stream_scores(request: Request, scoring_service: ScoringService) -> AsyncIterator[bytes]:
+    concurrency = settings.STREAM_SCORING_CONCURRENCY
+    inbox: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    feature_service = FeatureService()
+    done = object()
+    
+    async def reader():
+        line_no = 0
+        try:
+            async for line in _iter_ndjson_lines(request.stream()):
+                line_no += 1
+                await inbox.put((line_no, line))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error reading NDJSON scoring stream: {e}")
+            await outbox.put(json.dumps({"line": line_no + 1, "error": str(e)}).encode() + b"\n")
+        for _ in range(concurrency):
+            await inbox.put(done)
     
-    alert_service = AlertService()
-    await alert_service.create_alert(tx_id, fraud_prob, reasons, db)
\ No newline at end of file
+    async def worker():
+        # Each worker keeps its own session; sessions must not be shared across tasks
+        db = SessionLocal()
+        try:
+            while True:
+                item = await inbox.get()
+                if item is done:
+                    break
+                line_no, line = item
+                try:
+                    transaction = TransactionRequest.model_validate_json(line)
+                except Exception as e:
+                    await outbox.put(json.dumps({"line": line_no, "error": str(e)}).encode() + b"\n")
+                    continue
+                try:
+                    result = await _score_one(transaction, feature_service, scoring_service, db)
+                    payload = result.model_dump_json().encode()
+                except Exception as e:
+                    ERRORS.labels("stream").inc()
+                    logger.error(f"Error in stream scoring transaction {transaction.id}: {e}")
+                    await run_db(db.rollback)
+                    payload = json.dumps({"tx_id": transaction.id, "error": str(e), "p_fraud": None}).encode()
+                await outbox.put(payload + b"\n")
+        finally:
+            db.close()
+    
+    async def run():
+        try:
+            await asyncio.gather(reader(), *(worker() for _ in range(concurrency)))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"NDJSON scoring stream failed: {e}")
+        await outbox.put(done)
+    
+    runner = asyncio.create_task(run())
+    try:
+        while True:
+            item = await outbox.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        # Client went away or the stream finished: stop reading and scoring
+        runner.cancel()
+
+@router.get("/cascade/stats")
+async def cascade_stats():
+    """
+    Fraction of traffic cleared by the cascade first stage in this worker
+    """
+    cascade = get_cascade()
+    if cascade is None:
+        return {"enabled": False}
+    return cascade.stats()
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Admission control and load shedding.
+
+Scoring requests are admitted through bounded in-flight pools with a small
+wait queue. A request that cannot get a slot before its queue deadline (or
+finds the queue full) is answered immediately with 503 and Retry-After
+instead of adding to the latency of everything already in flight.
+
+Single /score and /batch-score traffic use separate pools, and batch requests
+are shed first whenever single-score requests are already queueing.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+from fastapi.responses import JSONResponse
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionPool:
+    """Bounded in-flight counter with a FIFO wait queue"""
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout_ms: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout_ms / 1000.0
+        self.in_flight = 0
+        self._waiters: deque = deque()
+
+        # Counters
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rejected_priority = 0
+        self.waited = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting at most queue_timeout. Returns False if shed."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+        if len(self._waiters) >= self.queue_size:
+            self.rejected_queue_full += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            # release() hands its slot over by resolving the future
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            return False
+        except asyncio.CancelledError:
+            # Client went away; pass on a slot we were handed in the meantime
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            waited = time.monotonic() - started
+            self.waited += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+        self.admitted += 1
+        return True
+
+    def release(self):
+        """Free a slot, handing it to the oldest live waiter if any"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_priority": self.rejected_priority,
+            "waited": self.waited,
+            "wait_ms_avg": (self.wait_seconds_total / self.waited * 1000) if self.waited else 0.0,
+            "wait_ms_max": self.wait_seconds_max * 1000
+        }
+
+
+class AdmissionController:
+    """Routes scoring paths to their admission pool"""
+
+    SCORE_PATH = "/api/v1/scoring/score"
+    BATCH_PATH_PREFIX = "/api/v1/scoring/batch-score"
+
+    def __init__(self):
+        self.score_pool = AdmissionPool(
+            "score",
+            limit=settings.MAX_CONCURRENT_REQUESTS,
+            queue_size=settings.ADMISSION_QUEUE_SIZE,
+            queue_timeout_ms=settings.ADMISSION_QUEUE_TIMEOUT_MS
+        )
+        self.batch_pool = AdmissionPool(
+            "batch",
+            limit=settings.ADMISSION_BATCH_MAX_CONCURRENT,
+            queue_size=settings.ADMISSION_BATCH_QUEUE_SIZE,
+            queue_timeout_ms=settings.ADMISSION_BATCH_QUEUE_TIMEOUT_MS
+        )
+
+    def pool_for(self, path: str) -> Optional[AdmissionPool]:
+        if path == self.SCORE_PATH:
+            return self.score_pool
+        if path.startswith(self.BATCH_PATH_PREFIX):
+            return self.batch_pool
+        return None
+
+    async def admit(self, pool: AdmissionPool) -> bool:
+        # Single scores have priority: shed batches while they are queueing
+        if pool is self.batch_pool and self.score_pool.queue_depth > 0:
+            pool.rejected_priority += 1
+            return False
+        return await pool.acquire()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "score": self.score_pool.stats(),
+            "batch": self.batch_pool.stats()
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that sheds scoring requests the pools cannot admit"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        pool = self.controller.pool_for(scope["path"])
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.controller.admit(pool):
+            response = JSONResponse(
+                {"detail": f"Server overloaded ({pool.name} admission), retry later"},
+                status_code=503,
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release()
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,220 @@
+"""
+Circuit breakers for external dependencies (Redis, graph backend, Postgres).
+
+Each breaker tracks the outcome of the last BREAKER_WINDOW_SIZE calls. When
+the failure rate in that window crosses BREAKER_FAILURE_RATE the breaker
+opens and callers fall back immediately instead of each waiting for their
+own timeout. After BREAKER_OPEN_SECONDS a single half-open probe is let
+through; its outcome closes the breaker again or re-opens it.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from ..config import settings
+from .metrics import FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+_NO_FALLBACK = object()
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited by an open breaker"""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 5.0
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._outcomes: deque = deque(maxlen=window_size)
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+        # Counters
+        self.calls = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.times_opened = 0
+
+    @property
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def allow_request(self) -> bool:
+        """Whether a call may go to the dependency right now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.calls += 1
+            if self.state == self.HALF_OPEN:
+                logger.info(f"Circuit breaker '{self.name}' closed after successful probe")
+                self.state = self.CLOSED
+                self._probe_in_flight = False
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self._outcomes.append(False)
+
+            if self.state == self.HALF_OPEN:
+                self._open()
+            elif (
+                self.state == self.CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and self.failure_rate >= self.failure_rate_threshold
+            ):
+                self._open()
+
+    def abandon_probe(self):
+        """Let another caller probe if this one went away without an outcome"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self.times_opened += 1
+        logger.warning(
+            f"Circuit breaker '{self.name}' opened (failure rate {self.failure_rate:.2f})"
+        )
+
+    async def call(
+        self,
+        func: Callable,
+        *args,
+        fallback: Any = _NO_FALLBACK,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        """Await func(*args) through the breaker.
+
+        With a fallback, open-circuit and failed calls return the fallback
+        instead of raising. A timeout counts as a failure.
+        """
+        if not self.allow_request():
+            if fallback is _NO_FALLBACK:
+                raise CircuitOpenError(self.name)
+            FALLBACKS.labels(self.name).inc()
+            return fallback
+
+        try:
+            if timeout is not None:
+                result = await asyncio.wait_for(func(*args, **kwargs), timeout=timeout)
+            else:
+                result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            self.abandon_probe()
+            raise
+        except Exception:
+            self.record_failure()
+            if fallback is _NO_FALLBACK:
+                raise
+            FALLBACKS.labels(self.name).inc()
+            return fallback
+
+        self.record_success()
+        return result
+
+    def guard(self) -> "_BreakerGuard":
+        """Context manager for blocks of calls: `with breaker.guard(): ...`
+
+        Raises CircuitOpenError on entry while open and records the block's
+        outcome on exit.
+        """
+        return _BreakerGuard(self)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failure_rate": self.failure_rate,
+            "calls": self.calls,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "times_opened": self.times_opened
+        }
+
+
+class _BreakerGuard:
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+
+    def __enter__(self):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.name)
+        return self.breaker
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            self.breaker.abandon_probe()
+        elif exc_type is None:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker for a dependency, created on first use"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers.setdefault(name, CircuitBreaker(
+            name,
+            failure_rate_threshold=settings.BREAKER_FAILURE_RATE,
+            window_size=settings.BREAKER_WINDOW_SIZE,
+            min_calls=settings.BREAKER_MIN_CALLS,
+            open_seconds=settings.BREAKER_OPEN_SECONDS
+        ))
+    return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
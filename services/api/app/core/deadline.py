@@ -0,0 +1,52 @@
+"""
+Per-request latency budgets.
+
+Each scoring request carries a Deadline. Optional pipeline stages (graph
+embeddings, SHAP explanations, heavier DB aggregates) check the remaining
+budget before running and are skipped when it is too low, recording the
+skipped component so the response can report a degraded decision.
+"""
+
+import time
+from typing import List, Optional
+
+from ..config import settings
+from .metrics import FALLBACKS
+
+
+class Deadline:
+    """Monotonic-clock deadline for a single request"""
+
+    def __init__(self, budget_ms: float):
+        self.budget_ms = budget_ms
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_ms / 1000.0
+        self.degraded: List[str] = []
+
+    @classmethod
+    def for_request(cls, requested_ms: Optional[float] = None) -> "Deadline":
+        """Deadline from an optional client-supplied budget, capped by settings"""
+        budget_ms = settings.SCORING_DEADLINE_MS
+        if requested_ms is not None and requested_ms > 0:
+            budget_ms = min(budget_ms, requested_ms)
+        return cls(min(budget_ms, settings.TIMEOUT_SECONDS * 1000.0))
+
+    def remaining_ms(self) -> float:
+        return max((self.expires_at - time.monotonic()) * 1000.0, 0.0)
+
+    def remaining_seconds(self) -> float:
+        return self.remaining_ms() / 1000.0
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def allows(self, reserve_ms: float) -> bool:
+        """True if at least reserve_ms of budget is left"""
+        return self.remaining_ms() >= reserve_ms
+
+    def degrade(self, component: str):
+        """Record that an optional component was skipped or cut short"""
+        if component not in self.degraded:
+            self.degraded.append(component)
+            FALLBACKS.labels(component).inc()
@@ -0,0 +1,109 @@
+"""
+Bounded executor for blocking database work, and an event-loop lag monitor.
+
+The SQLAlchemy Session is synchronous, so every ORM call made from an async
+handler has to leave the event loop or a single slow query stalls every
+request in the worker. run_db() sends the call to a dedicated thread pool
+sized to the engine's connection pool (DB_POOL_SIZE + DB_MAX_OVERFLOW): no
+more threads than connections, and DB work cannot starve the default
+executor used by other libraries.
+
+A Session is not thread-safe. Callers hand it to run_db() one call at a
+time (each await completes before the next call), never concurrently.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW,
+    thread_name_prefix="db"
+)
+
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run blocking ORM work on the DB executor.
+
+    Context variables are copied into the worker thread. Cancelling the
+    awaiting task does not interrupt a query that is already running.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(db_executor, call)
+
+
+def executor_stats() -> Dict[str, Any]:
+    return {
+        "max_workers": db_executor._max_workers,
+        "threads": len(db_executor._threads),
+        "queued": db_executor._work_queue.qsize()
+    }
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that sleeps on a fixed interval.
+
+    The lag is the scheduling delay every coroutine in the worker sees; it
+    rises when something blocks the loop or the loop is saturated.
+    """
+
+    def __init__(self, interval_ms: float, warn_ms: float, window: int = 600):
+        self.interval = interval_ms / 1000.0
+        self.warn_ms = warn_ms
+        self._samples: deque = deque(maxlen=window)
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(time.perf_counter() - expected, 0.0) * 1000
+            self.last_ms = lag_ms
+            self.max_ms = max(self.max_ms, lag_ms)
+            self._samples.append(lag_ms)
+            if lag_ms > self.warn_ms:
+                logger.warning(f"Event loop lag {lag_ms:.1f}ms (interval {self.interval * 1000:.0f}ms)")
+
+    def stats(self) -> Dict[str, Any]:
+        samples = np.array(self._samples) if self._samples else np.zeros(1)
+        return {
+            "last_ms": self.last_ms,
+            "p50_ms": float(np.percentile(samples, 50)),
+            "p99_ms": float(np.percentile(samples, 99)),
+            "max_ms": self.max_ms,
+            "samples": len(self._samples),
+            "interval_ms": self.interval * 1000
+        }
+
+
+loop_lag_monitor = LoopLagMonitor(settings.LOOP_LAG_INTERVAL_MS, settings.LOOP_LAG_WARN_MS)
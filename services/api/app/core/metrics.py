@@ -0,0 +1,439 @@
+"""
+Low-overhead metrics with Prometheus exposition.
+
+Recording is a dict lookup for the label child, a bisect and a couple of
+attribute increments, also for histograms that feed the sliding-window
+percentiles of core.slo: those count in the finer log buckets of the
+window series and are summed into their Prometheus buckets at scrape time
+(observe_since() measures about 0.35µs plain and 0.43µs windowed,
+perf_counter() included; scripts/bench_metrics.py). No locks, because
+metrics are recorded from the event loop thread only. Time a stage with `start = perf_counter()` ...
+`STAGE_SECONDS.labels(stage).observe_since(start)`. Values produced by other objects
+(admission pools, breakers, connection pools, caches) are read through
+callbacks at scrape time and cost nothing on the hot path.
+
+Multi-process workers: when METRICS_MULTIPROC_DIR is set, each worker writes
+a snapshot of its values to <dir>/metrics_<pid>.json every
+METRICS_SNAPSHOT_SECONDS (and at shutdown). A scrape landing on any worker
+merges all snapshots: counters and histograms are summed over every file,
+including those of exited workers so totals never go backwards; gauges are
+summed over live workers only. Empty the directory before starting the
+workers.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from bisect import bisect_left
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+
+from ..config import settings
+from .slo import latency_tracker
+
+logger = logging.getLogger(__name__)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+# Seconds; scoring stages range from tens of microseconds to the request budget
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Statements / round trips per request
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 12, 16, 24, 32, 48, 64, 128)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def observe_since(self, start: float):
+        """Observe the seconds elapsed since `start = perf_counter()`.
+
+        Cheaper than a context manager: no object is allocated per timing.
+        """
+        elapsed = perf_counter() - start
+        self.counts[bisect_left(self.bounds, elapsed)] += 1
+        self.sum += elapsed
+
+
+class _WindowedHistogramChild(_HistogramChild):
+    """Histogram child counting in the log buckets of a sliding-window latency series (core.slo).
+
+    Recording is the plain child's; the series reads the counts on its own
+    schedule, and the Prometheus buckets are sums of log buckets.
+    """
+
+    __slots__ = ("prometheus_bounds", "_groups")
+
+    def __init__(self, bounds: Sequence[float], window):
+        self.bounds = window.buckets.edges
+        self.counts = window.counts
+        self.sum = 0.0
+        self.prometheus_bounds = bounds
+        # Log bucket -> Prometheus bucket (every Prometheus edge is a log bucket edge)
+        self._groups = [bisect_left(bounds, edge) for edge in self.bounds] + [len(bounds)]
+
+    def prometheus_counts(self) -> List[int]:
+        counts = [0] * (len(self.prometheus_bounds) + 1)
+        for group, count in zip(self._groups, self.counts):
+            counts[group] += count
+        return counts
+
+
+_CHILD_TYPES = {COUNTER: _CounterChild, GAUGE: _GaugeChild}
+
+
+class Metric:
+    """A named metric family; labels() returns a cached child to record on"""
+
+    def __init__(self, kind: str, name: str, documentation: str,
+                 labelnames: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS,
+                 window_group: Optional[str] = None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.window_group = window_group
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if window_group:
+            latency_tracker.align(self.buckets)
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            if self.kind == HISTOGRAM and self.window_group:
+                child = _WindowedHistogramChild(
+                    self.buckets, latency_tracker.series(self.window_group, "/".join(values))
+                )
+            elif self.kind == HISTOGRAM:
+                child = _HistogramChild(self.buckets)
+            else:
+                child = _CHILD_TYPES[self.kind]()
+            self._children[values] = child
+        return child
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        if self.kind == HISTOGRAM and self.window_group:
+            return [(labels, [c.prometheus_counts(), c.sum]) for labels, c in self._children.items()]
+        if self.kind == HISTOGRAM:
+            return [(labels, [list(c.counts), c.sum]) for labels, c in self._children.items()]
+        return [(labels, c.value) for labels, c in self._children.items()]
+
+
+class _Callback:
+    """Metric whose samples are produced by a function at scrape time"""
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: Sequence[str],
+                 func: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = ()
+        self.func = func
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        try:
+            return [(tuple(labels), float(value)) for labels, value in self.func()]
+        except Exception as e:
+            logger.warning(f"Metric callback {self.name} failed: {e}")
+            return []
+
+
+class MetricsRegistry:
+    def __init__(self, multiproc_dir: Optional[str] = None):
+        self.multiproc_dir = multiproc_dir
+        self._metrics: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._add(Metric(COUNTER, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._add(Metric(GAUGE, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = STAGE_BUCKETS, window_group: Optional[str] = None) -> Metric:
+        """window_group also tracks each child in the sliding-window percentiles of core.slo"""
+        return self._add(Metric(HISTOGRAM, name, documentation, labelnames, buckets, window_group))
+
+    def callback(self, kind: str, name: str, documentation: str, labelnames: Sequence[str],
+                 func: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]):
+        self._add(_Callback(kind, name, documentation, labelnames, func))
+
+    # Snapshots
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "kind": m.kind,
+                "doc": m.documentation,
+                "labelnames": list(m.labelnames),
+                "buckets": list(m.buckets),
+                "samples": [[list(labels), value] for labels, value in m.samples()]
+            }
+            for name, m in self._metrics.items()
+        }
+
+    def write_snapshot(self):
+        if not self.multiproc_dir:
+            return
+        path = os.path.join(self.multiproc_dir, f"metrics_{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {e}")
+
+    def start(self):
+        """Begin periodic snapshots (multi-process mode only)"""
+        if self.multiproc_dir and self._task is None:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.write_snapshot()
+
+    async def _snapshot_loop(self):
+        while True:
+            self.write_snapshot()
+            await asyncio.sleep(settings.METRICS_SNAPSHOT_SECONDS)
+
+    def _gather(self) -> Dict[str, Any]:
+        """This process's live values merged with other workers' snapshots"""
+        merged = self.snapshot()
+        if not self.multiproc_dir:
+            return merged
+
+        own = f"metrics_{os.getpid()}.json"
+        try:
+            files = [f for f in os.listdir(self.multiproc_dir) if f.startswith("metrics_") and f.endswith(".json")]
+        except OSError:
+            files = []
+
+        for filename in files:
+            if filename == own:
+                continue
+            pid = int(filename[len("metrics_"):-len(".json")])
+            try:
+                with open(os.path.join(self.multiproc_dir, filename)) as f:
+                    other = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(pid)
+            for name, family in other.items():
+                if family["kind"] == GAUGE and not alive:
+                    continue
+                target = merged.setdefault(name, {**family, "samples": []})
+                _merge_samples(target, family)
+        return merged
+
+    def render(self) -> bytes:
+        collector_registry = CollectorRegistry(auto_describe=False)
+        collector_registry.register(_Collector(self._gather()))
+        return generate_latest(collector_registry)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_samples(target: Dict[str, Any], family: Dict[str, Any]):
+    index = {tuple(labels): i for i, (labels, _) in enumerate(target["samples"])}
+    for labels, value in family["samples"]:
+        i = index.get(tuple(labels))
+        if i is None:
+            target["samples"].append([labels, value])
+            continue
+        current = target["samples"][i][1]
+        if family["kind"] == HISTOGRAM:
+            counts = [a + b for a, b in zip(current[0], value[0])]
+            target["samples"][i][1] = [counts, current[1] + value[1]]
+        else:
+            target["samples"][i][1] = current + value
+
+
+class _Collector:
+    def __init__(self, families: Dict[str, Any]):
+        self.families = families
+
+    def collect(self):
+        for name, family in self.families.items():
+            labelnames = family["labelnames"]
+            if family["kind"] == COUNTER:
+                metric = CounterMetricFamily(name, family["doc"], labels=labelnames)
+                for labels, value in family["samples"]:
+                    metric.add_metric(labels, value)
+            elif family["kind"] == GAUGE:
+                metric = GaugeMetricFamily(name, family["doc"], labels=labelnames)
+                for labels, value in family["samples"]:
+                    metric.add_metric(labels, value)
+            else:
+                metric = HistogramMetricFamily(name, family["doc"], labels=labelnames)
+                bounds = family["buckets"]
+                for labels, (counts, total) in family["samples"]:
+                    cumulative, buckets = 0, []
+                    for bound, count in zip(list(bounds) + [float("inf")], counts):
+                        cumulative += count
+                        buckets.append(("+Inf" if bound == float("inf") else repr(float(bound)), cumulative))
+                    metric.add_metric(labels, buckets, total)
+            yield metric
+
+
+registry = MetricsRegistry(settings.METRICS_MULTIPROC_DIR)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Hot-path metrics
+
+STAGE_SECONDS = registry.histogram(
+    "fraud_scoring_stage_seconds", "Latency of each scoring stage", ["stage"], window_group="stage"
+)
+REQUEST_SECONDS = registry.histogram(
+    "fraud_scoring_request_seconds", "End-to-end scoring latency by route", ["route"], window_group="request"
+)
+SCORED = registry.counter(
+    "fraud_scored_total", "Transactions scored by route", ["route"]
+)
+FLAGGED = registry.counter(
+    "fraud_flagged_total", "Transactions scored above the fraud threshold by route", ["route"]
+)
+FALLBACKS = registry.counter(
+    "fraud_fallbacks_total", "Dependency fallbacks and skipped optional components", ["component"]
+)
+ERRORS = registry.counter(
+    "fraud_errors_total", "Errors by scoring stage", ["stage"]
+)
+REQUEST_QUERIES = registry.histogram(
+    "fraud_request_queries", "DB statements and Redis round trips per scored transaction", ["kind"],
+    buckets=COUNT_BUCKETS
+)
+REQUEST_QUERY_SECONDS = registry.histogram(
+    "fraud_request_query_seconds", "Time per scored transaction spent in DB statements and Redis calls", ["kind"]
+)
+QUERY_BUDGET_EXCEEDED = registry.counter(
+    "fraud_query_budget_exceeded_total", "Scored transactions over their DB or Redis budget", ["kind"]
+)
+REPEATED_STATEMENTS = registry.counter(
+    "fraud_repeated_statement_total", "Scored transactions repeating one SQL statement (N+1 pattern)"
+)
+
+
+def register_process_metrics():
+    """Scrape-time gauges and counters read from the service's runtime objects"""
+    from .admission import admission_controller
+    from .circuit_breaker import _breakers
+    from .executor import executor_stats, loop_lag_monitor
+    from ..database import engine
+    from ..services.idempotency import get_idempotency_cache
+    from ..utils.kafka_client import consumer_stats
+    from ..utils.redis_client import redis_stats
+
+    pools = {"score": admission_controller.score_pool, "batch": admission_controller.batch_pool}
+
+    registry.callback(GAUGE, "fraud_inflight_requests", "Scoring requests being processed", ["pool"],
+                      lambda: [((name, ), pool.in_flight) for name, pool in pools.items()])
+    registry.callback(GAUGE, "fraud_admission_queue_depth", "Scoring requests waiting for admission", ["pool"],
+                      lambda: [((name, ), pool.queue_depth) for name, pool in pools.items()])
+    registry.callback(COUNTER, "fraud_admission_rejected_total", "Scoring requests shed by admission control", ["pool"],
+                      lambda: [((name, ), pool.rejected_queue_full + pool.rejected_timeout + pool.rejected_priority)
+                               for name, pool in pools.items()])
+
+    registry.callback(GAUGE, "fraud_db_pool_connections", "Database connection pool usage", ["state"],
+                      lambda: [(("checked_out", ), engine.pool.checkedout()),
+                               (("idle", ), engine.pool.checkedin()),
+                               (("overflow", ), max(engine.pool.overflow(), 0))])
+    registry.callback(GAUGE, "fraud_db_executor_queued", "Blocking DB calls waiting for an executor thread", [],
+                      lambda: [((), executor_stats()["queued"])])
+    registry.callback(GAUGE, "fraud_event_loop_lag_seconds", "Event loop scheduling delay", ["quantile"],
+                      lambda: [(("last", ), loop_lag_monitor.stats()["last_ms"] / 1000),
+                               (("0.99", ), loop_lag_monitor.stats()["p99_ms"] / 1000)])
+
+    registry.callback(GAUGE, "fraud_breaker_open", "1 while a dependency circuit breaker is not closed", ["dependency"],
+                      lambda: [((name, ), float(b.state != b.CLOSED)) for name, b in _breakers.items()])
+    registry.callback(COUNTER, "fraud_breaker_short_circuited_total", "Calls answered by an open breaker", ["dependency"],
+                      lambda: [((name, ), b.short_circuited) for name, b in _breakers.items()])
+
+    def _idempotency():
+        cache = get_idempotency_cache()
+        if cache is None:
+            return []
+        stats = cache.stats()
+        return [(("idempotency_local", ), stats["hits"]), (("idempotency_shared", ), stats["shared_hits"]),
+                (("idempotency_coalesced", ), stats["coalesced"])]
+
+    registry.callback(COUNTER, "fraud_cache_hits_total", "Responses served from a cache", ["cache"], _idempotency)
+    registry.callback(COUNTER, "fraud_redis_timeouts_total", "Redis calls that exceeded their timeout", ["op"],
+                      lambda: [(("read", ), redis_stats()["read_timeouts"]),
+                               (("write", ), redis_stats()["write_timeouts"])])
+    registry.callback(COUNTER, "fraud_redis_hedges_total", "Hedged Redis reads", ["outcome"],
+                      lambda: [(("fired", ), redis_stats()["hedges_fired"]),
+                               (("won", ), redis_stats()["hedges_won"])])
+    registry.callback(GAUGE, "fraud_kafka_consumer_lag", "Records behind the partition high watermark", ["topic"],
+                      lambda: [((topic, ), sum(stats.lag.values())) for topic, stats in consumer_stats.items()])
+    registry.callback(COUNTER, "fraud_kafka_consumer_restarts_total", "Kafka consumer restarts after errors", ["topic"],
+                      lambda: [((topic, ), stats.restarts) for topic, stats in consumer_stats.items()])
@@ -0,0 +1,300 @@
+"""
+Statistical stack-sampling profiler for live workers.
+
+A sampler thread reads every thread's current frame (sys._current_frames())
+at a fixed interval and counts the stacks it sees. Nothing is hooked into
+the profiled code, so the cost is one stack walk per thread per interval
+(tens of microseconds at the default 10ms) paid by the sampler thread while
+it holds the GIL, and nothing at all while no profile is running.
+
+Two modes:
+- Worker profile (profile_worker): every thread of the worker for N seconds.
+- Request profile (ProfileMiddleware, X-Profile header): only the event loop
+  thread, and only while it is running a task that belongs to the profiled
+  request. Tasks the request spawns (gather, the idempotency cache,
+  hedged reads) are tracked through a task factory installed for the
+  duration of the request. Work the request sends to run_db() threads is
+  not attributed; it shows up as time awaited.
+
+Profiles render as collapsed stacks (flamegraph.pl, speedscope, inferno) or
+as a speedscope JSON document.
+"""
+
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import uuid
+import weakref
+from collections import Counter, deque
+from datetime import datetime
+from time import perf_counter
+from types import CodeType
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from .security import ADMIN_TOKEN_HEADER, admin_token_valid
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+_PATH_PREFIXES = sorted({p for p in sys.path if p and os.path.isdir(p)} | {os.getcwd()}, key=len, reverse=True)
+_labels: Dict[CodeType, str] = {}
+
+
+def _frame_label(code: CodeType) -> str:
+    """`function (relative/path.py:first_line)`, built once per code object"""
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        for prefix in _PATH_PREFIXES:
+            if path.startswith(prefix):
+                path = path[len(prefix):].lstrip(os.sep)
+                break
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return label
+
+
+class Profile:
+    """Stack counts collected by one sampling session"""
+
+    def __init__(self, name: str, interval_ms: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.interval_ms = interval_ms
+        self.started_at = datetime.utcnow()
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+
+    def record(self, thread: str, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        stack.append(thread)
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 3),
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "stacks": len(self.stacks)
+        }
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format: `thread;outer;...;inner count`"""
+        return "\n".join(
+            f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()
+        ) + "\n"
+
+    def speedscope(self) -> Dict[str, Any]:
+        """Speedscope file with one sampled profile per thread"""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[str, int] = {}
+        per_thread: Dict[str, Tuple[List[List[int]], List[float]]] = {}
+
+        for stack, count in self.stacks.items():
+            thread, calls = stack[0], stack[1:]
+            ids = []
+            for label in calls:
+                if label not in index:
+                    index[label] = len(frames)
+                    name, _, location = label.partition(" (")
+                    file, _, line = location.rstrip(")").rpartition(":")
+                    frames.append({"name": name, "file": file, "line": int(line) if line.isdigit() else None})
+                ids.append(index[label])
+            samples, weights = per_thread.setdefault(thread, ([], []))
+            samples.append(ids)
+            weights.append(count * self.interval_ms)
+
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": self.name,
+            "exporter": "fraud-detection-api",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights
+                }
+                for thread, (samples, weights) in per_thread.items()
+            ]
+        }
+
+
+class StackSampler:
+    """Background thread sampling stacks into a Profile until stopped.
+
+    With `loop` and `tasks` set, only the loop's thread is sampled, and only
+    while its current task is one of `tasks`.
+    """
+
+    def __init__(self, profile: Profile, loop: Optional[asyncio.AbstractEventLoop] = None,
+                 loop_thread: Optional[int] = None, tasks: Optional[weakref.WeakSet] = None):
+        self.profile = profile
+        self.interval = profile.interval_ms / 1000.0
+        self.loop = loop
+        self.loop_thread = loop_thread
+        self.tasks = tasks
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._names: Dict[int, str] = {}
+
+    def start(self):
+        self._started = perf_counter()
+        self._thread.start()
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        self._thread.join()
+        self.profile.duration_ms = (perf_counter() - self._started) * 1000
+        return self.profile
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._names.get(ident)
+        if name is None:
+            self._names = {t.ident: t.name for t in threading.enumerate()}
+            name = self._names.setdefault(ident, str(ident))
+        return name
+
+    def _run(self):
+        profile = self.profile
+        next_at = perf_counter() + self.interval
+        while not self._stop.wait(max(next_at - perf_counter(), 0.0)):
+            next_at += self.interval
+            frames = sys._current_frames()
+            if self.tasks is not None:
+                frame = frames.get(self.loop_thread)
+                task = asyncio.current_task(self.loop)
+                if frame is not None and task is not None and task in self.tasks:
+                    profile.record(self._thread_name(self.loop_thread), frame)
+                    profile.samples += 1
+                continue
+            for ident, frame in frames.items():
+                name = self._thread_name(ident)
+                if name == "profiler":
+                    continue
+                profile.record(name, frame)
+            profile.samples += 1
+
+
+# Request profiles: tasks spawned while serving the request are adopted
+# through a task factory, which runs in the spawning task's context.
+
+_request_tasks: contextvars.ContextVar[Optional[weakref.WeakSet]] = contextvars.ContextVar(
+    "profiled_tasks", default=None
+)
+_active_requests = 0
+_previous_factory = None
+
+
+def _task_factory(loop, coro, **kwargs):
+    if _previous_factory is not None:
+        task = _previous_factory(loop, coro, **kwargs)
+    else:
+        task = asyncio.Task(coro, loop=loop, **kwargs)
+    tasks = _request_tasks.get()
+    if tasks is not None:
+        tasks.add(task)
+    return task
+
+
+def _install_task_factory(loop):
+    global _active_requests, _previous_factory
+    if _active_requests == 0:
+        _previous_factory = loop.get_task_factory()
+        loop.set_task_factory(_task_factory)
+    _active_requests += 1
+
+
+def _remove_task_factory(loop):
+    global _active_requests, _previous_factory
+    _active_requests -= 1
+    if _active_requests == 0:
+        loop.set_task_factory(_previous_factory)
+        _previous_factory = None
+
+
+class ProfilerBusy(Exception):
+    """A worker profile is already running"""
+
+
+_worker_lock = asyncio.Lock()
+recent_profiles: deque = deque(maxlen=settings.PROFILE_KEEP)
+
+
+async def profile_worker(seconds: float, interval_ms: float) -> Profile:
+    """Sample every thread of this worker for `seconds`"""
+    if _worker_lock.locked():
+        raise ProfilerBusy("A worker profile is already running")
+    async with _worker_lock:
+        sampler = StackSampler(Profile(f"worker {os.getpid()} ({seconds:g}s)", interval_ms))
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile = await asyncio.get_running_loop().run_in_executor(None, sampler.stop)
+    recent_profiles.append(profile)
+    return profile
+
+
+def get_profile(profile_id: str) -> Optional[Profile]:
+    for profile in recent_profiles:
+        if profile.id == profile_id:
+            return profile
+    return None
+
+
+class ProfileMiddleware:
+    """ASGI middleware profiling single requests sent with an X-Profile header.
+
+    The header must come with a valid X-Admin-Token; the response carries an
+    X-Profile-Id to fetch the profile from the admin endpoints.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        token = headers.get(ADMIN_TOKEN_HEADER.lower().encode())
+        # latin-1, as Starlette decodes headers for require_admin: any bytes decode
+        if b"x-profile" not in headers or not admin_token_valid(token.decode("latin-1") if token else None):
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        profile = Profile(f"{scope['method']} {scope['path']}", settings.PROFILE_REQUEST_INTERVAL_MS)
+        tasks = weakref.WeakSet([asyncio.current_task()])
+        sampler = StackSampler(profile, loop=loop, loop_thread=threading.get_ident(), tasks=tasks)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token_var = _request_tasks.set(tasks)
+        _install_task_factory(loop)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            _remove_task_factory(loop)
+            _request_tasks.reset(token_var)
+            recent_profiles.append(profile)
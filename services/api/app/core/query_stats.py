@@ -0,0 +1,172 @@
+"""
+Per-request DB statement and Redis call accounting.
+
+track_queries() opens a counting scope for one scored transaction. Every
+SQL statement executed on any engine (sync Sessions on the DB executor and
+the async engine alike, via SQLAlchemy cursor events) and every Redis round
+trip made by RedisClient is counted and timed into the scope's
+QueryStats. The scope follows the request through context variables, so
+run_db() threads and gathered tasks report into it.
+
+When the scope ends the totals are attached to the active trace, recorded
+in the fraud_request_queries / fraud_request_query_seconds histograms, and
+checked against DB_QUERY_BUDGET / REDIS_CALL_BUDGET; a request that
+exceeds a budget, or repeats one SQL statement N_PLUS_ONE_THRESHOLD times
+(the N+1 pattern), is logged with its statement counts.
+
+assert_query_budget() is the test-side counterpart: it fails when the code
+it wraps issues more statements or Redis calls than declared.
+"""
+
+import contextvars
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ..config import settings
+from .metrics import QUERY_BUDGET_EXCEEDED, REPEATED_STATEMENTS, REQUEST_QUERIES, REQUEST_QUERY_SECONDS
+from .tracing import annotate_trace
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """DB statements and Redis calls made within one scope"""
+
+    __slots__ = ("db_count", "db_seconds", "redis_count", "redis_seconds", "statements", "commands")
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.redis_count = 0
+        self.redis_seconds = 0.0
+        self.statements: Counter = Counter()
+        self.commands: Counter = Counter()
+
+    def repeated_statements(self, threshold: int) -> Dict[str, int]:
+        """Statements executed at least `threshold` times"""
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "db_queries": self.db_count,
+            "db_ms": round(self.db_seconds * 1000, 3),
+            "redis_calls": self.redis_count,
+            "redis_ms": round(self.redis_seconds * 1000, 3)
+        }
+
+
+_current: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def record_redis(command: str, seconds: float):
+    """Count one Redis round trip (a pipeline counts once) in the active scope"""
+    stats = _current.get()
+    if stats is not None:
+        stats.redis_count += 1
+        stats.redis_seconds += seconds
+        stats.commands[command] += 1
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    starts = conn.info.get("query_start")
+    if starts:
+        stats.db_seconds += perf_counter() - starts.pop()
+    stats.db_count += 1
+    stats.statements[statement] += 1
+
+
+@contextmanager
+def track_queries(name: str) -> Iterator[QueryStats]:
+    """Count the DB statements and Redis calls of one scored transaction"""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        _report(name, stats)
+
+
+def _report(name: str, stats: QueryStats):
+    REQUEST_QUERIES.labels("db").observe(stats.db_count)
+    REQUEST_QUERIES.labels("redis").observe(stats.redis_count)
+    REQUEST_QUERY_SECONDS.labels("db").observe(stats.db_seconds)
+    REQUEST_QUERY_SECONDS.labels("redis").observe(stats.redis_seconds)
+    annotate_trace(**stats.to_dict())
+
+    over = []
+    if settings.DB_QUERY_BUDGET and stats.db_count > settings.DB_QUERY_BUDGET:
+        QUERY_BUDGET_EXCEEDED.labels("db").inc()
+        over.append(f"{stats.db_count} DB statements (budget {settings.DB_QUERY_BUDGET})")
+    if settings.REDIS_CALL_BUDGET and stats.redis_count > settings.REDIS_CALL_BUDGET:
+        QUERY_BUDGET_EXCEEDED.labels("redis").inc()
+        over.append(f"{stats.redis_count} Redis calls (budget {settings.REDIS_CALL_BUDGET})")
+    if over:
+        logger.warning(f"{name} over query budget: {', '.join(over)}; "
+                       f"redis commands {dict(stats.commands)}")
+
+    if settings.N_PLUS_ONE_THRESHOLD:
+        repeated = stats.repeated_statements(settings.N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            REPEATED_STATEMENTS.inc()
+            annotate_trace(repeated_statements=repeated)
+            for sql, count in repeated.items():
+                logger.warning(f"{name} executed the same statement {count} times (N+1?): {' '.join(sql.split())[:300]}")
+
+
+@contextmanager
+def assert_query_budget(
+    db: Optional[int] = None,
+    redis: Optional[int] = None,
+    max_repeats: Optional[int] = None
+) -> Iterator[QueryStats]:
+    """Fail if the wrapped code exceeds a declared number of queries.
+
+        with assert_query_budget(db=8, redis=17):
+            await FeatureService().generate_features(transaction, db_session)
+
+    `max_repeats` also bounds how often a single SQL statement may run.
+    Works around sync and async code; counts include run_db() threads and
+    tasks started inside the block.
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+    problems = []
+    if db is not None and stats.db_count > db:
+        statements = "\n".join(f"  {count} x {' '.join(sql.split())[:200]}"
+                               for sql, count in stats.statements.most_common())
+        problems.append(f"{stats.db_count} DB statements, budget {db}:\n{statements}")
+    if redis is not None and stats.redis_count > redis:
+        problems.append(f"{stats.redis_count} Redis calls, budget {redis}: {dict(stats.commands)}")
+    if max_repeats is not None:
+        repeated = {sql: count for sql, count in stats.statements.items() if count > max_repeats}
+        if repeated:
+            problems.append("statements repeated more than "
+                            f"{max_repeats} times: {[' '.join(sql.split())[:200] for sql in repeated]}")
+    if problems:
+        raise AssertionError("Query budget exceeded: " + "; ".join(problems))
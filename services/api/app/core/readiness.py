@@ -0,0 +1,222 @@
+"""
+Background dependency probes behind a cached /ready.
+
+Probing dependencies from the readiness endpoint itself puts a DB query
+(and worse, a hung connection attempt) on every k8s / nginx probe. Instead
+a background task probes every dependency concurrently each
+READINESS_INTERVAL_SECONDS, each probe bounded by READINESS_TIMEOUT_SECONDS,
+and renders the result once per round. /ready returns the pre-rendered
+body, so answering a probe touches no dependency.
+
+Only the dependencies listed in READINESS_REQUIRED gate readiness; the
+others (graph, object store, vector store, Kafka) have fallbacks and are
+reported for visibility.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import text
+
+from ..config import settings
+from .circuit_breaker import breaker_states
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[Optional[str]]]
+
+
+class ProbeResult:
+    """Outcome of the latest probe of one dependency"""
+
+    def __init__(self, required: bool):
+        self.required = required
+        self.ok = False
+        self.latency_ms: Optional[float] = None
+        self.detail: Optional[str] = None
+        self.error: Optional[str] = None
+        self.last_checked: Optional[datetime] = None
+        self.last_success: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ok": self.ok,
+            "required": self.required,
+            "latency_ms": round(self.latency_ms, 3) if self.latency_ms is not None else None,
+            "detail": self.detail,
+            "error": self.error,
+            "last_checked": self.last_checked.isoformat() if self.last_checked else None,
+            "last_success": self.last_success.isoformat() if self.last_success else None
+        }
+
+
+class ReadinessMonitor:
+    def __init__(self, interval: float, timeout: float, required: List[str]):
+        self.interval = interval
+        self.timeout = timeout
+        self.required = set(required)
+        self._checks: Dict[str, Check] = {}
+        self.results: Dict[str, ProbeResult] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.ready = False
+        self.body = json.dumps({"ready": False, "status": "starting", "checks": {}}).encode()
+
+    def register(self, name: str, check: Check):
+        """Add a probe; `check` returns optional detail text or raises"""
+        self._checks[name] = check
+        self.results[name] = ProbeResult(name in self.required)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def response(self) -> Tuple[bytes, int]:
+        """Cached body and status code for /ready"""
+        return self.body, 200 if self.ready else 503
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"Readiness probe round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def probe_all(self):
+        await asyncio.gather(*(self._probe(name, check) for name, check in self._checks.items()))
+        self.ready = all(result.ok for result in self.results.values() if result.required)
+        self.body = json.dumps({
+            "ready": self.ready,
+            "status": "ready" if self.ready else "not_ready",
+            "checked_at": datetime.utcnow().isoformat(),
+            "checks": {name: result.to_dict() for name, result in self.results.items()},
+            "circuit_breakers": breaker_states()
+        }).encode()
+
+    async def _probe(self, name: str, check: Check):
+        result = self.results[name]
+        started = perf_counter()
+        try:
+            result.detail = await asyncio.wait_for(check(), timeout=self.timeout)
+            result.ok = True
+            result.error = None
+            result.last_success = datetime.utcnow()
+        except asyncio.TimeoutError:
+            result.ok = False
+            result.detail = None
+            result.error = f"timed out after {self.timeout * 1000:.0f}ms"
+        except Exception as e:
+            result.ok = False
+            result.detail = None
+            result.error = str(e) or type(e).__name__
+        result.latency_ms = (perf_counter() - started) * 1000
+        result.last_checked = datetime.utcnow()
+        if not result.ok and result.required:
+            logger.warning(f"Readiness probe {name} failed: {result.error}")
+
+
+# Probes
+
+async def probe_database() -> Optional[str]:
+    """SELECT 1 on the pool the scoring path uses"""
+    if settings.DB_ASYNC_ENABLED:
+        from ..database import get_async_engine
+        async with get_async_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return "async"
+
+    from ..database import engine
+    from .executor import run_db
+
+    def _select():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    await run_db(_select)
+    return None
+
+
+async def probe_redis() -> Optional[str]:
+    from ..utils.redis_client import RedisClient
+    await RedisClient().ping()
+    return None
+
+
+def _host_port(address: str, default_port: int) -> Tuple[str, int]:
+    parts = urlsplit(address if "//" in address else f"//{address}")
+    return parts.hostname or "localhost", parts.port or default_port
+
+
+def tcp_probe(address: str, default_port: int) -> Check:
+    """Probe that opens (and closes) a TCP connection"""
+    host, port = _host_port(address, default_port)
+
+    async def check() -> Optional[str]:
+        _, writer = await asyncio.open_connection(host, port)
+        writer.close()
+        await writer.wait_closed()
+        return f"{host}:{port}"
+    return check
+
+
+def http_probe(address: str, default_port: int, path: str) -> Check:
+    """Probe expecting a 2xx from a plain HTTP GET (liveness endpoints)"""
+    host, port = _host_port(address, default_port)
+
+    async def check() -> Optional[str]:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+            status_line = (await reader.readline()).decode(errors="replace").strip()
+        finally:
+            writer.close()
+        parts = status_line.split(" ", 2)
+        if len(parts) < 2 or not parts[1].startswith("2"):
+            raise RuntimeError(f"GET {path} returned {status_line or 'nothing'}")
+        return status_line
+    return check
+
+
+def model_probe(model_registry) -> Check:
+    """Probe that an active ensemble model is registered"""
+    async def check() -> Optional[str]:
+        active_model = await model_registry.get_active_model("ensemble")
+        if not active_model:
+            raise RuntimeError("No active ensemble model")
+        return f"version {active_model.version}"
+    return check
+
+
+def register_default_probes(monitor: "ReadinessMonitor", model_registry=None):
+    monitor.register("database", probe_database)
+    monitor.register("redis", probe_redis)
+    monitor.register("kafka", tcp_probe(settings.KAFKA_BOOTSTRAP_SERVERS.split(",")[0], 9092))
+    if settings.MINIO_SECURE:
+        monitor.register("minio", tcp_probe(settings.MINIO_ENDPOINT, 443))
+    else:
+        monitor.register("minio", http_probe(settings.MINIO_ENDPOINT, 80, "/minio/health/live"))
+    monitor.register("neo4j", tcp_probe(settings.NEO4J_URI, 7687))
+    monitor.register("qdrant", http_probe(f"{settings.QDRANT_HOST}:{settings.QDRANT_PORT}", 6333, "/healthz"))
+    if model_registry is not None:
+        monitor.register("model", model_probe(model_registry))
+
+
+readiness_monitor = ReadinessMonitor(
+    settings.READINESS_INTERVAL_SECONDS,
+    settings.READINESS_TIMEOUT_SECONDS,
+    settings.READINESS_REQUIRED
+)
@@ -0,0 +1,30 @@
+"""
+Admin authentication.
+
+Operational endpoints (profiling and similar) require the shared
+ADMIN_TOKEN in an X-Admin-Token header. They are disabled entirely while
+ADMIN_TOKEN is unset.
+"""
+
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from ..config import settings
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def admin_token_valid(token: Optional[str]) -> bool:
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode())
+
+
+async def require_admin(token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER)):
+    """Dependency guarding admin endpoints"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not admin_token_valid(token):
+        raise HTTPException(status_code=401, detail="Invalid or missing admin token")
@@ -0,0 +1,213 @@
+"""
+Live latency percentiles over sliding windows (1m, 5m, 1h).
+
+Each series (end-to-end latency per route, latency per scoring stage) is a
+log-bucketed histogram, HDR-style: bucket boundaries grow by a constant
+factor, so any percentile is reported within SLO_RELATIVE_ERROR of the true
+value across 10µs-60s, with a fixed number of buckets. Counts are kept in
+two rings of time slices, 10s slices for the 1m window and 1m slices for
+the 5m and 1h windows, so a series uses the same memory whatever the
+traffic; closed slices are rows of a numpy array summed on read.
+
+Series are read from the windowed histograms in core.metrics (STAGE_SECONDS
+and REQUEST_SECONDS), which count observations directly in these log
+buckets (their Prometheus bucket edges are added to the geometry, so the
+Prometheus buckets are sums of log buckets). Nothing is added to the
+observation path: every SLO_FLUSH_SECONDS, and on every read, the tracker
+moves the counts added since the previous flush into the current slices.
+Values are per worker.
+"""
+
+import asyncio
+import logging
+import math
+from time import monotonic
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+MIN_SECONDS = 1e-5
+MAX_SECONDS = 60.0
+
+# Window name -> (ring, number of slices)
+WINDOWS = {"1m": ("short", 6), "5m": ("long", 5), "1h": ("long", 60)}
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LogBuckets:
+    """Bucket geometry shared by all series.
+
+    A value v falls in bucket bisect_left(edges, v), as in a Prometheus
+    histogram child: index 0 is underflow (<= MIN_SECONDS), the last index
+    overflow (> the last edge, about MAX_SECONDS). `extra_edges` split some
+    buckets further, which only makes them narrower.
+    """
+
+    def __init__(self, relative_error: float, extra_edges: Sequence[float] = ()):
+        self.growth = (1 + relative_error) / (1 - relative_error)
+        self.log_growth = math.log(self.growth)
+        count = int(math.ceil(math.log(MAX_SECONDS / MIN_SECONDS) / self.log_growth)) + 1
+        edges = np.unique(np.concatenate([
+            MIN_SECONDS * self.growth ** np.arange(count),
+            [edge for edge in extra_edges if MIN_SECONDS < edge < MAX_SECONDS]
+        ]))
+        self.edges: List[float] = edges.tolist()
+        self.count = len(edges) + 1
+        self.upper = np.append(edges, np.inf)
+        lower = np.concatenate([[0.0], edges])
+        # Representative value: midpoint, within relative_error of any value in the bucket
+        self.values = np.where(np.isinf(self.upper), MAX_SECONDS, (lower + self.upper) / 2)
+        self.values[0] = MIN_SECONDS / 2
+
+
+class SliceRing:
+    """Histogram counts for the last `slices` slices of `slice_seconds` each"""
+
+    def __init__(self, slice_seconds: float, slices: int, buckets: int):
+        self.slice_seconds = slice_seconds
+        self.buckets = buckets
+        self.rows = np.zeros((slices, buckets), dtype=np.int64)
+        self.row_epoch = np.full(slices, -1, dtype=np.int64)
+        self.epoch = int(monotonic() // slice_seconds)
+        self.current = np.zeros(buckets, dtype=np.int64)
+
+    def advance(self, now: float):
+        epoch = int(now // self.slice_seconds)
+        if epoch != self.epoch:
+            self._close(epoch)
+
+    def _close(self, epoch: int):
+        slot = self.epoch % len(self.rows)
+        self.rows[slot] = self.current
+        self.row_epoch[slot] = self.epoch
+        self.current = np.zeros(self.buckets, dtype=np.int64)
+        self.epoch = epoch
+
+    def window(self, slices: int, now: float) -> np.ndarray:
+        """Counts of the current slice and the `slices - 1` before it"""
+        self.advance(now)
+        epoch = self.epoch
+        valid = self.row_epoch > epoch - slices
+        counts = self.rows[valid].sum(axis=0) if valid.any() else np.zeros(self.buckets, dtype=np.int64)
+        return counts + self.current
+
+
+class LatencySeries:
+    """One latency series.
+
+    `counts` are cumulative per-bucket counts, incremented by the histogram
+    child that owns the series; flush() moves what was added since the last
+    flush into the current slices.
+    """
+
+    __slots__ = ("buckets", "short", "long", "counts", "_flushed")
+
+    def __init__(self, buckets: LogBuckets):
+        self.buckets = buckets
+        self.short = SliceRing(10.0, 6, buckets.count)
+        self.long = SliceRing(60.0, 60, buckets.count)
+        self.counts: List[int] = [0] * buckets.count
+        self._flushed = np.zeros(buckets.count, dtype=np.int64)
+
+    def flush(self, now: float):
+        counts = np.array(self.counts, dtype=np.int64)
+        added = counts - self._flushed
+        self._flushed = counts
+        self.short.advance(now)
+        self.long.advance(now)
+        self.short.current = self.short.current + added
+        self.long.current = self.long.current + added
+
+    def window(self, name: str, now: float) -> np.ndarray:
+        self.flush(now)
+        ring, slices = WINDOWS[name]
+        return getattr(self, ring).window(slices, now)
+
+
+class LatencyTracker:
+    """Sliding-window latency series by group ("request", "stage") and name"""
+
+    def __init__(self, relative_error: float, target_ms: float):
+        self.relative_error = relative_error
+        self.buckets = LogBuckets(relative_error)
+        self.target_ms = target_ms
+        self._series: Dict[Tuple[str, str], LatencySeries] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def align(self, edges: Sequence[float]):
+        """Add bucket edges (a Prometheus histogram's) to the geometry, before any series exists"""
+        if self._series:
+            raise RuntimeError("Bucket edges must be added before the first series is created")
+        self.buckets = LogBuckets(self.relative_error, list(edges) + self.buckets.edges)
+
+    def series(self, group: str, name: str) -> LatencySeries:
+        key = (group, name)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = LatencySeries(self.buckets)
+        return series
+
+    def flush(self):
+        now = monotonic()
+        for series in list(self._series.values()):
+            series.flush(now)
+
+    def start(self):
+        """Flush every SLO_FLUSH_SECONDS, so counts land in the slice they were observed in"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.SLO_FLUSH_SECONDS)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Failed to flush latency series: {e}")
+
+    def _summarize(self, counts: np.ndarray, quantiles: Sequence[float]) -> Dict[str, Any]:
+        total = int(counts.sum())
+        summary: Dict[str, Any] = {"count": total}
+        if total == 0:
+            summary.update({f"p{int(q * 100)}_ms": None for q in quantiles})
+            summary["within_target"] = None
+            return summary
+        cumulative = np.cumsum(counts)
+        for q in quantiles:
+            index = int(np.searchsorted(cumulative, q * total, side="left"))
+            summary[f"p{int(q * 100)}_ms"] = round(float(self.buckets.values[index]) * 1000, 3)
+        # Buckets wholly under the target; straddling bucket counted as over
+        under = counts[self.buckets.upper * 1000 <= self.target_ms].sum()
+        summary["within_target"] = round(float(under) / total, 4)
+        return summary
+
+    def snapshot(self, windows: Optional[Sequence[str]] = None,
+                 quantiles: Sequence[float] = QUANTILES) -> Dict[str, Any]:
+        now = monotonic()
+        result: Dict[str, Any] = {}
+        for window in windows or WINDOWS:
+            groups: Dict[str, Dict[str, Any]] = {}
+            for (group, name), series in list(self._series.items()):
+                groups.setdefault(group, {})[name] = self._summarize(series.window(window, now), quantiles)
+            result[window] = groups
+        return {
+            "target_ms": self.target_ms,
+            "relative_error": settings.SLO_RELATIVE_ERROR,
+            "windows": result
+        }
+
+
+latency_tracker = LatencyTracker(settings.SLO_RELATIVE_ERROR, settings.SLO_TARGET_MS)
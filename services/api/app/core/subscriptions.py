@@ -0,0 +1,202 @@
+"""
+Server-side alert subscriptions with an inverted index.
+
+A subscription is a conjunction of optional constraints: severity in a set,
+MCC in a set, country in a set, and p_fraud within a score band. Each
+distinct filter is expanded into the (severity, mcc, country) tuples it
+accepts, with None for an unconstrained field, and stored in a hash table.
+
+The expansion is a product of the list lengths, so it only covers the
+constrained fields that fit in MAX_KEYS_PER_FILTER keys, smallest lists
+first; a field left out is keyed as None and checked with a set lookup at
+match time. A filter therefore costs at most max(MAX_KEYS_PER_FILTER,
+longest list) entries however long its lists are (the schema caps them too).
+
+A message is matched with one lookup per filter shape (which of the three
+fields are in the key, at most 8 shapes); only filters whose keyed fields
+all match are visited, and their other fields and score band checked
+directly. For filters that fit the key budget (typical analyst views) the
+cost of matching one message is independent of the number of subscribers
+whose filters reject it.
+"""
+
+from itertools import product
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Set, Tuple
+
+from ..models.schemas import AlertSubscription
+
+CATEGORICAL_FIELDS = ("severity", "mcc", "country")
+
+# Bound on the (severity, mcc, country) keys one filter is expanded into
+MAX_KEYS_PER_FILTER = 256
+
+# Clients that never subscribe get the previous HIGH-only stream
+DEFAULT_SUBSCRIPTION = AlertSubscription(severity=["HIGH"])
+
+
+def _values(subscription: AlertSubscription, field: str) -> Optional[Set[str]]:
+    values = getattr(subscription, field)
+    if values is None:
+        return None
+    return {getattr(v, "value", v) for v in values}
+
+
+def _band(subscription: AlertSubscription) -> Optional[Tuple[float, float]]:
+    if subscription.min_p_fraud is None and subscription.max_p_fraud is None:
+        return None
+    low = subscription.min_p_fraud if subscription.min_p_fraud is not None else 0.0
+    high = subscription.max_p_fraud if subscription.max_p_fraud is not None else 1.0
+    return low, high
+
+
+def _field_value(message: Dict[str, Any], field: str) -> Optional[str]:
+    value = message.get(field)
+    if value is None:
+        return None
+    value = str(value)
+    return value if field == "mcc" else value.upper()
+
+
+def matches(subscription: AlertSubscription, message: Dict[str, Any]) -> bool:
+    """Direct evaluation of one subscription against one message"""
+    for field in CATEGORICAL_FIELDS:
+        allowed = _values(subscription, field)
+        if allowed is not None and _field_value(message, field) not in allowed:
+            return False
+    band = _band(subscription)
+    if band is not None:
+        p_fraud = message.get("p_fraud")
+        if p_fraud is None or not band[0] <= p_fraud <= band[1]:
+            return False
+    return True
+
+
+Canonical = Tuple[Any, ...]
+Shape = Tuple[bool, ...]
+
+
+def _canonical(subscription: AlertSubscription) -> Canonical:
+    """Hashable form; equal filters share one index entry"""
+    fields = tuple(
+        frozenset(values) if values is not None else None
+        for values in (_values(subscription, field) for field in CATEGORICAL_FIELDS)
+    )
+    return fields + (_band(subscription),)
+
+
+def _shape(canonical: Canonical) -> Shape:
+    """Which constrained fields go into the filter's keys: smallest lists first, within MAX_KEYS_PER_FILTER"""
+    keyed = [False] * len(CATEGORICAL_FIELDS)
+    size = 1
+    constrained = sorted(
+        (len(values), i) for i, values in enumerate(canonical[:-1]) if values is not None
+    )
+    for count, i in constrained:
+        if size > 1 and size * count > MAX_KEYS_PER_FILTER:
+            break
+        keyed[i] = True
+        size *= count
+    return tuple(keyed)
+
+
+def _keys(canonical: Canonical, shape: Shape) -> List[Tuple[Optional[str], ...]]:
+    """The (severity, mcc, country) keys of the filter; None is a wildcard or an unkeyed field"""
+    return list(product(*(
+        sorted(values) if keyed else (None,) for values, keyed in zip(canonical[:-1], shape)
+    )))
+
+
+class SubscriptionIndex:
+    """Subscriber keys indexed by the field values their filters accept.
+
+    Subscribers with identical filters (the common case: dashboards opened
+    with the same view) share one entry.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[Hashable, AlertSubscription] = {}
+        self._canonical: Dict[Hashable, Canonical] = {}
+        self._members: Dict[Canonical, Set[Hashable]] = {}
+        self._table: Dict[Tuple[Optional[str], ...], Set[Canonical]] = {}
+        # Which fields the indexed filters are keyed on -> number of filters
+        self._shapes: Dict[Shape, int] = {}
+        # Filters with a constrained field left out of their keys -> (field position, accepted values)
+        self._unkeyed: Dict[Canonical, List[Tuple[int, FrozenSet[str]]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    @property
+    def distinct(self) -> int:
+        return len(self._members)
+
+    def get(self, key: Hashable) -> Optional[AlertSubscription]:
+        return self._subscriptions.get(key)
+
+    def add(self, key: Hashable, subscription: AlertSubscription):
+        """Subscribe `key`, replacing its previous subscription"""
+        self.remove(key)
+        canonical = _canonical(subscription)
+        self._subscriptions[key] = subscription
+        self._canonical[key] = canonical
+        members = self._members.get(canonical)
+        if members is None:
+            members = self._members[canonical] = set()
+            shape = _shape(canonical)
+            for value_key in _keys(canonical, shape):
+                self._table.setdefault(value_key, set()).add(canonical)
+            self._shapes[shape] = self._shapes.get(shape, 0) + 1
+            unkeyed = [
+                (i, values) for i, (values, keyed) in enumerate(zip(canonical[:-1], shape))
+                if values is not None and not keyed
+            ]
+            if unkeyed:
+                self._unkeyed[canonical] = unkeyed
+        members.add(key)
+
+    def remove(self, key: Hashable):
+        canonical = self._canonical.pop(key, None)
+        if canonical is None:
+            return
+        del self._subscriptions[key]
+        members = self._members[canonical]
+        members.discard(key)
+        if members:
+            return
+        del self._members[canonical]
+        self._unkeyed.pop(canonical, None)
+        shape = _shape(canonical)
+        for value_key in _keys(canonical, shape):
+            entry = self._table[value_key]
+            entry.discard(canonical)
+            if not entry:
+                del self._table[value_key]
+        self._shapes[shape] -= 1
+        if not self._shapes[shape]:
+            del self._shapes[shape]
+
+    def match(self, message: Dict[str, Any]) -> List[Set[Hashable]]:
+        """Member sets of the filters matching the message (disjoint)"""
+        values = tuple(_field_value(message, field) for field in CATEGORICAL_FIELDS)
+        p_fraud = message.get("p_fraud")
+        table = self._table
+        members = self._members
+        unkeyed = self._unkeyed
+        matched = []
+        for shape in self._shapes:
+            value_key = tuple(value if constrained else None for value, constrained in zip(values, shape))
+            candidates = table.get(value_key)
+            if not candidates:
+                continue
+            for canonical in candidates:
+                band = canonical[-1]
+                if band is not None and (p_fraud is None or not band[0] <= p_fraud <= band[1]):
+                    continue
+                if canonical in unkeyed and any(values[i] not in accepted for i, accepted in unkeyed[canonical]):
+                    continue
+                matched.append(members[canonical])
+        return matched
+
+    def full_scan(self, message: Dict[str, Any]) -> Set[Hashable]:
+        """Reference matcher: evaluate every subscription"""
+        return {key for key, subscription in self._subscriptions.items() if matches(subscription, message)}
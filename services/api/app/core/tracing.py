@@ -0,0 +1,337 @@
+"""
+In-process request tracing with tail-based sampling.
+
+A trace is opened per scored transaction (`with tracer.trace("score",
+tx_id=...)`); inside it, `with span("redis.get", key=...)` or the `@traced`
+decorator record nested spans. The active trace and parent span live in
+context variables, so spans follow the request across awaits, gathered
+tasks and run_db() threads without being passed around. Outside a trace,
+span() returns a shared no-op and costs a single context-variable read.
+
+Spans stay attached to their trace until it ends; only then is the keep
+decision made (tail sampling). Traces slower than TRACE_SLOW_MS or that
+raised are always kept, others with probability TRACE_SAMPLE_RATE. Kept
+traces go to a ring buffer of the last TRACE_BUFFER_SIZE traces (served by
+the health endpoints) and are exported in the background, one JSON object
+per line, to TRACE_EXPORT_PATH and/or POSTed in batches to
+TRACE_COLLECTOR_URL.
+"""
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import os
+import random
+import urllib.request
+from collections import deque
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start", "end", "attrs", "error")
+
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, attrs: Dict[str, Any]):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+
+class Trace:
+    """Spans of one request, kept in memory until the keep decision"""
+
+    def __init__(self, name: str, tx_id: Any, attrs: Dict[str, Any]):
+        self.trace_id = os.urandom(8).hex()
+        self.tx_id = tx_id
+        self.started_at = datetime.utcnow()
+        self._ids = itertools.count(1)
+        self.root = Span(0, None, name, attrs)
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def add_span(self, name: str, attrs: Dict[str, Any]) -> Optional[Span]:
+        if len(self.spans) >= settings.TRACE_MAX_SPANS:
+            self.dropped += 1
+            return None
+        parent = _current_span.get()
+        span = Span(next(self._ids), parent.span_id if parent is not None else 0, name, attrs)
+        self.spans.append(span)
+        return span
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.root.end if self.root.end is not None else perf_counter()
+        return (end - self.root.start) * 1000
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "tx_id": self.tx_id,
+            "name": self.root.name,
+            "start": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 3),
+            "error": self.root.error,
+            "spans": len(self.spans)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        origin = self.root.start
+        record = self.summary()
+        record["attrs"] = self.root.attrs
+        record["dropped_spans"] = self.dropped
+        record["spans"] = [
+            {
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "tx_id": self.tx_id,
+                "offset_ms": round((span.start - origin) * 1000, 3),
+                "duration_ms": round((span.end - span.start) * 1000, 3) if span.end is not None else None,
+                "error": span.error,
+                "attrs": span.attrs
+            }
+            for span in self.spans
+        ]
+        return record
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopScope()
+
+
+class _SpanScope:
+    __slots__ = ("span", "token")
+
+    def __init__(self, span: Span):
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end = perf_counter()
+        if exc_type is not None:
+            self.span.error = exc_type.__name__
+        _current_span.reset(self.token)
+        return False
+
+
+def span(name: str, **attrs):
+    """Record a child span of the active trace; a no-op outside a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP
+    recorded = trace.add_span(name, attrs)
+    return _SpanScope(recorded) if recorded is not None else _NOOP
+
+
+def traced(name: str):
+    """Decorator recording a span around each call of an async function"""
+    def decorator(func: Callable):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_attribute(key: str, value: Any):
+    """Attach an attribute to the innermost active span (or the trace root)"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    current = _current_span.get()
+    (current or trace.root).attrs[key] = value
+
+
+def annotate_trace(**attrs):
+    """Attach attributes to the root span of the active trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.root.attrs.update(attrs)
+
+
+class _TraceScope:
+    def __init__(self, tracer: "Tracer", name: str, tx_id: Any, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace = Trace(name, tx_id, attrs)
+        self.tokens = None
+
+    def __enter__(self) -> Trace:
+        self.tokens = (_current_trace.set(self.trace), _current_span.set(self.trace.root))
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        root = self.trace.root
+        root.end = perf_counter()
+        if exc_type is not None:
+            root.error = exc_type.__name__
+        _current_span.reset(self.tokens[1])
+        _current_trace.reset(self.tokens[0])
+        self.tracer.finish(self.trace)
+        return False
+
+
+class Tracer:
+    """Tail sampler, ring buffer and background exporter for finished traces"""
+
+    def __init__(
+        self,
+        enabled: bool,
+        slow_ms: float,
+        sample_rate: float,
+        buffer_size: int,
+        export_path: Optional[str] = None,
+        collector_url: Optional[str] = None,
+        export_interval: float = 2.0
+    ):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self.export_path = export_path
+        self.collector_url = collector_url
+        self.export_interval = export_interval
+        self._pending: List[Trace] = []
+        self._task: Optional[asyncio.Task] = None
+        self.finished = 0
+        self.kept = 0
+        self.exported = 0
+        self.export_errors = 0
+
+    def trace(self, name: str, tx_id: Any = None, **attrs):
+        """Open a trace for one request; nested traces become plain spans"""
+        if not self.enabled:
+            return _NOOP
+        if _current_trace.get() is not None:
+            return span(name, tx_id=tx_id, **attrs)
+        return _TraceScope(self, name, tx_id, attrs)
+
+    def finish(self, trace: Trace):
+        """Tail-sampling decision, made once the whole trace is known"""
+        self.finished += 1
+        keep = (
+            trace.root.error is not None
+            or trace.duration_ms >= self.slow_ms
+            or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        )
+        if not keep:
+            return
+        self.kept += 1
+        self.buffer.append(trace)
+        if self.export_path or self.collector_url:
+            if len(self._pending) >= self.buffer.maxlen:
+                # Exporter is behind; shed the oldest rather than grow without bound
+                self._pending.pop(0)
+            self._pending.append(trace)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return [trace.summary() for trace in list(self.buffer)[-limit:][::-1]]
+
+    def find(self, tx_id: Any) -> Optional[Dict[str, Any]]:
+        """Most recent kept trace of a transaction"""
+        for trace in reversed(self.buffer):
+            if str(trace.tx_id) == str(tx_id):
+                return trace.to_dict()
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "slow_ms": self.slow_ms,
+            "sample_rate": self.sample_rate,
+            "finished": self.finished,
+            "kept": self.kept,
+            "buffered": len(self.buffer),
+            "pending_export": len(self._pending),
+            "exported": self.exported,
+            "export_errors": self.export_errors
+        }
+
+    # Export
+
+    def start(self):
+        if self._task is None and (self.export_path or self.collector_url):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        lines = [json.dumps(trace.to_dict(), default=str) for trace in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            # File and HTTP writes block; keep them off the event loop
+            await loop.run_in_executor(None, self._export, lines)
+            self.exported += len(lines)
+        except Exception as e:
+            self.export_errors += 1
+            logger.warning(f"Failed to export {len(lines)} traces: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.export_interval)
+            await self.flush()
+
+    def _export(self, lines: List[str]):
+        payload = "\n".join(lines) + "\n"
+        if self.export_path:
+            with open(self.export_path, "a") as f:
+                f.write(payload)
+        if self.collector_url:
+            request = urllib.request.Request(
+                self.collector_url,
+                data=payload.encode(),
+                headers={"Content-Type": "application/x-ndjson"},
+                method="POST"
+            )
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+
+
+tracer = Tracer(
+    enabled=settings.TRACING_ENABLED,
+    slow_ms=settings.TRACE_SLOW_MS,
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    buffer_size=settings.TRACE_BUFFER_SIZE,
+    export_path=settings.TRACE_EXPORT_PATH,
+    collector_url=settings.TRACE_COLLECTOR_URL,
+    export_interval=settings.TRACE_EXPORT_INTERVAL_SECONDS
+)
@@ -0,0 +1,298 @@
+"""
+WebSocket fan-out with per-client bounded queues.
+
+broadcast() never awaits a client: it serializes the message once and
+appends the same string to every client's queue. Each client has its own
+sender task draining its queue, so a slow dashboard only delays itself.
+
+Slow-consumer policy, per client:
+- Messages sent with a coalesce key (periodic snapshots such as the latency
+  push) replace the queued message with the same key in place; a client
+  that falls behind gets the latest snapshot, not a backlog of stale ones.
+- Other messages (alerts) are queued; when the queue already holds
+  WS_CLIENT_QUEUE_SIZE messages the oldest one is dropped.
+- A client whose send does not complete within WS_SEND_TIMEOUT_SECONDS, or
+  that has dropped more than WS_MAX_DROPPED messages in a row, is
+  disconnected; it can reconnect and resume from live data.
+
+Send timeouts are enforced by one reaper task per manager rather than a
+wait_for() (and the task it creates) around every frame.
+
+Alerts go through publish() rather than broadcast(): each client has a
+subscription (core.subscriptions; HIGH severity until it sends its own),
+the message is matched against the subscription index once, and matched
+clients collect it in a pending batch. A flusher task turns each client's
+batch into one frame every WS_FRAME_INTERVAL_MS (sooner when a batch
+reaches WS_FRAME_MAX_MESSAGES), so an alert burst costs a client a few
+frames rather than one per alert. Clients with the same pending batch
+share the rendered frame.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+from ..config import settings
+from ..models.schemas import AlertSubscription
+from .subscriptions import DEFAULT_SUBSCRIPTION, SubscriptionIndex
+
+logger = logging.getLogger(__name__)
+
+
+class ClientConnection:
+    """One WebSocket client: its outbound queue and sender task"""
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager", queue_size: int):
+        self.websocket = websocket
+        self.manager = manager
+        self.queue_size = queue_size
+        # Items are message strings, or coalesce keys looked up in self.latest
+        self.queue: Deque[Union[str, tuple]] = deque()
+        self.latest: Dict[str, str] = {}
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.dropped_in_row = 0
+        self.coalesced = 0
+        self.sending_since: Optional[float] = None
+        self.timed_out = False
+        self.task: Optional[asyncio.Task] = None
+
+    def enqueue(self, text: str, coalesce_key: Optional[str] = None):
+        if coalesce_key is not None:
+            if coalesce_key in self.latest:
+                self.latest[coalesce_key] = text
+                self.coalesced += 1
+                return
+            self.latest[coalesce_key] = text
+            item: Union[str, tuple] = (coalesce_key,)
+        else:
+            item = text
+        if len(self.queue) >= self.queue_size:
+            oldest = self.queue.popleft()
+            if isinstance(oldest, tuple):
+                self.latest.pop(oldest[0], None)
+            self.dropped += 1
+            self.dropped_in_row += 1
+            self.manager.dropped += 1
+        self.queue.append(item)
+        self.ready.set()
+
+    async def run(self):
+        """Sender task: drain the queue, one send at a time"""
+        websocket = self.websocket
+        try:
+            while True:
+                if not self.queue:
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                item = self.queue.popleft()
+                text = self.latest.pop(item[0]) if isinstance(item, tuple) else item
+                self.sending_since = time.monotonic()
+                await websocket.send_text(text)
+                self.sending_since = None
+                self.sent += 1
+                if self.dropped_in_row > settings.WS_MAX_DROPPED:
+                    raise OverflowError(f"dropped {self.dropped_in_row} messages in a row")
+                self.dropped_in_row = 0
+        except asyncio.CancelledError:
+            if not self.timed_out:
+                raise
+            self.manager.slow_disconnects += 1
+            logger.warning(f"Disconnecting slow WebSocket client (send exceeded {settings.WS_SEND_TIMEOUT_SECONDS}s)")
+        except OverflowError as e:
+            self.manager.slow_disconnects += 1
+            logger.warning(f"Disconnecting slow WebSocket client ({e})")
+        except Exception as e:
+            logger.debug(f"WebSocket send failed: {e}")
+        self.manager.disconnect(self.websocket)
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+
+def render_frame(texts: List[str]) -> str:
+    """One frame for a batch of serialized alerts"""
+    return '{"type": "alerts", "messages": [' + ", ".join(texts) + "]}"
+
+
+class ConnectionManager:
+    def __init__(self, queue_size: Optional[int] = None, frame_interval_ms: Optional[float] = None):
+        self.queue_size = queue_size or settings.WS_CLIENT_QUEUE_SIZE
+        self.frame_interval = (settings.WS_FRAME_INTERVAL_MS if frame_interval_ms is None
+                               else frame_interval_ms) / 1000.0
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.subscriptions = SubscriptionIndex()
+        # Serialized alerts waiting for each client's next frame
+        self._pending: Dict[WebSocket, List[str]] = {}
+        self.broadcasts = 0
+        self.published = 0
+        self.deliveries = 0
+        self.frames = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self._reaper: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def active_connections(self):
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        self.register(websocket)
+
+    def register(self, websocket: WebSocket) -> ClientConnection:
+        """Start the sender task for an accepted WebSocket"""
+        client = ClientConnection(websocket, self, self.queue_size)
+        client.task = asyncio.create_task(client.run())
+        self.clients[websocket] = client
+        self.subscriptions.add(websocket, DEFAULT_SUBSCRIPTION)
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap())
+        if self._flusher is None and self.frame_interval > 0:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        return client
+
+    def subscribe(self, websocket: WebSocket, subscription: AlertSubscription):
+        """Replace a client's alert filter"""
+        if websocket in self.clients:
+            self.subscriptions.add(websocket, subscription)
+
+    def disconnect(self, websocket: WebSocket):
+        """Forget a client; safe to call more than once and from its own sender task"""
+        self.subscriptions.remove(websocket)
+        self._pending.pop(websocket, None)
+        client = self.clients.pop(websocket, None)
+        if client is not None and client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def send_personal_message(self, message: str, websocket: WebSocket):
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.enqueue(message)
+
+    def broadcast(self, message: Union[str, Dict[str, Any]], coalesce_key: Optional[str] = None) -> int:
+        """Queue a message for every client without waiting for any of them.
+
+        Dicts are serialized once here. Returns the number of clients queued to.
+        """
+        text = message if isinstance(message, str) else json.dumps(message)
+        self.broadcasts += 1
+        clients = list(self.clients.values())
+        for client in clients:
+            client.enqueue(text, coalesce_key)
+        return len(clients)
+
+    def publish(self, message: Dict[str, Any], text: Optional[str] = None) -> int:
+        """Queue an alert for the clients whose subscription matches it.
+
+        Serialized once (or sent as `text`, the message's JSON as received);
+        batched into frames by the flusher. Returns the number of clients matched.
+        """
+        delivered = self._match(message, text)
+        if self.frame_interval <= 0:
+            self.flush()
+        return delivered
+
+    def publish_batch(self, messages: List[Tuple[Dict[str, Any], Optional[str]]]) -> int:
+        """publish() for a batch of (message, text) pairs, e.g. one Kafka poll"""
+        delivered = 0
+        for message, text in messages:
+            delivered += self._match(message, text)
+        if self.frame_interval <= 0:
+            self.flush()
+        return delivered
+
+    def _match(self, message: Dict[str, Any], text: Optional[str]) -> int:
+        self.published += 1
+        matched = self.subscriptions.match(message)
+        if not matched:
+            return 0
+        if text is None:
+            text = json.dumps(message)
+        pending = self._pending
+        delivered = 0
+        for members in matched:
+            delivered += len(members)
+            for websocket in members:
+                batch = pending.get(websocket)
+                if batch is None:
+                    pending[websocket] = [text]
+                elif len(batch) + 1 >= settings.WS_FRAME_MAX_MESSAGES:
+                    batch.append(text)
+                    self._send_frame(websocket, pending.pop(websocket))
+                else:
+                    batch.append(text)
+        self.deliveries += delivered
+        return delivered
+
+    def _send_frame(self, websocket: WebSocket, batch: List[str], frame: Optional[str] = None):
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.enqueue(frame or render_frame(batch))
+            self.frames += 1
+
+    def flush(self):
+        """Send every pending batch as one frame per client"""
+        pending, self._pending = self._pending, {}
+        # Clients with the same filter usually have identical batches
+        rendered: Dict[tuple, str] = {}
+        for websocket, batch in pending.items():
+            key = tuple(map(id, batch))
+            frame = rendered.get(key)
+            if frame is None:
+                frame = rendered[key] = render_frame(batch)
+            self._send_frame(websocket, batch, frame)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.frame_interval)
+            if self._pending:
+                self.flush()
+
+    async def _reap(self):
+        """Cancel sends stuck for longer than WS_SEND_TIMEOUT_SECONDS"""
+        timeout = settings.WS_SEND_TIMEOUT_SECONDS
+        while True:
+            await asyncio.sleep(min(timeout / 4, 1.0))
+            cutoff = time.monotonic() - timeout
+            for client in list(self.clients.values()):
+                since = client.sending_since
+                if since is not None and since < cutoff and not client.timed_out:
+                    client.timed_out = True
+                    client.task.cancel()
+
+    async def close(self):
+        for websocket in list(self.clients):
+            self.disconnect(websocket)
+        for task in (self._reaper, self._flusher):
+            if task is not None:
+                task.cancel()
+        self._reaper = self._flusher = None
+
+    def stats(self) -> Dict[str, Any]:
+        clients = list(self.clients.values())
+        return {
+            "clients": len(clients),
+            "distinct_filters": self.subscriptions.distinct,
+            "broadcasts": self.broadcasts,
+            "published": self.published,
+            "deliveries": self.deliveries,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "coalesced": sum(c.coalesced for c in clients),
+            "max_queue_depth": max((len(c.queue) for c in clients), default=0),
+            "queue_size": self.queue_size
+        }
+
+
+manager = ConnectionManager()
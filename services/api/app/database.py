@@ -1,12 +1,16 @@
+from typing import AsyncIterator, Optional, Union
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from .config import settings
 
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_size=20,
-    max_overflow=30,
+    # The DB executor (core/executor.py) is sized to match
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
     pool_pre_ping=True,
     pool_recycle=3600
 )
@@ -20,4 +24,62 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Async engine (asyncpg) for the scoring hot path, created on first use so the
+# driver is only required when DB_ASYNC_ENABLED is set
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker] = None
+
+def async_database_url() -> str:
+    """ASYNC_DATABASE_URL, or DATABASE_URL with the asyncpg driver"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    scheme, rest = settings.DATABASE_URL.split("://", 1)
+    return f"{scheme.split('+')[0]}+asyncpg://{rest}"
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            async_database_url(),
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+            # Prepared statements are reused per connection for the pre-built hot-path queries
+            connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+        )
+    return _async_engine
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Async counterpart of SessionLocal"""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        _async_sessionmaker = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmaker()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_scoring_db() -> AsyncIterator[Union[Session, AsyncSession]]:
+    """Session for the scoring hot path: async when DB_ASYNC_ENABLED, else sync"""
+    if settings.DB_ASYNC_ENABLED:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    
+    from .core.executor import run_db
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        await run_db(db.close)
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Response, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import uvicorn
@@ -6,41 +7,27 @@ import logging
 from contextlib import asynccontextmanager
 import asyncio
 import json
-from typing import List
 
 from .config import settings
-from .database import engine, Base
+from .database import engine, Base, dispose_async_engine
 from .api.v1.api import api_router
 from .core.logging import setup_logging
 from .core.exceptions import setup_exception_handlers
+from .core.admission import AdmissionMiddleware, admission_controller
+from .core.executor import db_executor, loop_lag_monitor
+from .core.metrics import METRICS_CONTENT_TYPE, register_process_metrics, registry as metrics_registry
+from .core.slo import latency_tracker
+from .core.tracing import tracer
+from .core.profiler import ProfileMiddleware
+from .core.readiness import readiness_monitor, register_default_probes
+from .core.websocket import manager
+from .models.schemas import AlertSubscription
+from .services.alert_service import alert_service
+from .services.alert_window import alert_flusher
+from .services.outbox import decision_writer
 from .services.model_registry import ModelRegistry
 from .utils.kafka_client import KafkaClient
 
-# WebSocket connection manager for real-time updates
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                # Remove disconnected clients
-                self.disconnect(connection)
-
-manager = ConnectionManager()
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
@@ -57,19 +44,51 @@ async def lifespan(app: FastAPI):
     await model_registry.initialize()
     app.state.model_registry = model_registry
     
+    # Dependency probes run in the background; /ready serves the last result
+    register_default_probes(readiness_monitor, model_registry)
+    readiness_monitor.start()
+    
     # Initialize Kafka client for real-time updates
     kafka_client = KafkaClient()
     app.state.kafka_client = kafka_client
     
+    # Decisions, alerts and outbox rows of concurrent requests commit together
+    if settings.DECISION_WRITER_ENABLED:
+        decision_writer.start()
+    # Repeated alerts of a card are merged; closed windows are written once
+    alert_flusher.start()
+    
+    # Analyst alert queue, loaded from the alerts table and kept in sync with it
+    if settings.ALERT_QUEUE_ENABLED:
+        alert_service.start()
+    
     # Start background tasks
-    asyncio.create_task(consume_alerts())
+    alert_consumer = asyncio.create_task(consume_alerts())
+    latency_push = asyncio.create_task(push_latency())
+    loop_lag_monitor.start()
+    latency_tracker.start()
+    metrics_registry.start()
+    tracer.start()
     
     logger.info("Fraud detection API service started successfully")
     yield
     
     # Shutdown
     logger.info("Shutting down fraud detection API service...")
+    latency_push.cancel()
+    alert_consumer.cancel()
+    await manager.close()
+    await decision_writer.stop()
+    await alert_flusher.stop()
+    await alert_service.stop()
+    await readiness_monitor.stop()
+    await loop_lag_monitor.stop()
+    await latency_tracker.stop()
+    await metrics_registry.stop()
+    await tracer.stop()
     await kafka_client.close()
+    await dispose_async_engine()
+    db_executor.shutdown(wait=False)
 
 app = FastAPI(
     title="Fraud Detection API",
@@ -94,6 +113,14 @@ app.add_middleware(
     allowed_hosts=settings.ALLOWED_HOSTS
 )
 
+# Per-request profiling (X-Profile with an admin token); inside admission so shed requests are not profiled
+app.add_middleware(ProfileMiddleware)
+
+# Outermost: shed excess scoring load before any other work is done
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
+register_process_metrics()
+
 # Exception handlers
 setup_exception_handlers(app)
 
@@ -107,22 +134,53 @@ async def websocket_endpoint(websocket: WebSocket):
     try:
         while True:
             data = await websocket.receive_text()
+            try:
+                request = json.loads(data)
+            except ValueError:
+                request = None
+            if isinstance(request, dict) and request.get("type") == "subscribe":
+                # {"type": "subscribe", "filter": {"severity": [...], "mcc": [...], ...}}
+                try:
+                    subscription = AlertSubscription(**(request.get("filter") or {}))
+                except (ValidationError, TypeError) as e:
+                    manager.send_personal_message(json.dumps({"type": "error", "detail": str(e)}), websocket)
+                    continue
+                manager.subscribe(websocket, subscription)
+                manager.send_personal_message(json.dumps({
+                    "type": "subscribed", "filter": subscription.model_dump(mode="json", exclude_none=True)
+                }), websocket)
+                continue
             # Echo back for heartbeat
-            await manager.send_personal_message(f"Message received: {data}", websocket)
+            manager.send_personal_message(f"Message received: {data}", websocket)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
-# Background task to consume alerts and broadcast to WebSocket clients
+# Background task to consume alerts and publish them to subscribed WebSocket clients
+def publish_alerts(batch):
+    """Fan one polled batch of alerts out to the clients whose filter matches"""
+    manager.publish_batch([(message.value, message.raw) for message in batch if isinstance(message.value, dict)])
+
 async def consume_alerts():
-    """Consume high-priority alerts from Kafka and broadcast to WebSocket clients"""
-    try:
-        kafka_client = app.state.kafka_client
-        async for message in kafka_client.consume("alerts"):
-            alert_data = json.loads(message.value)
-            if alert_data.get("severity") == "HIGH":
-                await manager.broadcast(json.dumps(alert_data))
-    except Exception as e:
-        logging.getLogger(__name__).error(f"Error consuming alerts: {e}")
+    """Consume alerts from Kafka in batches; restarts with backoff if the consumer fails"""
+    await app.state.kafka_client.consume_forever("alerts", publish_alerts)
+
+# Background task pushing live latency percentiles to WebSocket clients
+async def push_latency():
+    """Broadcast p50/p95/p99 against the SLO target every SLO_PUSH_SECONDS"""
+    while True:
+        await asyncio.sleep(settings.SLO_PUSH_SECONDS)
+        if not manager.clients:
+            continue
+        try:
+            # Coalesced: a client that falls behind gets the latest snapshot only
+            manager.broadcast({"type": "latency", **latency_tracker.snapshot()}, coalesce_key="latency")
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error pushing latency percentiles: {e}")
+
+# Prometheus scrape endpoint (all workers' values when METRICS_MULTIPROC_DIR is set)
+@app.get("/metrics")
+async def metrics():
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
 
 # Health check endpoints
 @app.get("/health")
@@ -131,30 +189,13 @@ async def health_check():
 
 @app.get("/ready")
 async def readiness_check():
-    """Check if all dependencies are ready"""
-    checks = {
-        "database": False,
-        "redis": False,
-        "kafka": False,
-        "model_registry": False
-    }
-    
-    try:
-        # Check database
-        from .database import SessionLocal
-        db = SessionLocal()
-        db.execute("SELECT 1")
-        db.close()
-        checks["database"] = True
-    except:
-        pass
-    
-    # Add other dependency checks...
-    
-    all_ready = all(checks.values())
-    status_code = 200 if all_ready else 503
+    """Dependency readiness from the last background probe round (no I/O here).
     
-    return {"ready": all_ready, "checks": checks}
+    Per-dependency latency, last success and error are included; open breakers
+    mean the service is answering with fallbacks for that dependency.
+    """
+    body, status_code = readiness_monitor.response()
+    return Response(content=body, status_code=status_code, media_type="application/json")
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -99,18 +99,32 @@ class Alert(Base):
     __tablename__ = "alerts"
     
     id = Column(Integer, primary_key=True, index=True)
-    tx_id = Column(Integer, ForeignKey("transactions.id"), nullable=False, index=True)
+    tx_id = Column(Integer, ForeignKey("transactions.id"), nullable=False, index=True)  # First of the window
+    card_id = Column(String(50), index=True)
     severity = Column(String(10), nullable=False)  # LOW, MEDIUM, HIGH, CRITICAL
     reason = Column(Text, nullable=False)
+    alert_count = Column(Integer, default=1)  # Alerts merged by the aggregation window
+    max_p_fraud = Column(Float)
     status = Column(String(20), default="OPEN")  # OPEN, ASSIGNED, RESOLVED, FALSE_POSITIVE
     assigned_to = Column(String(100))
     resolved_at = Column(DateTime)
     resolution_notes = Column(Text)
     created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now())  # Set by every write; the alert queue syncs on it
     
     # Relationships
     transaction = relationship("Transaction", back_populates="alerts")
 
+class OutboxEvent(Base):
+    """Kafka message written with the rows it announces; deleted once published"""
+    __tablename__ = "outbox"
+    
+    id = Column(Integer, primary_key=True)
+    topic = Column(String(100), nullable=False)
+    key = Column(String(100))
+    payload = Column(Text, nullable=False)  # Encoded JSON, published as-is
+    created_at = Column(DateTime, server_default=func.now())
+
 class Card(Base):
     __tablename__ = "cards"
     
@@ -188,4 +202,13 @@ class Model(Base):
 Index('idx_transactions_ts_card', Transaction.ts, Transaction.card_id)
 Index('idx_transactions_ts_merchant', Transaction.ts, Transaction.merchant_id)
 Index('idx_decisions_created_score', Decision.created_at, Decision.score)
-Index('idx_alerts_status_severity', Alert.status, Alert.severity)
\ No newline at end of file
+Index('idx_alerts_status_severity', Alert.status, Alert.severity)
+Index('idx_alerts_updated_at', Alert.updated_at)
+
+# Keyset pagination of the read APIs: equality filters, then (created_at, id).
+# create_all() does not add indexes to existing tables: see scripts/upgrade_schema.sql
+Index('idx_decisions_created_id', Decision.created_at, Decision.id)
+Index('idx_alerts_created_id', Alert.created_at, Alert.id)
+Index('idx_alerts_status_severity_created', Alert.status, Alert.severity, Alert.created_at, Alert.id)
+Index('idx_alerts_status_created', Alert.status, Alert.created_at, Alert.id)
+Index('idx_drift_metrics_created_id', DriftMetric.created_at, DriftMetric.id)
\ No newline at end of file
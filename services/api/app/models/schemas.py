@@ -53,6 +53,7 @@ class ScoringResponse(BaseModel):
     component_scores: Dict[str, float] = {}
     is_fraud: bool
     latency_ms: Optional[float] = None
+    degraded_components: List[str] = []
     
     class Config:
         schema_extra = {
@@ -74,7 +75,8 @@ class ScoringResponse(BaseModel):
                     "anomaly": 0.91
                 },
                 "is_fraud": True,
-                "latency_ms": 23.5
+                "latency_ms": 23.5,
+                "degraded_components": []
             }
         }
 
@@ -98,6 +100,42 @@ class AlertResponse(BaseModel):
     status: AlertStatus
     created_at: datetime
     assigned_to: Optional[str] = None
+    card_id: Optional[str] = None
+    alert_count: int = 1
+    max_p_fraud: Optional[float] = None
+    updated_at: Optional[datetime] = None
+    
+class AlertPage(BaseModel):
+    items: List[AlertResponse]
+    next_cursor: Optional[str] = None  # Pass as ?cursor= for the next page; None on the last
+    
+class AlertUpdate(BaseModel):
+    """Analyst change of an alert's status or owner"""
+    status: AlertStatus
+    assigned_to: Optional[str] = Field(None, max_length=100)
+    resolution_notes: Optional[str] = None
+    
+    @validator('assigned_to', always=True)
+    def assigned_requires_owner(cls, v, values):
+        if values.get('status') == AlertStatus.ASSIGNED and not v:
+            raise ValueError('assigned_to is required for ASSIGNED')
+        return v
+    
+class AlertSubscription(BaseModel):
+    """WebSocket alert filter; omitted fields match anything.
+
+    List lengths are capped so one subscribe cannot grow the server-side index
+    without bound (there are fewer than 1000 MCCs in use and 250 countries).
+    """
+    severity: Optional[List[AlertSeverity]] = Field(None, max_length=len(AlertSeverity))
+    mcc: Optional[List[str]] = Field(None, max_length=1000)
+    country: Optional[List[str]] = Field(None, max_length=250)
+    min_p_fraud: Optional[float] = Field(None, ge=0, le=1)
+    max_p_fraud: Optional[float] = Field(None, ge=0, le=1)
+    
+    @validator('country', each_item=True)
+    def upper_country(cls, v):
+        return v.upper()
     
 class DecisionResponse(BaseModel):
     id: int
@@ -109,6 +147,10 @@ class DecisionResponse(BaseModel):
     created_at: datetime
     latency_ms: Optional[float] = None
 
+class DecisionPage(BaseModel):
+    items: List[DecisionResponse]
+    next_cursor: Optional[str] = None
+
 class ModelStage(str, Enum):
     SHADOW = "shadow"
     CANARY = "canary" 
@@ -123,4 +165,22 @@ class ModelResponse(BaseModel):
     metrics: Dict[str, Any]
     created_at: datetime
     promoted_at: Optional[datetime] = None
-        
\ No newline at end of file
+        
+
+class DriftMetricResponse(BaseModel):
+    id: int
+    window_start: datetime
+    window_end: datetime
+    psi_amount: Optional[float] = None
+    psi_hour: Optional[float] = None
+    psi_country: Optional[float] = None
+    psi_mcc: Optional[float] = None
+    js_geo: Optional[float] = None
+    ks_amount: Optional[float] = None
+    concept_auc: Optional[float] = None
+    concept_drift_detected: bool = False
+    created_at: datetime
+
+class DriftMetricPage(BaseModel):
+    items: List[DriftMetricResponse]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,406 @@
+"""
+Analyst alert queue.
+
+AlertService keeps the OPEN and ASSIGNED rows of the `alerts` table in memory
+so the analyst views never touch Postgres:
+
+- OPEN alerts are in a heap ordered by severity, then p_fraud (the window's
+  highest), then age. "Next alert" peeks or pops it in O(log n); entries of
+  alerts that changed since they were pushed are skipped lazily and the heap
+  is rebuilt when they outnumber the live ones;
+- ASSIGNED alerts are kept per analyst as a sorted list of the same keys
+  ("my queue" is a slice), and every active alert is indexed by card.
+
+The queue is loaded from the table on startup (the OPEN / ASSIGNED rows,
+through idx_alerts_status_severity) and then follows it: every write to an
+alert sets updated_at, and every ALERT_QUEUE_SYNC_SECONDS the rows updated
+since the last sync are re-read (idx_alerts_updated_at). The re-read starts
+ALERT_QUEUE_SYNC_OVERLAP_SECONDS early, since a transaction's timestamp is
+taken before it commits; applying a row is idempotent.
+
+Claims go to the database as a conditional update (status still OPEN), so
+two workers never hand out the same alert: the loser drops it and takes the
+next one. Until the first sync, or when the last one is older than
+ALERT_QUEUE_MAX_STALENESS_SECONDS, reads fall back to Postgres.
+"""
+
+import asyncio
+import heapq
+import logging
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from ..config import settings
+from ..core.executor import run_db
+from ..models.database import Alert
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_RANK = {"LOW": 0, "MEDIUM": 1, "HIGH": 2, "CRITICAL": 3}
+ACTIVE_STATUSES = ("OPEN", "ASSIGNED")
+
+# Compact projection of an alert row; the queue never hydrates ORM objects
+COLUMNS = (
+    Alert.id, Alert.tx_id, Alert.card_id, Alert.severity, Alert.reason, Alert.status, Alert.assigned_to,
+    Alert.alert_count, Alert.max_p_fraud, Alert.created_at, Alert.updated_at
+)
+
+
+class QueuedAlert:
+    __slots__ = ("id", "tx_id", "card_id", "severity", "reason", "status", "assigned_to", "alert_count",
+                 "p_fraud", "created_at", "updated_at", "key")
+
+    def __init__(self, row):
+        (self.id, self.tx_id, self.card_id, self.severity, self.reason, self.status, self.assigned_to,
+         alert_count, p_fraud, self.created_at, self.updated_at) = row
+        self.alert_count = alert_count or 1
+        self.p_fraud = p_fraud or 0.0
+        # Most severe first, then most likely fraud, then oldest
+        self.key = (-SEVERITY_RANK.get(self.severity, 0), -self.p_fraud, self.created_at or datetime.min, self.id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "tx_id": self.tx_id,
+            "card_id": self.card_id,
+            "severity": self.severity,
+            "reason": self.reason,
+            "status": self.status,
+            "assigned_to": self.assigned_to,
+            "alert_count": self.alert_count,
+            "max_p_fraud": self.p_fraud,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+class AlertQueue:
+    """OPEN alerts by priority, ASSIGNED alerts by analyst, active alerts by card"""
+
+    def __init__(self):
+        self.alerts: Dict[int, QueuedAlert] = {}
+        self._open: List[Tuple[tuple, int]] = []
+        self._stale = 0
+        self._assigned: Dict[str, List[tuple]] = {}
+        self._cards: Dict[str, Set[int]] = {}
+        self.open_count = 0
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    @property
+    def analysts(self) -> int:
+        return len(self._assigned)
+
+    def put(self, alert: QueuedAlert):
+        """Insert or replace an alert; inactive ones are removed"""
+        self.remove(alert.id)
+        if alert.status not in ACTIVE_STATUSES:
+            return
+        self.alerts[alert.id] = alert
+        if alert.status == "OPEN":
+            heapq.heappush(self._open, (alert.key, alert.id))
+            self.open_count += 1
+        else:
+            insort(self._assigned.setdefault(alert.assigned_to or "", []), alert.key)
+        if alert.card_id is not None:
+            self._cards.setdefault(alert.card_id, set()).add(alert.id)
+
+    def remove(self, alert_id: int) -> Optional[QueuedAlert]:
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        if alert.status == "OPEN":
+            # Its heap entry goes stale and is skipped when it surfaces
+            self.open_count -= 1
+            self._stale += 1
+            if self._stale > 1024 and self._stale > self.open_count:
+                self._compact()
+        else:
+            owner = alert.assigned_to or ""
+            keys = self._assigned[owner]
+            del keys[bisect_left(keys, alert.key)]
+            if not keys:
+                del self._assigned[owner]
+        if alert.card_id is not None:
+            ids = self._cards[alert.card_id]
+            ids.discard(alert_id)
+            if not ids:
+                del self._cards[alert.card_id]
+        return alert
+
+    def peek(self) -> Optional[QueuedAlert]:
+        """Highest-priority OPEN alert"""
+        while self._open:
+            key, alert_id = self._open[0]
+            alert = self.alerts.get(alert_id)
+            if alert is not None and alert.status == "OPEN" and alert.key == key:
+                return alert
+            heapq.heappop(self._open)
+            self._stale -= 1
+        return None
+
+    def pop(self) -> Optional[QueuedAlert]:
+        alert = self.peek()
+        if alert is not None:
+            self.remove(alert.id)
+        return alert
+
+    def assigned(self, analyst: str, limit: int) -> List[QueuedAlert]:
+        """An analyst's ASSIGNED alerts, highest priority first"""
+        return [self.alerts[key[-1]] for key in self._assigned.get(analyst, ())[:limit]]
+
+    def for_card(self, card_id: str) -> List[QueuedAlert]:
+        return sorted((self.alerts[alert_id] for alert_id in self._cards.get(card_id, ())), key=lambda a: a.key)
+
+    def _compact(self):
+        self._open = [(alert.key, alert.id) for alert in self.alerts.values() if alert.status == "OPEN"]
+        heapq.heapify(self._open)
+        self._stale = 0
+
+
+def load_active(db) -> Tuple[List[Any], Optional[datetime]]:
+    """OPEN / ASSIGNED rows and the sync cursor to continue from (blocking)"""
+    # Read the cursor first: anything updated during the load is re-read by the next sync
+    cursor = db.query(func.max(Alert.updated_at)).scalar() or db.query(func.now()).scalar()
+    rows = db.query(*COLUMNS).filter(Alert.status.in_(ACTIVE_STATUSES)).all()
+    return rows, cursor
+
+
+def load_changes(db, since: datetime) -> List[Any]:
+    """Rows updated since `since`, any status (blocking)"""
+    return db.query(*COLUMNS).filter(Alert.updated_at >= since).order_by(Alert.updated_at).all()
+
+
+def claim_alert(db, alert_id: int, analyst: str) -> bool:
+    """Assign an alert if it is still OPEN; False if another worker got it first (blocking)"""
+    count = db.query(Alert)\
+        .filter(Alert.id == alert_id, Alert.status == "OPEN")\
+        .update({Alert.status: "ASSIGNED", Alert.assigned_to: analyst, Alert.updated_at: func.now()},
+                synchronize_session=False)
+    db.commit()
+    return count == 1
+
+
+def next_open_from_db(db, lock: bool = False) -> Optional[Any]:
+    """Postgres fallback of "next alert": one idx_alerts_status_severity lookup per severity (blocking)"""
+    for severity in sorted(SEVERITY_RANK, key=SEVERITY_RANK.get, reverse=True):
+        query = db.query(*COLUMNS)\
+            .filter(Alert.status == "OPEN", Alert.severity == severity)\
+            .order_by(Alert.max_p_fraud.desc().nullslast(), Alert.created_at, Alert.id)\
+            .limit(1)
+        if lock:
+            query = query.with_for_update(skip_locked=True)
+        row = query.first()
+        if row is not None:
+            return row
+    return None
+
+
+def claim_next_from_db(db, analyst: str) -> Optional[Any]:
+    row = next_open_from_db(db, lock=True)
+    if row is None:
+        db.rollback()
+        return None
+    db.query(Alert).filter(Alert.id == row.id)\
+        .update({Alert.status: "ASSIGNED", Alert.assigned_to: analyst, Alert.updated_at: func.now()},
+                synchronize_session=False)
+    db.commit()
+    return row
+
+
+def assigned_from_db(db, analyst: str) -> List[Any]:
+    return db.query(*COLUMNS).filter(Alert.status == "ASSIGNED", Alert.assigned_to == analyst).all()
+
+
+def card_alerts_from_db(db, card_id: str) -> List[Any]:
+    return db.query(*COLUMNS).filter(Alert.card_id == card_id, Alert.status.in_(ACTIVE_STATUSES)).all()
+
+
+def set_status(db, alert_id: int, status: str, assigned_to: Optional[str],
+               notes: Optional[str]) -> Optional[Any]:
+    """Apply an analyst's change and return the updated row (blocking)"""
+    values = {Alert.status: status, Alert.updated_at: func.now()}
+    if status in ACTIVE_STATUSES:
+        values[Alert.assigned_to] = assigned_to if status == "ASSIGNED" else None
+    else:
+        values[Alert.resolved_at] = func.now()
+    if notes is not None:
+        values[Alert.resolution_notes] = notes
+    count = db.query(Alert).filter(Alert.id == alert_id).update(values, synchronize_session=False)
+    db.commit()
+    if not count:
+        return None
+    return db.query(*COLUMNS).filter(Alert.id == alert_id).one()
+
+
+class AlertService:
+    """In-memory analyst views over the alerts table, with Postgres as the fallback"""
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None):
+        self.session_factory = session_factory
+        self.queue = AlertQueue()
+        self._cursor: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self.synced_at: Optional[float] = None
+        self.syncs = 0
+        self.sync_errors = 0
+        self.claims = 0
+        self.claim_conflicts = 0
+        self.fallbacks = 0
+
+    @property
+    def ready(self) -> bool:
+        """Synced recently enough to serve reads from memory"""
+        return self.synced_at is not None and \
+            monotonic() - self.synced_at <= settings.ALERT_QUEUE_MAX_STALENESS_SECONDS
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.sync_errors += 1
+                logger.warning(f"Alert queue sync failed: {e}")
+            await asyncio.sleep(settings.ALERT_QUEUE_SYNC_SECONDS)
+
+    async def sync(self):
+        """Load the queue on the first call, then apply the rows changed since the last"""
+        if self._cursor is None:
+            rows, cursor = await self._db(load_active)
+            queue = AlertQueue()
+            for row in rows:
+                queue.put(QueuedAlert(row))
+            self.queue = queue
+            logger.info(f"Alert queue loaded {len(rows)} open and assigned alerts")
+        else:
+            since = self._cursor - timedelta(seconds=settings.ALERT_QUEUE_SYNC_OVERLAP_SECONDS)
+            rows = await self._db(load_changes, since)
+            for row in rows:
+                self.queue.put(QueuedAlert(row))
+            cursor = max((row.updated_at for row in rows if row.updated_at is not None), default=None)
+        if cursor is not None and (self._cursor is None or cursor > self._cursor):
+            self._cursor = cursor
+        self.syncs += 1
+        self.synced_at = monotonic()
+
+    async def claim_next(self, analyst: str) -> Optional[Dict[str, Any]]:
+        """Assign the highest-priority OPEN alert to `analyst`"""
+        if not self.ready:
+            self.fallbacks += 1
+            row = await self._db(claim_next_from_db, analyst)
+            return self._assigned_dict(QueuedAlert(row), analyst) if row is not None else None
+        while True:
+            # Taken out of the queue first, so concurrent requests of this worker never race for it
+            alert = self.queue.pop()
+            if alert is None:
+                return None
+            try:
+                claimed = await self._db(claim_alert, alert.id, analyst)
+            except Exception:
+                self.queue.put(alert)
+                raise
+            if claimed:
+                self.claims += 1
+                return self._assigned_dict(alert, analyst)
+            # Assigned or resolved elsewhere; the next sync brings its state
+            self.claim_conflicts += 1
+
+    def _assigned_dict(self, alert: QueuedAlert, analyst: str) -> Dict[str, Any]:
+        alert.status = "ASSIGNED"
+        alert.assigned_to = analyst
+        if self.ready:
+            self.queue.put(alert)
+        return alert.to_dict()
+
+    async def peek_next(self) -> Optional[Dict[str, Any]]:
+        if not self.ready:
+            self.fallbacks += 1
+            row = await self._db(next_open_from_db)
+            return QueuedAlert(row).to_dict() if row is not None else None
+        alert = self.queue.peek()
+        return alert.to_dict() if alert is not None else None
+
+    async def assigned_to(self, analyst: str, limit: int) -> List[Dict[str, Any]]:
+        """An analyst's queue, highest priority first"""
+        if not self.ready:
+            self.fallbacks += 1
+            rows = await self._db(assigned_from_db, analyst)
+            alerts = sorted((QueuedAlert(row) for row in rows), key=lambda a: a.key)[:limit]
+        else:
+            alerts = self.queue.assigned(analyst, limit)
+        return [alert.to_dict() for alert in alerts]
+
+    async def for_card(self, card_id: str) -> List[Dict[str, Any]]:
+        """Active alerts of a card, highest priority first"""
+        if not self.ready:
+            self.fallbacks += 1
+            rows = await self._db(card_alerts_from_db, card_id)
+            alerts = sorted((QueuedAlert(row) for row in rows), key=lambda a: a.key)
+        else:
+            alerts = self.queue.for_card(card_id)
+        return [alert.to_dict() for alert in alerts]
+
+    async def update(self, alert_id: int, status: str, assigned_to: Optional[str] = None,
+                     notes: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Write an analyst's change through to the table and the queue"""
+        row = await self._db(set_status, alert_id, status, assigned_to, notes)
+        if row is None:
+            return None
+        alert = QueuedAlert(row)
+        if self.ready:
+            self.queue.put(alert)
+        return alert.to_dict()
+
+    async def _db(self, fn, *args):
+        if self.session_factory is None:
+            from ..database import SessionLocal
+            self.session_factory = SessionLocal
+
+        def call():
+            db = self.session_factory()
+            try:
+                return fn(db, *args)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        return await run_db(call)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "alerts": len(self.queue),
+            "open": self.queue.open_count,
+            "analysts": self.queue.analysts,
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "seconds_since_sync": round(monotonic() - self.synced_at, 2) if self.synced_at is not None else None,
+            "claims": self.claims,
+            "claim_conflicts": self.claim_conflicts,
+            "fallbacks": self.fallbacks
+        }
+
+
+alert_service = AlertService()
@@ -0,0 +1,322 @@
+"""
+Alert aggregation window per card and reason.
+
+During a velocity attack every transaction of the card crosses the
+threshold, and each would become its own Alert row, outbox message and
+/ws broadcast. The aggregator keeps one window per (card, reason) for
+ALERT_WINDOW_SECONDS from the card's first alert:
+
+- the first alert of a window is written and broadcast immediately, so
+  detection is not delayed;
+- later alerts in the window are merged into it (count, highest p_fraud,
+  last transaction) and write nothing;
+- when the window closes, a window that merged anything is flushed once:
+  the first Alert row gets alert_count / max_p_fraud / updated_at and a
+  single alert message with the totals is published.
+
+A window is opened when its first alert is offered, before that alert's
+commit. If the commit fails the caller discards it again (discard()); if
+other alerts were merged meanwhile, the window passes to the latest of them
+and its row is inserted when it is flushed. A flush that fails is queued
+again for the next one.
+
+Windows are kept in start order, so closing them pops from the front. The
+index holds at most ALERT_WINDOW_MAX_KEYS windows; past that the oldest is
+closed (and flushed) early, which bounds memory during a flood of distinct
+cards at the cost of splitting their windows.
+
+Each process aggregates what it sees. The streaming worker sees all of a
+card's transactions (partitioned by card) and writes the same rows, but
+produces the messages itself after the commit; API workers each aggregate
+their share.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from ..config import settings
+from ..core.executor import run_db
+from ..models.database import Alert, OutboxEvent
+from .outbox import alert_severity, outbox_row
+
+logger = logging.getLogger(__name__)
+
+# Reason of alerts without specific risk factors
+DEFAULT_REASON = "High fraud probability"
+
+
+class AlertWindow:
+    __slots__ = ("card_id", "reason", "started", "tx_id", "last_tx_id", "count", "max_p_fraud", "message",
+                 "written")
+
+    def __init__(self, card_id: str, reason: str, started: float, tx_id: int, p_fraud: float,
+                 message: Optional[Dict[str, Any]]):
+        self.card_id = card_id
+        self.reason = reason
+        self.started = started
+        self.tx_id = tx_id
+        self.last_tx_id = tx_id
+        self.count = 1
+        self.max_p_fraud = p_fraud
+        self.message = message
+        # False once the first alert's commit failed: the flush inserts the row
+        self.written = True
+
+    def update_message(self) -> Dict[str, Any]:
+        """The window's first alert message with the merged totals"""
+        message = dict(self.message or {"type": "alert", "tx_id": self.tx_id, "card_id": self.card_id})
+        message.update({
+            "tx_id": self.tx_id,
+            "p_fraud": self.max_p_fraud,
+            "severity": alert_severity(self.max_p_fraud),
+            "alert_count": self.count,
+            "max_p_fraud": self.max_p_fraud,
+            "last_tx_id": self.last_tx_id,
+            "updated_at": datetime.utcnow().isoformat()
+        })
+        return message
+
+
+class AlertAggregator:
+    """Bounded index of open alert windows keyed by (card, reason)"""
+
+    def __init__(self, window_seconds: Optional[float] = None, max_keys: Optional[int] = None,
+                 clock: Callable[[], float] = monotonic):
+        self.window_seconds = window_seconds if window_seconds is not None else settings.ALERT_WINDOW_SECONDS
+        self.max_keys = max_keys or settings.ALERT_WINDOW_MAX_KEYS
+        self.clock = clock
+        self._windows: "OrderedDict[Tuple[str, str], AlertWindow]" = OrderedDict()
+        # Closed early (index full) and waiting for the next flush
+        self._closed: List[AlertWindow] = []
+        # The batch scoring paths offer from DB executor threads
+        self._lock = threading.Lock()
+        self.offered = 0
+        self.emitted = 0
+        self.merged = 0
+        self.updates = 0
+        self.evicted = 0
+
+    def offer(self, card_id: str, reason: str, tx_id: int, p_fraud: float,
+              message: Optional[Dict[str, Any]] = None) -> bool:
+        """Record a flagged transaction; True if it opens a window and must be emitted now"""
+        with self._lock:
+            self.offered += 1
+            if self.window_seconds <= 0:
+                self.emitted += 1
+                return True
+            now = self.clock()
+            self._expire(now)
+            key = (card_id, reason)
+            window = self._windows.get(key)
+            if window is not None:
+                window.count += 1
+                window.last_tx_id = tx_id
+                window.max_p_fraud = max(window.max_p_fraud, p_fraud)
+                self.merged += 1
+                return False
+            if len(self._windows) >= self.max_keys:
+                _, oldest = self._windows.popitem(last=False)
+                self.evicted += 1
+                self._close(oldest)
+            self._windows[key] = AlertWindow(card_id, reason, now, tx_id, p_fraud, message)
+            self.emitted += 1
+            return True
+
+    def due(self) -> List[AlertWindow]:
+        """Closed windows that merged alerts and need their one update"""
+        with self._lock:
+            self._expire(self.clock())
+            closed, self._closed = self._closed, []
+            return closed
+
+    def drain(self) -> List[AlertWindow]:
+        """Close every window (shutdown)"""
+        with self._lock:
+            while self._windows:
+                self._close(self._windows.popitem(last=False)[1])
+            closed, self._closed = self._closed, []
+            return closed
+
+    def discard(self, alerts: List[Dict[str, Any]]):
+        """Undo the windows opened by `alerts` (alert_rows mappings) whose commit failed"""
+        with self._lock:
+            if self.window_seconds <= 0:
+                return
+            for alert in alerts:
+                key = (alert["card_id"], alert["reason"])
+                window = self._windows.get(key)
+                if window is None:
+                    window = next((w for w in self._closed if (w.card_id, w.reason) == key), None)
+                if window is None or window.tx_id != alert["tx_id"] or not window.written:
+                    continue
+                self.offered -= 1
+                self.emitted -= 1
+                if window.count == 1:
+                    self._windows.pop(key, None)
+                    continue
+                # Alerts were merged into it meanwhile: keep it under the latest one, written at flush
+                window.count -= 1
+                window.tx_id = window.last_tx_id
+                window.written = False
+
+    def requeue(self, windows: List[AlertWindow]):
+        """Put back updates whose write failed, ahead of newer ones (at most max_keys are kept)"""
+        with self._lock:
+            pending = windows + self._closed
+            dropped = len(pending) - self.max_keys
+            if dropped > 0:
+                logger.warning(f"Dropping {dropped} pending alert window updates")
+                pending = pending[dropped:]
+            self._closed = pending
+
+    def reset(self):
+        """Forget every window and pending update (their alerts are being replayed)"""
+        with self._lock:
+            self._windows.clear()
+            self._closed = []
+
+    def _expire(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._windows:
+            window = next(iter(self._windows.values()))
+            if window.started > cutoff:
+                break
+            self._windows.popitem(last=False)
+            self._close(window)
+
+    def _close(self, window: AlertWindow):
+        if window.count > 1 or not window.written:
+            self.updates += 1
+            self._closed.append(window)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_seconds": self.window_seconds,
+            "open_windows": len(self._windows),
+            "max_keys": self.max_keys,
+            "offered": self.offered,
+            "emitted": self.emitted,
+            "merged": self.merged,
+            "updates": self.updates,
+            "evicted": self.evicted,
+            # Alerts that would each have been a write and a broadcast
+            "writes_saved": self.offered - self.emitted - self.updates
+        }
+
+
+def alert_rows(aggregator: AlertAggregator, tx_id: int, card_id: str, reason: str, p_fraud: float,
+               message: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Alert mapping and outbox row of a flagged transaction, or None if an open window absorbed it"""
+    reason = reason or DEFAULT_REASON
+    if not aggregator.offer(card_id, reason, tx_id, p_fraud, message):
+        return None
+    alert = {
+        "tx_id": tx_id,
+        "card_id": card_id,
+        "severity": alert_severity(p_fraud),
+        "reason": reason,
+        "status": "OPEN",
+        "alert_count": 1,
+        "max_p_fraud": p_fraud
+    }
+    return alert, outbox_row(settings.INFERENCE_ALERTS_TOPIC, card_id, message)
+
+
+def write_alert_updates(db, windows: List[AlertWindow], outbox: bool = True):
+    """Update each window's first Alert row (inserting it if missing) and queue its message,
+    in one transaction (blocking). Without `outbox` the caller produces the messages."""
+    missing = []
+    for window in windows:
+        updated = db.query(Alert)\
+            .filter(Alert.tx_id == window.tx_id, Alert.card_id == window.card_id)\
+            .update({
+                Alert.alert_count: window.count,
+                Alert.max_p_fraud: window.max_p_fraud,
+                Alert.severity: alert_severity(window.max_p_fraud),
+                Alert.updated_at: func.now()
+            }, synchronize_session=False)
+        if not updated:
+            missing.append({
+                "tx_id": window.tx_id,
+                "card_id": window.card_id,
+                "severity": alert_severity(window.max_p_fraud),
+                "reason": window.reason,
+                "status": "OPEN",
+                "alert_count": window.count,
+                "max_p_fraud": window.max_p_fraud
+            })
+    if missing:
+        db.bulk_insert_mappings(Alert, missing)
+    if outbox:
+        db.bulk_insert_mappings(OutboxEvent, [
+            outbox_row(settings.INFERENCE_ALERTS_TOPIC, window.card_id, window.update_message())
+            for window in windows
+        ])
+    db.commit()
+
+
+class AlertWindowFlusher:
+    """Writes the updates of closed windows every ALERT_WINDOW_FLUSH_SECONDS"""
+
+    def __init__(self, aggregator: AlertAggregator, session_factory: Optional[Callable[[], Any]] = None):
+        self.aggregator = aggregator
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None and self.aggregator.window_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Close every open window and write the updates"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush(self.aggregator.drain())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.ALERT_WINDOW_FLUSH_SECONDS)
+            await self.flush(self.aggregator.due())
+
+    async def flush(self, windows: List[AlertWindow]):
+        if not windows:
+            return
+        try:
+            await run_db(self._write, windows)
+            self.flushes += 1
+        except Exception as e:
+            self.errors += 1
+            self.aggregator.requeue(windows)
+            logger.warning(f"Failed to write {len(windows)} aggregated alert updates, retrying next flush: {e}")
+
+    def _write(self, windows: List[AlertWindow]):
+        if self.session_factory is None:
+            from ..database import SessionLocal
+            self.session_factory = SessionLocal
+        db = self.session_factory()
+        try:
+            write_alert_updates(db, windows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+alert_aggregator = AlertAggregator()
+alert_flusher = AlertWindowFlusher(alert_aggregator)
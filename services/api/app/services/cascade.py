@@ -0,0 +1,228 @@
+"""
+Two-stage cascade scoring.
+
+A tiny first-stage model runs on features that are cheap to compute (amount,
+time of day and in-process velocity) and clears transactions that are
+confidently benign. Everything else goes through the full ScoringService
+ensemble. The model and its cutoff are produced offline by
+scripts/calibrate_cascade.py.
+"""
+
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Feature order shared by the offline calibration tool and the online scorer
+CHEAP_FEATURE_NAMES = [
+    'amount_log', 'hour_sin', 'hour_cos', 'is_weekend',
+    'local_velocity_1m_count', 'local_velocity_5m_count',
+    'local_velocity_30m_count', 'local_velocity_120m_count',
+    'local_velocity_5m_amount', 'local_velocity_120m_amount',
+    'local_seconds_since_last_tx'
+]
+
+
+class LocalVelocityTracker:
+    """In-process per-card velocity over the configured windows.
+
+    Only sees the traffic handled by this worker, which is good enough for a
+    first-stage filter; the full path still reads the shared Redis counters.
+    """
+
+    def __init__(self, windows_minutes: List[int], max_cards: int = 100000):
+        self.windows = sorted(windows_minutes)
+        self.horizon_seconds = self.windows[-1] * 60
+        self.max_cards = max_cards
+        self._events: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, card_id: str, ts: datetime, amount: float) -> Dict[str, float]:
+        """Return velocity features for this transaction and record it"""
+        now = ts.timestamp()
+        with self._lock:
+            events = self._events.get(card_id)
+            if events is None:
+                events = deque()
+                self._events[card_id] = events
+                if len(self._events) > self.max_cards:
+                    self._events.popitem(last=False)
+            else:
+                self._events.move_to_end(card_id)
+
+            while events and events[0][0] < now - self.horizon_seconds:
+                events.popleft()
+
+            features = {}
+            for window in self.windows:
+                start = now - window * 60
+                in_window = [amt for t, amt in events if start <= t <= now]
+                features[f'local_velocity_{window}m_count'] = float(len(in_window))
+                features[f'local_velocity_{window}m_amount'] = float(sum(in_window))
+
+            last_ts = events[-1][0] if events else None
+            features['local_seconds_since_last_tx'] = (
+                min(now - last_ts, float(self.horizon_seconds))
+                if last_ts is not None else float(self.horizon_seconds)
+            )
+
+            events.append((now, amount))
+
+        return features
+
+
+def cheap_features(
+    amount: float,
+    timestamp: datetime,
+    velocity: Dict[str, float]
+) -> np.ndarray:
+    """Build the first-stage feature vector in CHEAP_FEATURE_NAMES order"""
+    hour = timestamp.hour
+    values = {
+        'amount_log': math.log1p(amount),
+        'hour_sin': math.sin(2 * math.pi * hour / 24),
+        'hour_cos': math.cos(2 * math.pi * hour / 24),
+        'is_weekend': float(timestamp.weekday() >= 5),
+    }
+    values.update(velocity)
+    return np.array([values.get(name, 0.0) for name in CHEAP_FEATURE_NAMES], dtype=np.float64)
+
+
+class FirstStageModel:
+    """Standardised logistic regression over the cheap features"""
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: float,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        cutoff: float,
+        version: str = "cascade-v1",
+        metrics: Optional[Dict[str, Any]] = None
+    ):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.cutoff = float(cutoff)
+        self.version = version
+        self.metrics = metrics or {}
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Fraud probability for a vector or a matrix of cheap features"""
+        z = ((np.asarray(x, dtype=np.float64) - self.mean) / self.scale) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "feature_names": CHEAP_FEATURE_NAMES,
+            "weights": self.weights.tolist(),
+            "bias": self.bias,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "cutoff": self.cutoff,
+            "metrics": self.metrics
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FirstStageModel":
+        if data.get("feature_names") != CHEAP_FEATURE_NAMES:
+            raise ValueError("Cascade model was trained on a different feature set")
+        return cls(
+            weights=data["weights"],
+            bias=data["bias"],
+            mean=data["mean"],
+            scale=data["scale"],
+            cutoff=data["cutoff"],
+            version=data.get("version", "cascade-v1"),
+            metrics=data.get("metrics")
+        )
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> "FirstStageModel":
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+
+class CascadeScorer:
+    """Online first stage: scores cheap features and decides the route"""
+
+    def __init__(self, model: FirstStageModel, tracker: Optional[LocalVelocityTracker] = None):
+        self.model = model
+        self.tracker = tracker or LocalVelocityTracker(settings.VELOCITY_WINDOW_MINUTES)
+        self.total = 0
+        self.fast_path = 0
+
+    def evaluate(self, transaction) -> Tuple[float, bool]:
+        """Return (first-stage probability, cleared) for a TransactionRequest"""
+        velocity = self.tracker.observe(
+            transaction.card_id, transaction.timestamp, transaction.amount
+        )
+        x = cheap_features(transaction.amount, transaction.timestamp, velocity)
+        p_fraud = float(self.model.predict(x))
+        cleared = p_fraud < self.model.cutoff
+
+        self.total += 1
+        if cleared:
+            self.fast_path += 1
+        return p_fraud, cleared
+
+    @property
+    def fast_path_fraction(self) -> float:
+        return self.fast_path / self.total if self.total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "model_version": self.model.version,
+            "cutoff": self.model.cutoff,
+            "total": self.total,
+            "fast_path": self.fast_path,
+            "fast_path_fraction": self.fast_path_fraction,
+            "offline_metrics": self.model.metrics
+        }
+
+
+_cascade: Optional[CascadeScorer] = None
+_cascade_loaded = False
+
+
+def get_cascade() -> Optional[CascadeScorer]:
+    """Process-wide cascade scorer, or None when disabled or not calibrated"""
+    global _cascade, _cascade_loaded
+    if _cascade_loaded:
+        return _cascade
+
+    _cascade_loaded = True
+    if not settings.CASCADE_ENABLED:
+        return None
+
+    try:
+        model = FirstStageModel.load(Path(settings.CASCADE_MODEL_PATH))
+        _cascade = CascadeScorer(model)
+        logger.info(
+            f"Cascade enabled with {model.version} (cutoff={model.cutoff:.4f})"
+        )
+    except Exception as e:
+        logger.warning(f"Cascade disabled, failed to load first-stage model: {e}")
+        _cascade = None
+
+    return _cascade
@@ -0,0 +1,277 @@
+"""
+Columnar (Arrow IPC) ingest for bulk scoring.
+
+A bulk request is an Arrow IPC stream with one column per TransactionRequest
+field. Validation runs as vectorised checks over whole columns instead of one
+pydantic model per row, and string columns are dictionary-encoded so that
+batch feature generation works on integer codes plus the (much smaller) list
+of distinct values. Responses are written back as an Arrow IPC stream.
+
+Request columns:
+    id           int64        required
+    timestamp    timestamp    required (any unit, naive UTC or tz-aware)
+    card_id      utf8         required, 1-50 chars
+    merchant_id  utf8         required, 1-50 chars
+    amount       float64      required, 0 < amount <= 1,000,000
+    mcc          utf8         required, 4 digits
+    currency     utf8         optional, 3 chars (defaults to USD)
+    device_id    utf8         optional, <= 100 chars
+    ip           utf8         optional, <= 45 chars
+    city         utf8         optional, <= 100 chars
+    country      utf8         optional, 2 chars
+
+Response columns: tx_id, p_fraud, score, is_fraud, model_version, lgbm,
+graph, anomaly, error. Rows keep their request order; rows that failed
+validation or scoring have null scores and an error message.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+REQUIRED_COLUMNS = ["id", "timestamp", "card_id", "merchant_id", "amount", "mcc"]
+
+# (min length, max length) for string columns, mirroring TransactionRequest
+STRING_LENGTHS = {
+    "card_id": (1, 50),
+    "merchant_id": (1, 50),
+    "mcc": (4, 4),
+    "currency": (3, 3),
+    "device_id": (0, 100),
+    "ip": (0, 45),
+    "city": (0, 100),
+    "country": (2, 2),
+}
+NULLABLE_COLUMNS = {"device_id", "ip", "city", "country"}
+
+
+class EncodedColumn:
+    """Dictionary-encoded string column: per-row codes into the distinct values.
+
+    Null entries have code -1.
+    """
+
+    def __init__(self, codes: np.ndarray, values: List[Optional[str]]):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def from_arrow(cls, column) -> "EncodedColumn":
+        if isinstance(column, pa.ChunkedArray):
+            column = column.combine_chunks()
+        encoded = pc.dictionary_encode(column)
+        codes = pc.fill_null(encoded.indices, -1).to_numpy().astype(np.int64)
+        return cls(codes, encoded.dictionary.to_pylist())
+
+    def take(self, per_value: np.ndarray, fill: Any) -> np.ndarray:
+        """Broadcast an array indexed by distinct value (first axis) to one entry per row"""
+        per_value = np.asarray(per_value)
+        fill_row = np.full((1,) + per_value.shape[1:], fill, dtype=per_value.dtype)
+        padded = np.concatenate([per_value, fill_row])
+        return padded[np.where(self.codes >= 0, self.codes, len(per_value))]
+
+
+class ColumnarBatch:
+    """Validated transactions held as columns; row_index maps back to request rows"""
+
+    def __init__(
+        self,
+        row_index: np.ndarray,
+        tx_id: np.ndarray,
+        timestamp: np.ndarray,
+        amount: np.ndarray,
+        strings: Dict[str, EncodedColumn]
+    ):
+        self.row_index = row_index
+        self.tx_id = tx_id
+        self.timestamp = timestamp
+        self.amount = amount
+        self.card_id = strings["card_id"]
+        self.merchant_id = strings["merchant_id"]
+        self.mcc = strings["mcc"]
+        self.currency = strings["currency"]
+        self.device_id = strings["device_id"]
+        self.ip = strings["ip"]
+        self.city = strings["city"]
+        self.country = strings["country"]
+
+    def __len__(self) -> int:
+        return len(self.tx_id)
+
+    @property
+    def epoch_seconds(self) -> np.ndarray:
+        return self.timestamp.astype('datetime64[s]').astype(np.int64)
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> Tuple["ColumnarBatch", np.ndarray]:
+        """Build a batch from already-decoded JSON records (e.g. Kafka messages)"""
+        table = pa.Table.from_pylist(records)
+        if "timestamp" in table.column_names and pa.types.is_string(table.schema.field("timestamp").type):
+            table = table.set_column(
+                table.schema.get_field_index("timestamp"), "timestamp", parse_timestamps(table["timestamp"])
+            )
+        return validate_table(table)
+
+
+def parse_timestamps(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """ISO-8601 strings -> naive UTC timestamp[us]; unparseable values become null.
+
+    Accepts what datetime.isoformat() and pydantic emit: fractional seconds or
+    not, a `Z` or +hh:mm offset or none (naive values are taken as UTC).
+    """
+    normalized = pc.replace_substring_regex(column, r"Z$", "+00:00")
+    has_offset = pc.match_substring_regex(normalized, r"[+-]\d{2}:?\d{2}$")
+    normalized = pc.if_else(has_offset, normalized, pc.binary_join_element_wise(normalized, "+00:00", ""))
+    try:
+        parsed = pc.cast(normalized, pa.timestamp("us", tz="UTC"))
+    except pa.ArrowInvalid:
+        # A malformed value fails the whole cast: parse one by one
+        parsed = pa.chunked_array([
+            pa.array([_parse_one(value) for value in normalized.to_pylist()], pa.timestamp("us", tz="UTC"))
+        ])
+    return pc.cast(parsed, pa.timestamp("us"))
+
+
+def _parse_one(value: Optional[str]) -> Optional[datetime]:
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def read_ipc(body: bytes) -> pa.Table:
+    """Parse an Arrow IPC stream request body"""
+    try:
+        return pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Invalid Arrow IPC stream: {e}")
+
+
+def validate_table(table: pa.Table) -> Tuple[ColumnarBatch, np.ndarray]:
+    """Vectorised validation.
+
+    Returns the batch of valid rows and an object array with one error message
+    (or None) per request row.
+    """
+    missing = [name for name in REQUIRED_COLUMNS if name not in table.column_names]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    n = table.num_rows
+    errors = np.full(n, None, dtype=object)
+
+    def reject(invalid, message: str):
+        mask = np.asarray(pc.fill_null(invalid, True).to_numpy(zero_copy_only=False), dtype=bool)
+        errors[mask & np.equal(errors, None)] = message
+
+    # Numeric and temporal columns
+    tx_id = table["id"]
+    if not pa.types.is_integer(tx_id.type):
+        raise ValueError("Column 'id' must be an integer column")
+    reject(pc.is_null(tx_id), "id is required")
+
+    timestamp = table["timestamp"]
+    if not pa.types.is_timestamp(timestamp.type):
+        raise ValueError("Column 'timestamp' must be an Arrow timestamp column")
+    reject(pc.is_null(timestamp), "timestamp is required")
+
+    amount = pc.cast(table["amount"], pa.float64())
+    # NaN compares false both ways, so it is rejected explicitly
+    reject(pc.or_(pc.is_nan(amount), pc.or_(pc.less_equal(amount, 0.0), pc.greater(amount, 1000000.0))),
+           "amount must be > 0 and <= 1000000")
+
+    # String columns
+    strings = {}
+    for name, (min_len, max_len) in STRING_LENGTHS.items():
+        if name in table.column_names:
+            column = pc.cast(table[name], pa.string())
+        elif name == "currency":
+            column = pa.chunked_array([pa.array(["USD"] * n, pa.string())]) if n else pa.chunked_array([], pa.string())
+        else:
+            column = pa.chunked_array([pa.nulls(n, pa.string())])
+
+        if name == "currency":
+            column = pc.fill_null(column, "USD")
+
+        length = pc.utf8_length(column)
+        invalid = pc.or_(pc.less(length, min_len), pc.greater(length, max_len))
+        if name in NULLABLE_COLUMNS:
+            invalid = pc.and_(pc.is_valid(column), invalid)
+            reject(pc.fill_null(invalid, False), f"{name} must be {min_len}-{max_len} characters")
+        else:
+            reject(invalid, f"{name} must be {min_len}-{max_len} characters")
+
+        if name == "mcc":
+            reject(pc.invert(pc.utf8_is_digit(column)), "MCC must be numeric")
+
+        strings[name] = column
+
+    valid = np.equal(errors, None)
+    valid_index = np.flatnonzero(valid)
+    keep = pa.array(valid)
+
+    ts = timestamp.filter(keep)
+    if ts.type.tz is not None:
+        ts = pc.cast(ts, pa.timestamp('us', tz=ts.type.tz))
+    else:
+        ts = pc.cast(ts, pa.timestamp('us'))
+
+    batch = ColumnarBatch(
+        row_index=valid_index,
+        tx_id=tx_id.filter(keep).to_numpy().astype(np.int64),
+        timestamp=ts.to_numpy().astype('datetime64[us]'),
+        amount=amount.filter(keep).to_numpy(),
+        strings={name: EncodedColumn.from_arrow(col.filter(keep)) for name, col in strings.items()}
+    )
+    return batch, errors
+
+
+def write_scores_ipc(
+    table: pa.Table,
+    batch: ColumnarBatch,
+    scores: Dict[str, np.ndarray],
+    errors: np.ndarray,
+    model_version: str
+) -> bytes:
+    """Serialise per-row scores (in request row order) as an Arrow IPC stream"""
+    n_rows = table.num_rows
+    scored = np.zeros(n_rows, dtype=bool)
+    scored[batch.row_index] = True
+    if "error" in scores:
+        failed = np.asarray(scores["error"], dtype=object)
+        has_error = np.not_equal(failed, None)
+        errors[batch.row_index[has_error]] = failed[has_error]
+        scored[batch.row_index[has_error]] = False
+
+    def full(name: str, dtype) -> pa.Array:
+        values = np.zeros(n_rows, dtype=dtype)
+        if name not in scores:
+            return pa.nulls(n_rows, pa.from_numpy_dtype(values.dtype))
+        values[batch.row_index] = scores[name]
+        return pa.array(values, mask=~scored)
+
+    response = pa.table({
+        "tx_id": pc.cast(table["id"], pa.int64()),
+        "p_fraud": full("p_fraud", np.float64),
+        "score": full("score", np.float64),
+        "is_fraud": full("is_fraud", bool),
+        "model_version": pa.DictionaryArray.from_arrays(
+            pa.array(np.zeros(n_rows, dtype=np.int32), mask=~scored), pa.array([model_version])
+        ),
+        "lgbm": full("lgbm", np.float64),
+        "graph": full("graph", np.float64),
+        "anomaly": full("anomaly", np.float64),
+        "error": pa.array(errors, type=pa.string()),
+    })
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, response.schema) as writer:
+        writer.write_table(response)
+    return sink.getvalue().to_pybytes()
@@ -1,12 +1,14 @@
 import asyncio
 import json
 import logging
+from time import perf_counter
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Union
 import math
 import numpy as np
 from geopy.distance import geodesic
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func
 
 from ..models.schemas import TransactionRequest
@@ -14,19 +16,36 @@ from ..models.database import Transaction, Card, Merchant, Device
 from ..utils.redis_client import RedisClient
 from ..utils.geo_utils import get_country_coordinates, is_holiday
 from ..config import settings
+from ..core.deadline import Deadline
+from ..core.circuit_breaker import CircuitOpenError, get_breaker
+from ..core.executor import run_db
+from ..core.metrics import ERRORS, STAGE_SECONDS
+from ..core.tracing import span, traced
+from .columnar import ColumnarBatch
+from . import queries
 
 logger = logging.getLogger(__name__)
 
+# Per-row feature generation accepts either session type (see database.get_scoring_db)
+DbSession = Union[Session, AsyncSession]
+
 class FeatureService:
     def __init__(self):
         self.redis = RedisClient()
+        self.redis_breaker = get_breaker("redis")
+        self.db_breaker = get_breaker("database")
         
     async def generate_features(
         self, 
         transaction: TransactionRequest, 
-        db: Session
+        db: DbSession,
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
-        """Generate all features for a transaction"""
+        """Generate all features for a transaction.
+        
+        When a deadline is given, the heavier DB aggregates are skipped once
+        the remaining budget drops below DB_AGGREGATE_MIN_BUDGET_MS.
+        """
         
         features = {}
         
@@ -37,23 +56,33 @@ class FeatureService:
         features.update(self._get_temporal_features(transaction.timestamp))
         
         # Velocity features (async)
+        start = perf_counter()
         velocity_features = await self._get_velocity_features(transaction)
+        STAGE_SECONDS.labels("features_velocity").observe_since(start)
         features.update(velocity_features)
         
         # Geographic features
+        start = perf_counter()
         geo_features = await self._get_geographic_features(transaction, db)
+        STAGE_SECONDS.labels("features_geographic").observe_since(start)
         features.update(geo_features)
         
         # Device features
-        device_features = await self._get_device_features(transaction, db)
+        start = perf_counter()
+        device_features = await self._get_device_features(transaction, db, deadline)
+        STAGE_SECONDS.labels("features_device").observe_since(start)
         features.update(device_features)
         
         # Merchant features
+        start = perf_counter()
         merchant_features = await self._get_merchant_features(transaction, db)
+        STAGE_SECONDS.labels("features_merchant").observe_since(start)
         features.update(merchant_features)
         
         # Entity risk scores
-        risk_features = await self._get_risk_features(transaction, db)
+        start = perf_counter()
+        risk_features = await self._get_risk_features(transaction, db, deadline)
+        STAGE_SECONDS.labels("features_risk").observe_since(start)
         features.update(risk_features)
         
         return features
@@ -82,6 +111,7 @@ class FeatureService:
             'month': timestamp.month
         }
     
+    @traced("features.velocity")
     async def _get_velocity_features(self, transaction: TransactionRequest) -> Dict[str, Any]:
         """Calculate velocity features using Redis"""
         features = {}
@@ -93,24 +123,46 @@ class FeatureService:
         for window in windows:
             # Count-based velocity
             count_key = f"velocity:count:{transaction.card_id}:{window}m"
-            count = await self.redis.get_count_in_window(count_key, window * 60)
+            count = await self.redis_breaker.call(
+                self.redis.get_count_in_window, count_key, window * 60, fallback=0
+            )
             features[f'velocity_{window}m_count'] = count
             
             # Amount-based velocity
             amount_key = f"velocity:amount:{transaction.card_id}:{window}m"
-            total_amount = await self.redis.get_sum_in_window(amount_key, window * 60)
+            total_amount = await self.redis_breaker.call(
+                self.redis.get_sum_in_window, amount_key, window * 60, fallback=0.0
+            )
             features[f'velocity_{window}m_amount'] = total_amount
-            
-            # Update counters for future calculations
-            await self.redis.increment_counter(count_key, 1, window * 60)
-            await self.redis.increment_counter(amount_key, transaction.amount, window * 60)
+        
+        # Update counters for future calculations
+        await self.record_velocity(transaction)
         
         return features
     
+    @traced("features.record_velocity")
+    async def record_velocity(self, transaction: TransactionRequest):
+        """Update velocity counters without reading them.
+        
+        Used directly by the cascade fast path so that cleared transactions
+        still count towards the velocity of later ones.
+        """
+        for window in settings.VELOCITY_WINDOW_MINUTES:
+            count_key = f"velocity:count:{transaction.card_id}:{window}m"
+            amount_key = f"velocity:amount:{transaction.card_id}:{window}m"
+            await self.redis_breaker.call(
+                self.redis.increment_counter, count_key, 1, window * 60, fallback=None
+            )
+            await self.redis_breaker.call(
+                self.redis.increment_counter, amount_key, transaction.amount, window * 60,
+                fallback=None
+            )
+    
+    @traced("features.geographic")
     async def _get_geographic_features(
         self, 
         transaction: TransactionRequest, 
-        db: Session
+        db: DbSession
     ) -> Dict[str, Any]:
         """Geographic and location-based features"""
         features = {
@@ -122,7 +174,9 @@ class FeatureService:
         
         try:
             # Get card's home location
-            card = db.query(Card).filter(Card.id == transaction.card_id).first()
+            async with self.db_breaker.guard():
+                card = await self._first(db, queries.CARD_BY_ID, card_id=transaction.card_id)
+            
             if card and card.home_country:
                 # Check for country change
                 features['country_change'] = (card.home_country != transaction.country)
@@ -136,20 +190,25 @@ class FeatureService:
                         distance = geodesic(home_coords, tx_coords).kilometers
                         features['distance_from_home'] = distance
             
-            # Get recent geographic pattern
-            recent_countries = await self._get_recent_countries(transaction.card_id)
-            features['recent_country_count'] = len(set(recent_countries))
-            features['geographic_velocity'] = len(recent_countries) > 2
-            
+        except CircuitOpenError:
+            pass
         except Exception as e:
+            ERRORS.labels("features_geographic").inc()
             logger.warning(f"Error calculating geographic features: {e}")
         
+        # Get recent geographic pattern
+        recent_countries = await self._get_recent_countries(transaction.card_id)
+        features['recent_country_count'] = len(set(recent_countries))
+        features['geographic_velocity'] = len(recent_countries) > 2
+        
         return features
     
+    @traced("features.device")
     async def _get_device_features(
         self, 
         transaction: TransactionRequest, 
-        db: Session
+        db: DbSession,
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
         """Device-based features"""
         features = {
@@ -163,43 +222,44 @@ class FeatureService:
             return features
         
         try:
-            # Check if device exists
-            device = db.query(Device).filter(Device.id == transaction.device_id).first()
+            async with self.db_breaker.guard():
+                # Check if device exists
+                device = await self._first(db, queries.DEVICE_BY_ID, device_id=transaction.device_id)
             
-            if not device:
-                features['new_device'] = True
-                features['device_risk_score'] = 0.5  # New devices are medium risk
-            else:
-                # Calculate device risk score based on historical usage
-                device_tx_count = db.query(func.count(Transaction.id))\
-                    .filter(Transaction.device_id == transaction.device_id)\
-                    .scalar()
-                
-                # Device used by multiple cards is riskier
-                card_count = db.query(func.count(func.distinct(Transaction.card_id)))\
-                    .filter(Transaction.device_id == transaction.device_id)\
-                    .scalar()
+                if not device:
+                    features['new_device'] = True
+                    features['device_risk_score'] = 0.5  # New devices are medium risk
+                else:
+                    risk_score = 0.1  # Base risk
                 
-                features['device_card_count'] = card_count
+                    # Device used by multiple cards is riskier (aggregate over history)
+                    if self._has_aggregate_budget(deadline):
+                        card_count = (await self._first(
+                            db, queries.DEVICE_CARD_COUNT, device_id=transaction.device_id
+                        ))[0]
+                    
+                        features['device_card_count'] = card_count
+                        if card_count > 5:  # Device used by many cards
+                            risk_score += 0.4
                 
-                # Risk calculation
-                risk_score = 0.1  # Base risk
-                if card_count > 5:  # Device used by many cards
-                    risk_score += 0.4
-                if device.is_proxy or device.is_vpn:
-                    risk_score += 0.3
+                    if device.is_proxy or device.is_vpn:
+                        risk_score += 0.3
                 
-                features['device_risk_score'] = min(risk_score, 1.0)
+                    features['device_risk_score'] = min(risk_score, 1.0)
         
+        except CircuitOpenError:
+            pass
         except Exception as e:
+            ERRORS.labels("features_device").inc()
             logger.warning(f"Error calculating device features: {e}")
         
         return features
     
+    @traced("features.merchant")
     async def _get_merchant_features(
         self, 
         transaction: TransactionRequest, 
-        db: Session
+        db: DbSession
     ) -> Dict[str, Any]:
         """Merchant-based features"""
         features = {
@@ -210,76 +270,315 @@ class FeatureService:
         }
         
         try:
-            merchant = db.query(Merchant).filter(
-                Merchant.id == transaction.merchant_id
-            ).first()
+            async with self.db_breaker.guard():
+                merchant = await self._first(db, queries.MERCHANT_BY_ID, merchant_id=transaction.merchant_id)
             
-            if merchant:
-                features['merchant_risk_score'] = self._get_merchant_risk_score(merchant)
-                features['merchant_avg_ticket'] = merchant.avg_ticket_size or 0.0
+                if merchant:
+                    features['merchant_risk_score'] = self._get_merchant_risk_score(merchant)
+                    features['merchant_avg_ticket'] = merchant.avg_ticket_size or 0.0
                 
-                # Check if card has used this merchant before
-                previous_tx = db.query(Transaction).filter(
-                    Transaction.card_id == transaction.card_id,
-                    Transaction.merchant_id == transaction.merchant_id
-                ).first()
+                    # Check if card has used this merchant before
+                    previous_tx = await self._first(
+                        db, queries.CARD_MERCHANT_SEEN,
+                        card_id=transaction.card_id, merchant_id=transaction.merchant_id
+                    )
                 
-                features['merchant_novelty'] = previous_tx is None
-            else:
-                # New merchant
-                features['merchant_novelty'] = True
-                features['merchant_risk_score'] = 0.3  # Unknown merchants are medium risk
+                    features['merchant_novelty'] = previous_tx is None
+                else:
+                    # New merchant
+                    features['merchant_novelty'] = True
+                    features['merchant_risk_score'] = 0.3  # Unknown merchants are medium risk
         
+        except CircuitOpenError:
+            pass
         except Exception as e:
+            ERRORS.labels("features_merchant").inc()
             logger.warning(f"Error calculating merchant features: {e}")
         
         return features
     
+    @traced("features.risk")
     async def _get_risk_features(
         self, 
         transaction: TransactionRequest, 
-        db: Session
+        db: DbSession,
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
         """Risk-based aggregated features"""
         features = {}
         
         try:
-            # Card age and risk bucket
-            card = db.query(Card).filter(Card.id == transaction.card_id).first()
-            if card:
-                features['card_age_days'] = card.age_days
-                features['card_risk_bucket'] = card.risk_bucket
+            async with self.db_breaker.guard():
+                # Card age and risk bucket
+                card = await self._first(db, queries.CARD_BY_ID, card_id=transaction.card_id)
+                if card:
+                    features['card_age_days'] = card.age_days
+                    features['card_risk_bucket'] = card.risk_bucket
             
-            # Amount z-score relative to card's history
-            avg_amount = db.query(func.avg(Transaction.amount))\
-                .filter(Transaction.card_id == transaction.card_id)\
-                .scalar() or transaction.amount
+                if not self._has_aggregate_budget(deadline):
+                    return features
             
-            std_amount = db.query(func.stddev(Transaction.amount))\
-                .filter(Transaction.card_id == transaction.card_id)\
-                .scalar() or 1.0
+                # Amount z-score relative to card's history
+                avg_amount, std_amount = await self._first(
+                    db, queries.CARD_AMOUNT_STATS, card_id=transaction.card_id
+                )
+                avg_amount = avg_amount or transaction.amount
+                std_amount = std_amount or 1.0
             
-            features['amount_zscore'] = (transaction.amount - avg_amount) / max(std_amount, 1.0)
+                features['amount_zscore'] = (transaction.amount - avg_amount) / max(std_amount, 1.0)
             
-            # Time since last transaction
-            last_tx = db.query(Transaction)\
-                .filter(Transaction.card_id == transaction.card_id)\
-                .order_by(Transaction.ts.desc())\
-                .first()
+                # Time since last transaction
+                last_ts = (await self._first(db, queries.CARD_LAST_TS, card_id=transaction.card_id))[0]
             
-            if last_tx:
-                time_diff = (transaction.timestamp - last_tx.ts).total_seconds() / 3600
-                features['hours_since_last_tx'] = time_diff
-            else:
-                features['hours_since_last_tx'] = 999.0  # Large value for first transaction
+                if last_ts:
+                    time_diff = (transaction.timestamp - last_ts).total_seconds() / 3600
+                    features['hours_since_last_tx'] = time_diff
+                else:
+                    features['hours_since_last_tx'] = 999.0  # Large value for first transaction
         
+        except CircuitOpenError:
+            pass
         except Exception as e:
+            ERRORS.labels("features_risk").inc()
             logger.warning(f"Error calculating risk features: {e}")
         
         return features
     
+    async def _first(self, db: DbSession, statement, **params):
+        """First row of a hot-path statement.
+        
+        Runs natively on an AsyncSession, or on the DB executor for a sync Session.
+        """
+        with span("db.query", query=queries.sql_text(statement), params=params):
+            if isinstance(db, AsyncSession):
+                return (await db.execute(statement, params)).first()
+            return await run_db(lambda: db.execute(statement, params).first())
+    
+    async def generate_features_batch(
+        self,
+        batch: ColumnarBatch,
+        db: Session,
+        card_features: Optional[Dict[str, np.ndarray]] = None
+    ) -> Dict[str, np.ndarray]:
+        """Model input features for a columnar batch, one array per feature.
+        
+        Covers the tabular features the model consumes. Lookups run once per
+        distinct card/merchant/device (grouped IN queries, one Redis MGET)
+        instead of once per row, and velocity also counts earlier rows of the
+        same card within the batch.
+        
+        `card_features` (velocity and card history computed by the streaming
+        worker's partition state stores) replaces the Redis velocity lookup.
+        """
+        features = {}
+        
+        # Basic and temporal features
+        ts = batch.timestamp
+        days = ts.astype('datetime64[D]')
+        hour = (ts.astype('datetime64[h]') - days).astype(np.int64)
+        day_of_week = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        
+        features['amount_log'] = np.log1p(batch.amount)
+        features['hour_sin'] = np.sin(2 * np.pi * hour / 24)
+        features['hour_cos'] = np.cos(2 * np.pi * hour / 24)
+        features['day_of_week'] = day_of_week.astype(np.float64)
+        features['is_weekend'] = (day_of_week >= 5).astype(np.float64)
+        
+        if card_features is not None:
+            features.update(card_features)
+        else:
+            features.update(await self._get_velocity_features_batch(batch))
+        features.update(await run_db(self._get_geographic_features_batch, batch, db))
+        features.update(await run_db(self._get_device_features_batch, batch, db))
+        features['merchant_risk_score'] = await run_db(self._get_merchant_risk_batch, batch, db)
+        
+        return features
+    
+    async def _get_velocity_features_batch(self, batch: ColumnarBatch) -> Dict[str, np.ndarray]:
+        """Velocity from Redis plus earlier in-batch rows, then update the counters"""
+        features = {}
+        cards = batch.card_id.values
+        windows = settings.VELOCITY_WINDOW_MINUTES
+        
+        keys = []
+        for window in windows:
+            keys.extend(f"velocity:count:{card}:{window}m" for card in cards)
+            keys.extend(f"velocity:amount:{card}:{window}m" for card in cards)
+        values = await self.redis_breaker.call(self.redis.get_many, keys, fallback=None)
+        if values is None:
+            values = [None] * len(keys)
+        stored = np.array(
+            [float(v) if v is not None else 0.0 for v in values], dtype=np.float64
+        ).reshape(len(windows), 2, len(cards))
+        
+        # Sort by (card, time) so each row's in-batch history is a contiguous run
+        seconds = batch.epoch_seconds
+        codes = batch.card_id.codes
+        order = np.lexsort((seconds, codes))
+        offset = seconds - seconds.min() if len(seconds) else seconds
+        stride = int(offset.max()) + max(windows) * 60 + 1 if len(seconds) else 1
+        key = codes[order] * stride + offset[order]
+        position = np.arange(len(batch))
+        cumulative = np.concatenate([[0.0], np.cumsum(batch.amount[order])])
+        
+        for i, window in enumerate(windows):
+            start = np.searchsorted(key, key - window * 60, side='left')
+            count = np.empty(len(batch))
+            amount = np.empty(len(batch))
+            count[order] = position - start
+            amount[order] = cumulative[position] - cumulative[start]
+            features[f'velocity_{window}m_count'] = batch.card_id.take(stored[i, 0], 0.0) + count
+            features[f'velocity_{window}m_amount'] = batch.card_id.take(stored[i, 1], 0.0) + amount
+        
+        # One pipelined update per card and window
+        card_counts = np.bincount(codes, minlength=len(cards))
+        card_amounts = np.bincount(codes, weights=batch.amount, minlength=len(cards))
+        increments, ttls = {}, {}
+        for window in windows:
+            for card, count, total in zip(cards, card_counts, card_amounts):
+                increments[f"velocity:count:{card}:{window}m"] = int(count)
+                increments[f"velocity:amount:{card}:{window}m"] = float(total)
+                ttls[f"velocity:count:{card}:{window}m"] = window * 60
+                ttls[f"velocity:amount:{card}:{window}m"] = window * 60
+        await self.redis_breaker.call(self.redis.increment_counters, increments, ttls, fallback=None)
+        
+        return features
+    
+    def _get_geographic_features_batch(self, batch: ColumnarBatch, db: Session) -> Dict[str, np.ndarray]:
+        """Distance from home (haversine) and country change for a batch"""
+        n = len(batch)
+        features = {
+            'distance_from_home': np.zeros(n),
+            'country_change': np.zeros(n)
+        }
+        
+        try:
+            with self.db_breaker.guard():
+                cards = db.query(Card.id, Card.home_country, Card.home_city)\
+                    .filter(Card.id.in_(batch.card_id.values))\
+                    .all()
+        except CircuitOpenError:
+            return features
+        except Exception as e:
+            logger.warning(f"Error calculating geographic features: {e}")
+            return features
+        
+        homes = {card_id: (country, city) for card_id, country, city in cards}
+        home_country = np.array([homes.get(c, (None, None))[0] for c in batch.card_id.values], dtype=object)
+        home_city = np.array([homes.get(c, (None, None))[1] for c in batch.card_id.values], dtype=object)
+        
+        row_home_country = batch.card_id.take(home_country, None)
+        row_country = batch.country.take(np.array(batch.country.values, dtype=object), None)
+        has_home = np.not_equal(row_home_country, None)
+        features['country_change'] = (has_home & (row_home_country != row_country)).astype(np.float64)
+        
+        # Coordinates are looked up once per distinct (country, city) pair
+        lookup = {}
+        
+        def coords(country, city):
+            if not country or not city:
+                return (np.nan, np.nan)
+            if (country, city) not in lookup:
+                lookup[(country, city)] = get_country_coordinates(country, city) or (np.nan, np.nan)
+            return lookup[(country, city)]
+        
+        home_coords = np.array([coords(c, h) for c, h in zip(home_country, home_city)], dtype=np.float64)
+        pair = (batch.country.codes + 1) * (len(batch.city.values) + 1) + (batch.city.codes + 1)
+        pairs, pair_index = np.unique(pair, return_inverse=True)
+        countries = [None] + list(batch.country.values)
+        cities = [None] + list(batch.city.values)
+        tx_coords = np.array([
+            coords(countries[p // len(cities)], cities[p % len(cities)]) for p in pairs
+        ], dtype=np.float64).reshape(-1, 2)
+        
+        home = batch.card_id.take(home_coords.reshape(-1, 2), np.nan)
+        distance = _haversine_km(home[:, 0], home[:, 1], tx_coords[pair_index, 0], tx_coords[pair_index, 1])
+        features['distance_from_home'] = np.nan_to_num(distance, nan=0.0)
+        
+        return features
+    
+    def _get_device_features_batch(self, batch: ColumnarBatch, db: Session) -> Dict[str, np.ndarray]:
+        """New-device flag and device risk for a batch"""
+        n = len(batch)
+        features = {
+            'new_device': np.zeros(n),
+            'device_risk_score': np.zeros(n)
+        }
+        device_ids = batch.device_id.values
+        if not device_ids:
+            return features
+        
+        try:
+            with self.db_breaker.guard():
+                devices = {
+                    device.id: device
+                    for device in db.query(Device).filter(Device.id.in_(device_ids)).all()
+                }
+                card_counts = dict(
+                    db.query(Transaction.device_id, func.count(func.distinct(Transaction.card_id)))
+                    .filter(Transaction.device_id.in_(device_ids))
+                    .group_by(Transaction.device_id)
+                    .all()
+                )
+        except CircuitOpenError:
+            return features
+        except Exception as e:
+            logger.warning(f"Error calculating device features: {e}")
+            return features
+        
+        new_device = np.zeros(len(device_ids))
+        risk = np.zeros(len(device_ids))
+        for i, device_id in enumerate(device_ids):
+            device = devices.get(device_id)
+            if device is None:
+                new_device[i] = 1.0
+                risk[i] = 0.5  # New devices are medium risk
+                continue
+            score = 0.1
+            if card_counts.get(device_id, 0) > 5:
+                score += 0.4
+            if device.is_proxy or device.is_vpn:
+                score += 0.3
+            risk[i] = min(score, 1.0)
+        
+        features['new_device'] = batch.device_id.take(new_device, 0.0)
+        features['device_risk_score'] = batch.device_id.take(risk, 0.0)
+        return features
+    
+    def _get_merchant_risk_batch(self, batch: ColumnarBatch, db: Session) -> np.ndarray:
+        """Merchant risk score for a batch"""
+        merchant_ids = batch.merchant_id.values
+        try:
+            with self.db_breaker.guard():
+                merchants = dict(
+                    (merchant_id, self._merchant_risk(mcc, risk_bucket))
+                    for merchant_id, mcc, risk_bucket in db.query(
+                        Merchant.id, Merchant.mcc, Merchant.risk_bucket
+                    ).filter(Merchant.id.in_(merchant_ids)).all()
+                )
+        except CircuitOpenError:
+            return np.zeros(len(batch))
+        except Exception as e:
+            logger.warning(f"Error calculating merchant features: {e}")
+            return np.zeros(len(batch))
+        
+        # Unknown merchants are medium risk
+        risk = np.array([merchants.get(m, 0.3) for m in merchant_ids], dtype=np.float64)
+        return batch.merchant_id.take(risk, 0.0)
+    
+    def _has_aggregate_budget(self, deadline: Optional[Deadline]) -> bool:
+        """Whether the heavier historical aggregates fit in the remaining budget"""
+        if deadline is None or deadline.allows(settings.DB_AGGREGATE_MIN_BUDGET_MS):
+            return True
+        deadline.degrade("db_aggregates")
+        return False
+    
     def _get_merchant_risk_score(self, merchant: Merchant) -> float:
         """Calculate merchant risk score based on MCC and historical data"""
+        return self._merchant_risk(merchant.mcc, merchant.risk_bucket)
+    
+    def _merchant_risk(self, mcc: Optional[str], risk_bucket: Optional[str]) -> float:
+        """Merchant risk from its MCC and risk bucket"""
         # High-risk MCCs
         high_risk_mccs = {
             '7995',  # Betting/Casino Gambling
@@ -293,19 +592,29 @@ class FeatureService:
         }
         
         base_risk = 0.1
-        if merchant.mcc in high_risk_mccs:
+        if mcc in high_risk_mccs:
             base_risk += 0.4
         
         # Merchant-specific risk based on bucket
-        if merchant.risk_bucket == 'HIGH':
+        if risk_bucket == 'HIGH':
             base_risk += 0.3
-        elif merchant.risk_bucket == 'MEDIUM':
+        elif risk_bucket == 'MEDIUM':
             base_risk += 0.1
         
         return min(base_risk, 1.0)
     
+    @traced("features.recent_countries")
     async def _get_recent_countries(self, card_id: str, hours: int = 24) -> List[str]:
         """Get list of countries used by card in recent hours"""
         key = f"recent_countries:{card_id}"
-        countries = await self.redis.get_recent_items(key, hours * 3600)
-        return countries or []
\ No newline at end of file
+        countries = await self.redis_breaker.call(
+            self.redis.get_recent_items, key, hours * 3600, fallback=None
+        )
+        return countries or []
+
+
+def _haversine_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km (within ~0.5% of the geodesic used per row)"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0088 * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
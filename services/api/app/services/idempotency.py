@@ -0,0 +1,165 @@
+"""
+Idempotent scoring keyed by transaction id.
+
+Payment networks retry authorizations with the same transaction id. A retry
+must get the original decision back without recomputing features, bumping
+the velocity counters again or writing a second Decision. Responses are kept
+in a per-process LRU with a short TTL and, optionally, in Redis so retries
+landing on another worker are answered too. Concurrent duplicates are
+coalesced: they wait on the computation already in flight instead of
+starting their own.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..config import settings
+from ..core.circuit_breaker import get_breaker
+from ..models.schemas import ScoringResponse
+from ..utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyCache:
+    """TTL + LRU cache of ScoringResponses with in-flight coalescing"""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        redis: Optional[RedisClient] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.redis = redis
+        self.redis_breaker = get_breaker("redis")
+        self._entries: "OrderedDict[int, Tuple[float, ScoringResponse]]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.shared_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    async def get_or_compute(
+        self,
+        tx_id: int,
+        compute: Callable[[], Awaitable[ScoringResponse]]
+    ) -> Tuple[ScoringResponse, bool]:
+        """Return (response, replayed); compute runs at most once per live key.
+
+        Failed computations are not cached, so a retry after an error scores
+        the transaction again.
+        """
+        cached = self._get_local(tx_id)
+        if cached is not None:
+            self.hits += 1
+            return cached.model_copy(), True
+
+        while tx_id in self._inflight:
+            future = self._inflight[tx_id]
+            try:
+                result = await asyncio.shield(future)
+                self.coalesced += 1
+                return result.model_copy(), True
+            except asyncio.CancelledError:
+                # The owner was cancelled (client went away); take over
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[tx_id] = future
+        try:
+            result = await self._get_shared(tx_id)
+            if result is not None:
+                self.shared_hits += 1
+                replayed = True
+            else:
+                self.misses += 1
+                result = await compute()
+                replayed = False
+                await self._put_shared(tx_id, result)
+            self._put_local(tx_id, result)
+            future.set_result(result)
+            return result.model_copy(), replayed
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters (if any) re-raise it; don't warn when there were none
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(tx_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.shared_hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "replay_rate": (lookups - self.misses) / lookups if lookups else 0.0
+        }
+
+    def _get_local(self, tx_id: int) -> Optional[ScoringResponse]:
+        entry = self._entries.get(tx_id)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[tx_id]
+            return None
+        self._entries.move_to_end(tx_id)
+        return result
+
+    def _put_local(self, tx_id: int, result: ScoringResponse):
+        self._entries[tx_id] = (time.monotonic() + self.ttl_seconds, result)
+        self._entries.move_to_end(tx_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_shared(self, tx_id: int) -> Optional[ScoringResponse]:
+        if self.redis is None:
+            return None
+        payload = await self.redis_breaker.call(
+            self.redis.get_json, f"idempotency:score:{tx_id}", fallback=None
+        )
+        if payload is None:
+            return None
+        try:
+            return ScoringResponse.model_validate_json(payload)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable idempotency entry for {tx_id}: {e}")
+            return None
+
+    async def _put_shared(self, tx_id: int, result: ScoringResponse):
+        if self.redis is None:
+            return
+        await self.redis_breaker.call(
+            self.redis.set_json, f"idempotency:score:{tx_id}", result.model_dump_json(),
+            int(self.ttl_seconds), fallback=None
+        )
+
+
+_cache: Optional[IdempotencyCache] = None
+
+
+def get_idempotency_cache() -> Optional[IdempotencyCache]:
+    """Process-wide cache, or None when IDEMPOTENCY_ENABLED is off"""
+    global _cache
+    if not settings.IDEMPOTENCY_ENABLED:
+        return None
+    if _cache is None:
+        _cache = IdempotencyCache(
+            settings.IDEMPOTENCY_TTL_SECONDS,
+            settings.IDEMPOTENCY_MAX_ENTRIES,
+            redis=RedisClient() if settings.IDEMPOTENCY_SHARED else None
+        )
+    return _cache
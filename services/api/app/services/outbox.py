@@ -0,0 +1,233 @@
+"""
+Transactional outbox for decisions and alerts.
+
+Scoring writes a transaction's Decision, its Alert (when flagged) and the
+Kafka messages announcing them (OutboxEvent rows) in one database
+transaction, so a message exists exactly when the decision does. Publishing
+is left to the outbox relay (app.workers.outbox_relay), which sends the rows
+to Kafka in large compressed batches and deletes them once acknowledged;
+no producer round trip happens on the request path.
+
+The per-request writes go through DecisionWriter, a group commit: requests
+hand their rows over and wait, and a single flusher writes everything
+pending (up to DECISION_WRITER_MAX_BATCH requests) with one bulk insert per
+table and one commit. Rows arriving while a commit runs go in the next one,
+so under load the number of commits stays flat while the batch grows. If a
+batch fails, its requests are retried one transaction each, so one bad row
+only fails its own request.
+"""
+
+import asyncio
+import logging
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..core.executor import run_db
+from ..core.metrics import STAGE_SECONDS
+from ..models.database import Alert, Decision, OutboxEvent
+from ..utils.kafka_client import dumps
+
+logger = logging.getLogger(__name__)
+
+
+def alert_severity(p_fraud: float) -> str:
+    if p_fraud >= 0.95:
+        return "CRITICAL"
+    if p_fraud >= 0.85:
+        return "HIGH"
+    return "MEDIUM"
+
+
+def decision_message(tx_id: int, card_id: Optional[str], p_fraud: float, score: float, is_fraud: bool,
+                     model_version: str, component_scores: Dict[str, float], scored_at: str) -> Dict[str, Any]:
+    """Value of a `decisions` topic record"""
+    return {
+        "tx_id": tx_id,
+        "card_id": card_id,
+        "p_fraud": p_fraud,
+        "score": score,
+        "is_fraud": is_fraud,
+        "model_version": model_version,
+        "component_scores": component_scores,
+        "scored_at": scored_at
+    }
+
+
+def alert_message(tx_id: int, card_id: Optional[str], merchant_id: Optional[str], mcc: Optional[str],
+                  country: Optional[str], amount: float, p_fraud: float, model_version: str,
+                  created_at: str) -> Dict[str, Any]:
+    """Value of an `alerts` topic record (what /ws subscribers filter on)"""
+    return {
+        "type": "alert",
+        "tx_id": tx_id,
+        "card_id": card_id,
+        "merchant_id": merchant_id,
+        "mcc": mcc,
+        "country": country,
+        "amount": amount,
+        "p_fraud": p_fraud,
+        "severity": alert_severity(p_fraud),
+        "model_version": model_version,
+        "created_at": created_at
+    }
+
+
+def outbox_row(topic: str, key: Optional[str], message: Dict[str, Any]) -> Dict[str, Any]:
+    """OutboxEvent mapping for bulk inserts; the payload is stored encoded and published as-is"""
+    return {"topic": topic, "key": key, "payload": dumps(message).decode()}
+
+
+class DecisionRows:
+    """The rows one scored transaction writes together"""
+
+    __slots__ = ("decision", "alerts", "events")
+
+    def __init__(self, decision: Dict[str, Any], alerts: Optional[List[Dict[str, Any]]] = None,
+                 events: Optional[List[Dict[str, Any]]] = None):
+        self.decision = decision
+        self.alerts = alerts or []
+        self.events = events or []
+
+
+def write_rows(db, items: List[DecisionRows]):
+    """Bulk insert the rows of `items` and commit (blocking)"""
+    db.bulk_insert_mappings(Decision, [item.decision for item in items])
+    alerts = [alert for item in items for alert in item.alerts]
+    if alerts:
+        db.bulk_insert_mappings(Alert, alerts)
+    events = [event for item in items for event in item.events]
+    if events:
+        db.bulk_insert_mappings(OutboxEvent, events)
+    db.commit()
+
+
+class DecisionWriter:
+    """Group commit of DecisionRows from concurrent requests"""
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None, max_batch: Optional[int] = None,
+                 wait_ms: Optional[float] = None):
+        self.session_factory = session_factory
+        self.max_batch = max_batch or settings.DECISION_WRITER_MAX_BATCH
+        self.wait = (wait_ms if wait_ms is not None else settings.DECISION_WRITER_WAIT_MS) / 1000.0
+        self._pending: List[Tuple[DecisionRows, asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.commits = 0
+        self.rows = 0
+        self.max_batch_seen = 0
+        self.fallbacks = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            if self.session_factory is None:
+                from ..database import SessionLocal
+                self.session_factory = SessionLocal
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Commit what is pending, then stop"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def write(self, item: DecisionRows):
+        """Wait until the item's rows are committed (raises if its transaction failed)"""
+        if self._task is None or self._task.done():
+            raise RuntimeError("DecisionWriter is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        self._wakeup.set()
+        await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if self.wait and len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.wait)
+            await self._flush()
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+
+    async def _flush(self):
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if not batch:
+            return
+        start = perf_counter()
+        try:
+            errors = await run_db(self._commit, [item for item, _ in batch])
+        except Exception as e:
+            errors = [e] * len(batch)
+        STAGE_SECONDS.labels("decision_group_commit").observe_since(start)
+        self.commits += 1
+        self.rows += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        for (_, future), error in zip(batch, errors):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                self.errors += 1
+                future.set_exception(error)
+
+    def _commit(self, items: List[DecisionRows]) -> List[Optional[Exception]]:
+        """One transaction for the batch, or one per item if it fails (DB executor)"""
+        db = self.session_factory()
+        try:
+            try:
+                write_rows(db, items)
+                return [None] * len(items)
+            except Exception as e:
+                db.rollback()
+                if len(items) == 1:
+                    return [e]
+                self.fallbacks += 1
+                logger.warning(f"Group commit of {len(items)} decisions failed ({e}); retrying one by one")
+            errors = []
+            for item in items:
+                try:
+                    write_rows(db, [item])
+                    errors.append(None)
+                except Exception as e:
+                    db.rollback()
+                    errors.append(e)
+            return errors
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "pending": len(self._pending),
+            "commits": self.commits,
+            "rows": self.rows,
+            "avg_batch": round(self.rows / self.commits, 1) if self.commits else 0.0,
+            "max_batch": self.max_batch_seen,
+            "fallbacks": self.fallbacks,
+            "errors": self.errors
+        }
+
+
+decision_writer = DecisionWriter()
+
+
+def outbox_backlog(db) -> Dict[str, Any]:
+    """Rows waiting for the relay and the age of the oldest (blocking)"""
+    from sqlalchemy import func
+
+    count, oldest = db.query(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at)).one()
+    return {"backlog": count, "oldest": oldest.isoformat() if oldest else None}
@@ -0,0 +1,60 @@
+"""
+Keyset (cursor) pagination for the read APIs.
+
+Pages are ordered newest first on (created_at, id), and each page starts
+strictly after the last row of the previous one:
+
+    WHERE <filters> AND (created_at, id) < (:created_at, :id)
+    ORDER BY created_at DESC, id DESC LIMIT :limit
+
+With an index whose columns are the equality filters followed by
+(created_at, id), every page is a single index range scan of `limit` rows
+however deep it is; OFFSET would read and discard every skipped row. Rows
+inserted while a client pages do not shift or repeat the pages it has not
+read yet.
+
+Only the requested columns are selected and rows become plain dicts; no ORM
+objects are built. The cursor is opaque to clients (base64url of the last
+row's created_at and id).
+"""
+
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, tuple_
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for a cursor this module did not produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def keyset_page(db, columns: Sequence[Any], filters: Sequence[Any], cursor: Optional[str],
+                limit: int) -> Dict[str, Any]:
+    """One page of `columns` (which must include created_at and id, named so) matching `filters` (blocking)"""
+    by_key = {column.key: column for column in columns}
+    created_at, row_id = by_key["created_at"], by_key["id"]
+    statement = select(*columns).where(*filters)
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        statement = statement.where(tuple_(created_at, row_id) < tuple_(*after))
+    # One extra row tells whether there is a next page
+    statement = statement.order_by(created_at.desc(), row_id.desc()).limit(limit + 1)
+    rows = db.execute(statement).all()
+
+    keys = list(by_key)
+    items: List[Dict[str, Any]] = [dict(zip(keys, row)) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"])
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,53 @@
+"""
+Pre-built statements for the scoring hot path.
+
+Built once at import with bind parameters so SQLAlchemy compiles each of them
+once per dialect (engine compiled cache) and asyncpg can reuse the prepared
+statement on every connection (statement cache). Select only the columns the
+feature code reads; rows support attribute access like ORM objects.
+"""
+
+from typing import Dict
+
+from sqlalchemy import bindparam, func, select
+
+from ..models.database import Card, Device, Merchant, Transaction
+
+CARD_BY_ID = select(
+    Card.home_country, Card.home_city, Card.age_days, Card.risk_bucket
+).where(Card.id == bindparam("card_id"))
+
+DEVICE_BY_ID = select(
+    Device.is_proxy, Device.is_vpn
+).where(Device.id == bindparam("device_id"))
+
+DEVICE_CARD_COUNT = select(
+    func.count(func.distinct(Transaction.card_id))
+).where(Transaction.device_id == bindparam("device_id"))
+
+MERCHANT_BY_ID = select(
+    Merchant.mcc, Merchant.risk_bucket, Merchant.avg_ticket_size
+).where(Merchant.id == bindparam("merchant_id"))
+
+CARD_MERCHANT_SEEN = select(Transaction.id).where(
+    Transaction.card_id == bindparam("card_id"),
+    Transaction.merchant_id == bindparam("merchant_id")
+).limit(1)
+
+CARD_AMOUNT_STATS = select(
+    func.avg(Transaction.amount), func.stddev(Transaction.amount)
+).where(Transaction.card_id == bindparam("card_id"))
+
+CARD_LAST_TS = select(
+    func.max(Transaction.ts)
+).where(Transaction.card_id == bindparam("card_id"))
+
+_sql_text: Dict[int, str] = {}
+
+
+def sql_text(statement) -> str:
+    """One-line SQL of a pre-built statement for trace spans, rendered once"""
+    text = _sql_text.get(id(statement))
+    if text is None:
+        text = _sql_text[id(statement)] = " ".join(str(statement).split())
+    return text
@@ -2,25 +2,44 @@ import asyncio
 import json
 import pickle
 import logging
+from time import perf_counter
 from typing import Dict, Any, List, Optional
 import numpy as np
 from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models.schemas import TransactionRequest, ScoringResponse
-from ..models.database import Decision
+from ..models.database import Alert, Decision, OutboxEvent
 from ..config import settings
+from ..core.deadline import Deadline
+from ..core.circuit_breaker import get_breaker
+from ..core.executor import run_db
+from ..core.tracing import span, traced
+from ..core.metrics import ERRORS, FLAGGED, SCORED, STAGE_SECONDS
 from .model_registry import ModelRegistry
 from .graph_service import GraphService
+from .alert_window import AlertAggregator, alert_aggregator, alert_rows
+from .outbox import DecisionRows, alert_message, decision_message, decision_writer, outbox_row, write_rows
 from ..utils.redis_client import RedisClient
 from ..utils.minio_client import MinIOClient
 
 logger = logging.getLogger(__name__)
 
+# Tabular feature order (should match training); the model reads the first 16 columns
+TABULAR_FEATURES = [
+    'amount_log', 'hour_sin', 'hour_cos', 'day_of_week', 'is_weekend',
+    'velocity_1m_count', 'velocity_5m_count', 'velocity_30m_count',
+    'velocity_1m_amount', 'velocity_5m_amount', 'velocity_30m_amount',
+    'distance_from_home', 'country_change', 'new_device',
+    'merchant_risk_score', 'device_risk_score'
+]
+
 class ScoringService:
     def __init__(self):
         self.redis = RedisClient()
         self.minio = MinIOClient()
         self.graph_service = GraphService()
+        self.graph_breaker = get_breaker("graph")
         self.model_registry = ModelRegistry()
         self.threshold = settings.SCORE_THRESHOLD
         
@@ -70,30 +89,43 @@ class ScoringService:
             logger.error(f"Failed to load models: {e}")
             # Use fallback models or raise exception
     
+    @traced("scoring.score_transaction")
     async def score_transaction(
         self, 
         transaction: TransactionRequest, 
         features: Dict[str, Any],
-        db
+        db,
+        deadline: Optional[Deadline] = None
     ) -> ScoringResponse:
-        """Score a single transaction using ensemble approach"""
+        """Score a single transaction using ensemble approach.
+        
+        With a deadline, graph embeddings and SHAP explanations are skipped
+        when the remaining budget is below their configured reserve; skipped
+        components are reported in degraded_components.
+        """
         
         try:
             # Prepare feature vector
             feature_vector = self._prepare_feature_vector(features)
             
             # Get graph embeddings
-            graph_features = await self._get_graph_features(transaction)
+            start = perf_counter()
+            graph_features = await self._get_graph_features(transaction, deadline)
+            STAGE_SECONDS.labels("graph_fetch").observe_since(start)
             
             # Combine features
             combined_features = np.concatenate([feature_vector, graph_features])
             
             # Scale features
             if self.feature_scaler:
+                start = perf_counter()
                 combined_features = self.feature_scaler.transform([combined_features])[0]
+                STAGE_SECONDS.labels("scaling").observe_since(start)
             
             # Get individual model predictions
+            start = perf_counter()
             scores = await self._get_ensemble_scores(combined_features, features)
+            STAGE_SECONDS.labels("model_predict").observe_since(start)
             
             # Calculate final ensemble score
             final_score = (
@@ -104,20 +136,24 @@ class ScoringService:
             
             # Generate explanations
             explanations = await self._generate_explanations(
-                combined_features, scores, features
+                combined_features, scores, features, deadline
             )
+            degraded = list(deadline.degraded) if deadline else []
+            if degraded:
+                explanations["degraded_components"] = degraded
             
-            # Save decision to database
-            decision = Decision(
-                tx_id=transaction.id,
-                p_fraud=final_score,
-                score=final_score,
-                model_version=settings.MODEL_VERSION,
-                route="production",
-                explanation_json=explanations
+            # Save decision, alert and their outbox messages in one transaction
+            rows = self._decision_rows(
+                transaction, final_score, settings.MODEL_VERSION, "production", explanations, scores,
+                reason="; ".join(explanations["risk_factors"])
             )
-            db.add(decision)
-            db.commit()
+            start = perf_counter()
+            await self._save_decision(db, rows)
+            STAGE_SECONDS.labels("db_commit").observe_since(start)
+            
+            SCORED.labels("production").inc()
+            if final_score > self.threshold:
+                FLAGGED.labels("production").inc()
             
             return ScoringResponse(
                 tx_id=transaction.id,
@@ -126,26 +162,213 @@ class ScoringService:
                 model_version=settings.MODEL_VERSION,
                 reasons=explanations.get("top_features", []),
                 component_scores=scores,
-                is_fraud=final_score > self.threshold
+                is_fraud=final_score > self.threshold,
+                degraded_components=degraded
             )
             
         except Exception as e:
             logger.error(f"Error scoring transaction {transaction.id}: {e}")
             raise ScoringException(f"Scoring failed: {str(e)}")
     
+    @traced("scoring.cascade_fast_path")
+    async def score_cascade_fast_path(
+        self,
+        transaction: TransactionRequest,
+        first_stage_score: float,
+        model_version: str,
+        db
+    ) -> ScoringResponse:
+        """Record and return a decision for a transaction cleared by the cascade"""
+        component_scores = {"cascade": first_stage_score}
+        
+        rows = self._decision_rows(
+            transaction, first_stage_score, model_version, "cascade",
+            {"component_scores": component_scores}, component_scores, flagged=False
+        )
+        start = perf_counter()
+        await self._save_decision(db, rows)
+        STAGE_SECONDS.labels("db_commit").observe_since(start)
+        SCORED.labels("cascade").inc()
+        
+        return ScoringResponse(
+            tx_id=transaction.id,
+            p_fraud=first_stage_score,
+            score=first_stage_score,
+            model_version=model_version,
+            component_scores=component_scores,
+            is_fraud=False
+        )
+    
+    def _decision_rows(
+        self,
+        transaction: TransactionRequest,
+        p_fraud: float,
+        model_version: str,
+        route: str,
+        explanations: Dict[str, Any],
+        component_scores: Dict[str, float],
+        reason: str = "",
+        flagged: Optional[bool] = None
+    ) -> DecisionRows:
+        """Decision, Alert when flagged, and the outbox messages announcing them.
+        
+        A flagged transaction whose card already has an open alert window for
+        the same reason is merged into it instead (alert_window.py).
+        """
+        is_fraud = p_fraud > self.threshold if flagged is None else flagged
+        scored_at = datetime.utcnow().isoformat()
+        rows = DecisionRows({
+            "tx_id": transaction.id,
+            "p_fraud": p_fraud,
+            "score": p_fraud,
+            "model_version": model_version,
+            "route": route,
+            "explanation_json": explanations
+        })
+        rows.events.append(outbox_row(settings.INFERENCE_DECISIONS_TOPIC, transaction.card_id, decision_message(
+            transaction.id, transaction.card_id, p_fraud, p_fraud, is_fraud, model_version,
+            component_scores, scored_at
+        )))
+        if is_fraud:
+            alert = alert_rows(alert_aggregator, transaction.id, transaction.card_id, reason, p_fraud, alert_message(
+                transaction.id, transaction.card_id, transaction.merchant_id, transaction.mcc,
+                transaction.country, transaction.amount, p_fraud, model_version, scored_at
+            ))
+            if alert is not None:
+                rows.alerts.append(alert[0])
+                rows.events.append(alert[1])
+        return rows
+    
+    @traced("db.save_decision")
+    async def _save_decision(self, db, rows: DecisionRows):
+        """Commit a decision with its alert and outbox rows: through the group
+        commit when it runs, else natively on an AsyncSession or on the DB executor.
+        
+        If the commit fails, the alert windows the rows opened are discarded.
+        """
+        try:
+            if decision_writer.running:
+                await decision_writer.write(rows)
+            elif isinstance(db, AsyncSession):
+                db.add(Decision(**rows.decision))
+                db.add_all([Alert(**alert) for alert in rows.alerts])
+                db.add_all([OutboxEvent(**event) for event in rows.events])
+                await db.commit()
+            else:
+                await run_db(write_rows, db, [rows])
+        except Exception:
+            alert_aggregator.discard(rows.alerts)
+            raise
+    
+    def score_batch(
+        self,
+        tx_ids: np.ndarray,
+        features: Dict[str, np.ndarray],
+        db,
+        batch=None,
+        aggregator: Optional[AlertAggregator] = None,
+        outbox: bool = True
+    ) -> Dict[str, Any]:
+        """Score a columnar batch with one model call per component.
+        
+        Graph embeddings are left at zero (per-entity graph lookups would undo
+        the point of the bulk path; only the tabular columns feed the LGBM
+        model), and decisions are written with one bulk insert. Given the
+        ColumnarBatch, alert rows (through `aggregator`, the process-wide one
+        by default) go in the same commit, and so do the outbox messages for
+        the decisions and alerts unless `outbox` is False: the streaming
+        worker produces scores["events"] itself once the commit is done.
+        """
+        n = len(tx_ids)
+        tabular = np.column_stack(
+            [np.asarray(features.get(name, np.zeros(n)), dtype=np.float32) for name in TABULAR_FEATURES]
+        ) if n else np.zeros((0, len(TABULAR_FEATURES)), dtype=np.float32)
+        combined = np.hstack([tabular, np.zeros((n, settings.EMBEDDING_DIMENSION * 3), dtype=np.float32)])
+        
+        if self.feature_scaler and n:
+            combined = self.feature_scaler.transform(combined)
+        
+        lgbm = np.full(n, 0.5)
+        if self.lgbm_model and n:
+            try:
+                lgbm = self.lgbm_model.predict_proba(combined[:, :16])[:, 1]
+            except Exception as e:
+                logger.warning(f"Batch LGBM prediction failed: {e}")
+        graph = np.full(n, 0.3)  # Placeholder, as in _get_ensemble_scores
+        anomaly = np.asarray(features.get('isolation_forest_score', np.full(n, 0.1)), dtype=np.float64)
+        
+        final = (
+            self.ensemble_weights["lgbm"] * lgbm +
+            self.ensemble_weights["graph"] * graph +
+            self.ensemble_weights["anomaly"] * anomaly
+        )
+        
+        db.bulk_insert_mappings(Decision, [
+            {
+                "tx_id": int(tx_id),
+                "p_fraud": float(p),
+                "score": float(p),
+                "model_version": settings.MODEL_VERSION,
+                "route": "production",
+                "explanation_json": {"component_scores": {"lgbm": float(l), "graph": float(g), "anomaly": float(a)}}
+            }
+            for tx_id, p, l, g, a in zip(tx_ids, final, lgbm, graph, anomaly)
+        ])
+        aggregator = aggregator if aggregator is not None else alert_aggregator
+        alerts, events = [], []
+        try:
+            if batch is not None:
+                alerts, events = self._batch_outbox_rows(batch, final, lgbm, graph, anomaly, aggregator)
+                if alerts:
+                    db.bulk_insert_mappings(Alert, alerts)
+                if outbox:
+                    db.bulk_insert_mappings(OutboxEvent, events)
+            db.commit()
+        except Exception:
+            aggregator.discard(alerts)
+            raise
+        
+        return {
+            "p_fraud": final,
+            "score": final,
+            "is_fraud": final > self.threshold,
+            "lgbm": lgbm,
+            "graph": graph,
+            "anomaly": anomaly,
+            "events": events
+        }
+    
+    def _batch_outbox_rows(self, batch, final: np.ndarray, lgbm: np.ndarray, graph: np.ndarray,
+                           anomaly: np.ndarray, aggregator: AlertAggregator):
+        """Alert mappings and outbox rows for a scored columnar batch"""
+        def strings(column):
+            return column.take(np.array(column.values, dtype=object), None)
+        
+        card_id, merchant_id = strings(batch.card_id), strings(batch.merchant_id)
+        mcc, country = strings(batch.mcc), strings(batch.country)
+        scored_at = datetime.utcnow().isoformat()
+        alerts, events = [], []
+        for i, tx_id in enumerate(batch.tx_id.tolist()):
+            p = float(final[i])
+            is_fraud = p > self.threshold
+            events.append(outbox_row(settings.INFERENCE_DECISIONS_TOPIC, card_id[i], decision_message(
+                tx_id, card_id[i], p, p, is_fraud, settings.MODEL_VERSION,
+                {"lgbm": float(lgbm[i]), "graph": float(graph[i]), "anomaly": float(anomaly[i])}, scored_at
+            )))
+            if is_fraud:
+                alert = alert_rows(aggregator, tx_id, card_id[i], "", p, alert_message(
+                    tx_id, card_id[i], merchant_id[i], mcc[i], country[i], float(batch.amount[i]), p,
+                    settings.MODEL_VERSION, scored_at
+                ))
+                if alert is not None:
+                    alerts.append(alert[0])
+                    events.append(alert[1])
+        return alerts, events
+    
     def _prepare_feature_vector(self, features: Dict[str, Any]) -> np.ndarray:
         """Convert feature dict to numpy array"""
-        # Define feature order (should match training)
-        feature_names = [
-            'amount_log', 'hour_sin', 'hour_cos', 'day_of_week', 'is_weekend',
-            'velocity_1m_count', 'velocity_5m_count', 'velocity_30m_count',
-            'velocity_1m_amount', 'velocity_5m_amount', 'velocity_30m_amount',
-            'distance_from_home', 'country_change', 'new_device',
-            'merchant_risk_score', 'device_risk_score'
-        ]
-        
         vector = []
-        for name in feature_names:
+        for name in TABULAR_FEATURES:
             value = features.get(name, 0.0)
             if isinstance(value, bool):
                 value = float(value)
@@ -153,24 +376,73 @@ class ScoringService:
         
         return np.array(vector, dtype=np.float32)
     
-    async def _get_graph_features(self, transaction: TransactionRequest) -> np.ndarray:
+    @traced("scoring.graph_features")
+    async def _get_graph_features(
+        self,
+        transaction: TransactionRequest,
+        deadline: Optional[Deadline] = None
+    ) -> np.ndarray:
         """Get graph embeddings for card, merchant, device"""
+        embedding_dim = settings.EMBEDDING_DIMENSION
+        
+        if deadline is not None and not deadline.allows(settings.GRAPH_MIN_BUDGET_MS):
+            deadline.degrade("graph_embeddings")
+            return np.zeros(embedding_dim * 3, dtype=np.float32)
+        
+        # Fall back immediately while the graph backend is known to be down
+        if not self.graph_breaker.allow_request():
+            if deadline is not None:
+                deadline.degrade("graph_embeddings")
+            return np.zeros(embedding_dim * 3, dtype=np.float32)
+        
+        # Leave the rest of the pipeline its own reserve
+        full_timeout = settings.GRAPH_TIMEOUT_MS / 1000.0
+        timeout = full_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline.remaining_seconds() - settings.SHAP_MIN_BUDGET_MS / 1000.0)
+        
         try:
             # Get embeddings from cache or compute
-            card_emb = await self.graph_service.get_card_embedding(transaction.card_id)
-            merchant_emb = await self.graph_service.get_merchant_embedding(transaction.merchant_id)
-            device_emb = await self.graph_service.get_device_embedding(transaction.device_id)
+            card_emb, merchant_emb, device_emb = await asyncio.wait_for(
+                asyncio.gather(
+                    self._graph_embedding("card", self.graph_service.get_card_embedding, transaction.card_id),
+                    self._graph_embedding("merchant", self.graph_service.get_merchant_embedding, transaction.merchant_id),
+                    self._graph_embedding("device", self.graph_service.get_device_embedding, transaction.device_id)
+                ),
+                timeout=max(timeout, 0.0)
+            )
+            self.graph_breaker.record_success()
             
             # Concatenate embeddings
             graph_features = np.concatenate([card_emb, merchant_emb, device_emb])
             return graph_features
             
+        except asyncio.CancelledError:
+            self.graph_breaker.abandon_probe()
+            raise
+        except asyncio.TimeoutError:
+            # Only a timeout that had the full GRAPH_TIMEOUT_MS says the backend is slow;
+            # one cut short by this request's deadline says nothing about it
+            if timeout >= full_timeout:
+                self.graph_breaker.record_failure()
+            else:
+                self.graph_breaker.abandon_probe()
+            if deadline is not None:
+                deadline.degrade("graph_embeddings")
+            return np.zeros(embedding_dim * 3, dtype=np.float32)
         except Exception as e:
+            self.graph_breaker.record_failure()
+            ERRORS.labels("graph_fetch").inc()
             logger.warning(f"Failed to get graph features: {e}")
             # Return zero embeddings as fallback
-            embedding_dim = settings.EMBEDDING_DIMENSION
             return np.zeros(embedding_dim * 3, dtype=np.float32)
     
+    async def _graph_embedding(self, entity: str, fetch, entity_id: Optional[str]) -> np.ndarray:
+        """One GraphService lookup, traced with the entity it touched"""
+        with span(f"graph.{entity}_embedding", entity_id=entity_id):
+            return await fetch(entity_id)
+    
+    @traced("scoring.ensemble")
     async def _get_ensemble_scores(
         self, 
         features: np.ndarray, 
@@ -207,11 +479,13 @@ class ScoringService:
         
         return scores
     
+    @traced("scoring.explanations")
     async def _generate_explanations(
         self,
         features: np.ndarray,
         scores: Dict[str, float],
-        raw_features: Dict[str, Any]
+        raw_features: Dict[str, Any],
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
         """Generate human-readable explanations using SHAP"""
         
@@ -223,9 +497,16 @@ class ScoringService:
         }
         
         # SHAP explanations for tabular features
-        if self.shap_explainer and self.lgbm_model:
+        run_shap = self.shap_explainer and self.lgbm_model
+        if run_shap and deadline is not None and not deadline.allows(settings.SHAP_MIN_BUDGET_MS):
+            deadline.degrade("shap_explanations")
+            run_shap = False
+        
+        if run_shap:
             try:
+                start = perf_counter()
                 shap_values = self.shap_explainer.shap_values([features[:16]])[0]
+                STAGE_SECONDS.labels("shap").observe_since(start)
                 feature_names = [
                     'log_amount', 'hour_sin', 'hour_cos', 'day_of_week', 'weekend',
                     'vel_1m_count', 'vel_5m_count', 'vel_30m_count',
@@ -246,6 +527,7 @@ class ScoringService:
                     })
                     
             except Exception as e:
+                ERRORS.labels("shap").inc()
                 logger.warning(f"SHAP explanation failed: {e}")
         
         # Add risk factor explanations
@@ -0,0 +1,286 @@
+"""
+Kafka client for the API's background consumers (kafka-python).
+
+kafka-python is blocking and a KafkaConsumer is not thread-safe, so every
+consumer lives on its own single-thread executor: poll() runs there and
+returns up to KAFKA_MAX_POLL_RECORDS records, waiting at most
+KAFKA_POLL_TIMEOUT_MS for the first one. The records of a batch are
+decoded in the same thread (orjson when installed, json otherwise), so the
+event loop receives ready-made dicts a batch at a time instead of waking
+up, and parsing, once per message.
+
+KafkaClient feeds the /ws alert broadcast, so every API process must see
+every partition: each joins its own consumer group, KAFKA_CONSUMER_GROUP
+suffixed with the host name and pid, and commits no offsets (a restarted
+process starts from the latest record, like a new WebSocket client).
+
+After every poll the consumer's lag per partition (high watermark minus
+position) is refreshed; partitions no longer assigned are dropped from it. consume_forever() recreates a consumer that fails
+and retries with exponential backoff (KAFKA_RESTART_BACKOFF_MS doubling up
+to KAFKA_RESTART_BACKOFF_MAX_SECONDS), so one broker hiccup or bad record
+does not end the consumer for the life of the process.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def loads(data) -> Any:
+    """Decode a JSON message value (bytes or str)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """Encode a message value as JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+
+class KafkaMessage:
+    """A decoded record; `raw` is the value as text, for forwarding without re-encoding"""
+
+    __slots__ = ("topic", "partition", "offset", "key", "value", "raw")
+
+    def __init__(self, topic: str, partition: int, offset: int, key: Optional[bytes], value: Any, raw: str):
+        self.topic = topic
+        self.partition = partition
+        self.offset = offset
+        self.key = key
+        self.value = value
+        self.raw = raw
+
+
+class ConsumerStats:
+    """Per-topic consumer counters"""
+
+    def __init__(self):
+        self.polls = 0
+        self.batches = 0
+        self.records = 0
+        self.decode_errors = 0
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.lag: Dict[int, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "polls": self.polls,
+            "batches": self.batches,
+            "records": self.records,
+            "avg_batch_size": round(self.records / self.batches, 1) if self.batches else 0.0,
+            "decode_errors": self.decode_errors,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "lag": sum(self.lag.values()),
+            "lag_by_partition": dict(sorted(self.lag.items()))
+        }
+
+
+consumer_stats: Dict[str, ConsumerStats] = {}
+
+
+def kafka_stats() -> Dict[str, Any]:
+    return {topic: stats.to_dict() for topic, stats in consumer_stats.items()}
+
+
+def new_consumer(topics: List[str], group_id: str, **config):
+    """KafkaConsumer with the service defaults; `config` overrides them"""
+    from kafka import KafkaConsumer
+
+    options = {
+        "bootstrap_servers": settings.KAFKA_BOOTSTRAP_SERVERS.split(","),
+        "group_id": group_id,
+        "enable_auto_commit": True,
+        "auto_offset_reset": "latest"
+    }
+    options.update(config)
+    return KafkaConsumer(*topics, **options)
+
+
+def new_producer(**config):
+    """KafkaProducer with the service defaults; `config` overrides them"""
+    from kafka import KafkaProducer
+
+    options = {"bootstrap_servers": settings.KAFKA_BOOTSTRAP_SERVERS.split(",")}
+    options.update(config)
+    return KafkaProducer(**options)
+
+
+def new_acked_producer(compression: str, linger_ms: int, batch_size: int, **config):
+    """Producer for the workers' output: acks=all, batched and compressed, per-key order kept"""
+    options = {
+        "acks": "all",
+        "compression_type": compression,
+        "linger_ms": linger_ms,
+        "batch_size": batch_size,
+        "retries": 5,
+        # Retries must not reorder a card's records
+        "max_in_flight_requests_per_connection": 1
+    }
+    options.update(config)
+    return new_producer(**options)
+
+
+def update_lag(consumer, stats: ConsumerStats):
+    """Refresh per-partition lag from the fetch high watermarks (consumer's thread)"""
+    assignment = consumer.assignment()
+    assigned = {partition.partition for partition in assignment}
+    for revoked in [p for p in stats.lag if p not in assigned]:
+        del stats.lag[revoked]
+    for partition in assignment:
+        highwater = consumer.highwater(partition)
+        if highwater is None:
+            continue
+        stats.lag[partition.partition] = max(highwater - consumer.position(partition), 0)
+
+
+class _Consumer:
+    """A KafkaConsumer and the thread that owns it"""
+
+    def __init__(self, topic: str, group_id: str, bootstrap_servers: str, stats: ConsumerStats):
+        self.topic = topic
+        self.group_id = group_id
+        self.bootstrap_servers = bootstrap_servers
+        self.stats = stats
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"kafka-{topic}")
+        self.consumer = None
+
+    def open(self):
+        self.stats.lag.clear()
+        self.consumer = new_consumer([self.topic], self.group_id,
+                                     bootstrap_servers=self.bootstrap_servers.split(","),
+                                     enable_auto_commit=False)
+
+    def poll(self, max_records: int, timeout_ms: int) -> List[KafkaMessage]:
+        """Poll and decode one batch (runs on the consumer's thread)"""
+        polled = self.consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+        stats = self.stats
+        stats.polls += 1
+        messages = []
+        for partition, records in polled.items():
+            for record in records:
+                value = record.value
+                try:
+                    raw = value.decode() if isinstance(value, bytes) else value
+                    messages.append(KafkaMessage(record.topic, record.partition, record.offset,
+                                                 record.key, loads(raw), raw))
+                except ValueError as e:
+                    stats.decode_errors += 1
+                    logger.warning(f"Skipping undecodable record {record.topic}/{record.partition}@{record.offset}: {e}")
+        update_lag(self.consumer, stats)
+        return messages
+
+    def close(self):
+        if self.consumer is not None:
+            try:
+                self.consumer.close()
+            except Exception as e:
+                logger.debug(f"Error closing Kafka consumer for {self.topic}: {e}")
+            self.consumer = None
+
+
+def process_group_id() -> str:
+    """KAFKA_CONSUMER_GROUP made unique to this process, so it is assigned every partition"""
+    return f"{settings.KAFKA_CONSUMER_GROUP}-{socket.gethostname()}-{os.getpid()}"
+
+
+class KafkaClient:
+    def __init__(self, bootstrap_servers: Optional[str] = None, group_id: Optional[str] = None):
+        self.bootstrap_servers = bootstrap_servers or settings.KAFKA_BOOTSTRAP_SERVERS
+        self.group_id = group_id or process_group_id()
+        self._consumers: Dict[str, _Consumer] = {}
+        self._closed = False
+
+    async def _open(self, topic: str) -> _Consumer:
+        consumer = self._consumers.get(topic)
+        if consumer is None:
+            stats = consumer_stats.setdefault(topic, ConsumerStats())
+            consumer = _Consumer(topic, self.group_id, self.bootstrap_servers, stats)
+            try:
+                await asyncio.get_running_loop().run_in_executor(consumer.executor, consumer.open)
+            except Exception:
+                consumer.executor.shutdown(wait=False)
+                raise
+            self._consumers[topic] = consumer
+        return consumer
+
+    async def _discard(self, topic: str):
+        consumer = self._consumers.pop(topic, None)
+        if consumer is not None:
+            await asyncio.get_running_loop().run_in_executor(consumer.executor, consumer.close)
+            consumer.executor.shutdown(wait=False)
+
+    async def consume_batches(self, topic: str, max_records: Optional[int] = None,
+                              timeout_ms: Optional[int] = None) -> AsyncIterator[List[KafkaMessage]]:
+        """Yield non-empty batches of decoded messages"""
+        max_records = max_records or settings.KAFKA_MAX_POLL_RECORDS
+        timeout_ms = timeout_ms if timeout_ms is not None else settings.KAFKA_POLL_TIMEOUT_MS
+        consumer = await self._open(topic)
+        loop = asyncio.get_running_loop()
+        try:
+            while not self._closed:
+                batch = await loop.run_in_executor(consumer.executor, consumer.poll, max_records, timeout_ms)
+                if batch:
+                    consumer.stats.batches += 1
+                    consumer.stats.records += len(batch)
+                    yield batch
+        except BaseException:
+            # A failed (or cancelled) consumer is rebuilt on the next call
+            await asyncio.shield(self._discard(topic))
+            raise
+
+    async def consume(self, topic: str) -> AsyncIterator[KafkaMessage]:
+        """Yield decoded messages one at a time"""
+        async for batch in self.consume_batches(topic):
+            for message in batch:
+                yield message
+
+    async def consume_forever(self, topic: str,
+                              handle_batch: Callable[[List[KafkaMessage]], Optional[Awaitable[None]]]):
+        """Feed batches to `handle_batch` until cancelled, restarting with backoff on errors"""
+        backoff = settings.KAFKA_RESTART_BACKOFF_MS / 1000.0
+        stats = consumer_stats.setdefault(topic, ConsumerStats())
+        while not self._closed:
+            try:
+                async for batch in self.consume_batches(topic):
+                    result = handle_batch(batch)
+                    if asyncio.iscoroutine(result):
+                        await result
+                    backoff = settings.KAFKA_RESTART_BACKOFF_MS / 1000.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats.restarts += 1
+                stats.last_error = str(e) or type(e).__name__
+                logger.error(f"Kafka consumer for {topic} failed ({stats.last_error}); restarting in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, settings.KAFKA_RESTART_BACKOFF_MAX_SECONDS)
+
+    def lag(self, topic: str) -> Tuple[int, Dict[int, int]]:
+        """Total and per-partition lag of a topic's consumer"""
+        stats = consumer_stats.get(topic)
+        if stats is None:
+            return 0, {}
+        return sum(stats.lag.values()), dict(stats.lag)
+
+    async def close(self):
+        self._closed = True
+        for topic in list(self._consumers):
+            await self._discard(topic)
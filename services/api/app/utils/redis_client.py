@@ -0,0 +1,247 @@
+"""
+Async Redis client for feature state (velocity counters, recent items).
+
+Every call has its own timeout (REDIS_READ_TIMEOUT_MS / REDIS_WRITE_TIMEOUT_MS)
+so a slow Redis cannot hold a request past its budget. Idempotent reads are
+hedged: if the primary has not answered after the configured percentile of
+its recent latency, the same read is sent to the replica and whichever
+answers first wins. Hedge counters are kept per process so the percentile
+and minimum delay can be tuned from production data.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+import redis.asyncio as redis
+
+from ..config import settings
+from ..core.query_stats import record_redis
+from ..core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyWindow:
+    """Rolling sample of primary read latencies with a cached percentile"""
+
+    def __init__(self, percentile: float, size: int = 1000, refresh_every: int = 100):
+        self.percentile = percentile
+        self.refresh_every = refresh_every
+        self._samples: deque = deque(maxlen=size)
+        self._since_refresh = 0
+        self._cached: Optional[float] = None
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self._since_refresh += 1
+        if self._cached is None or self._since_refresh >= self.refresh_every:
+            self._cached = float(np.percentile(self._samples, self.percentile))
+            self._since_refresh = 0
+
+    def value(self, default: float) -> float:
+        return self._cached if self._cached is not None else default
+
+
+class HedgeStats:
+    """Per-process counters for tuning read hedging"""
+
+    def __init__(self):
+        self.reads = 0
+        self.read_timeouts = 0
+        self.write_timeouts = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.replica_errors = 0
+
+    def to_dict(self, delay_seconds: float) -> Dict[str, Any]:
+        return {
+            "reads": self.reads,
+            "read_timeouts": self.read_timeouts,
+            "write_timeouts": self.write_timeouts,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedge_fire_rate": self.hedges_fired / self.reads if self.reads else 0.0,
+            "hedge_win_rate": self.hedges_won / self.hedges_fired if self.hedges_fired else 0.0,
+            "replica_errors": self.replica_errors,
+            "current_hedge_delay_ms": delay_seconds * 1000
+        }
+
+
+_primary: Optional[Any] = None
+_replica: Optional[Any] = None
+_latency = LatencyWindow(settings.REDIS_HEDGE_PERCENTILE)
+hedge_stats = HedgeStats()
+
+
+def _default_primary():
+    global _primary
+    if _primary is None:
+        _primary = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _primary
+
+
+def _default_replica():
+    global _replica
+    if _replica is None and settings.REDIS_REPLICA_URL:
+        _replica = redis.from_url(settings.REDIS_REPLICA_URL, decode_responses=True)
+    return _replica
+
+
+class RedisClient:
+    """Thin wrapper around the shared primary/replica connection pools.
+
+    Cheap to construct per request; the pools and hedge statistics are
+    process-wide. Stand-in clients can be injected for local benchmarks.
+    """
+
+    def __init__(self, primary=None, replica=None, hedging: Optional[bool] = None,
+                 latency: Optional[LatencyWindow] = None, stats: Optional[HedgeStats] = None):
+        self.primary = primary if primary is not None else _default_primary()
+        self.replica = replica if replica is not None else _default_replica()
+        self.hedging = settings.REDIS_HEDGE_ENABLED if hedging is None else hedging
+        self.latency = latency or _latency
+        self.stats = stats or hedge_stats
+        self.read_timeout = settings.REDIS_READ_TIMEOUT_MS / 1000.0
+        self.write_timeout = settings.REDIS_WRITE_TIMEOUT_MS / 1000.0
+
+    # Reads (idempotent, hedged)
+
+    async def get_count_in_window(self, key: str, window_seconds: int) -> int:
+        """Events recorded under a fixed-window counter key"""
+        value = await self._read(lambda client: client.get(key), "get", key)
+        return int(float(value)) if value is not None else 0
+
+    async def get_sum_in_window(self, key: str, window_seconds: int) -> float:
+        """Amount recorded under a fixed-window counter key"""
+        value = await self._read(lambda client: client.get(key), "get", key)
+        return float(value) if value is not None else 0.0
+
+    async def get_recent_items(self, key: str, window_seconds: int) -> List[str]:
+        """Members of a time-scored sorted set seen within the window"""
+        since = time.time() - window_seconds
+        return await self._read(lambda client: client.zrangebyscore(key, since, "+inf"), "zrangebyscore", key)
+
+    async def get_json(self, key: str) -> Optional[str]:
+        return await self._read(lambda client: client.get(key), "get", key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Values of many counter keys in one round trip (MGET)"""
+        if not keys:
+            return []
+        return await self._read(lambda client: client.mget(keys), "mget", f"{len(keys)} keys")
+
+    # Writes (primary only)
+
+    async def increment_counter(self, key: str, amount: float, ttl_seconds: int):
+        """Add to a counter whose window starts with its first increment"""
+        async def _increment():
+            pipe = self.primary.pipeline(transaction=False)
+            pipe.incrbyfloat(key, amount)
+            pipe.expire(key, ttl_seconds, nx=True)
+            await pipe.execute()
+        await self._write(_increment, "incrbyfloat", key)
+
+    async def increment_counters(self, increments: Dict[str, float], ttl_seconds: Dict[str, int]):
+        """increment_counter for many keys in a single pipeline"""
+        if not increments:
+            return
+        async def _increment():
+            pipe = self.primary.pipeline(transaction=False)
+            for key, amount in increments.items():
+                pipe.incrbyfloat(key, amount)
+                pipe.expire(key, ttl_seconds[key], nx=True)
+            await pipe.execute()
+        await self._write(_increment, "incrbyfloat", f"{len(increments)} keys")
+
+    async def set_json(self, key: str, value: str, ttl_seconds: int):
+        await self._write(lambda: self.primary.set(key, value, ex=ttl_seconds), "set", key)
+
+    async def ping(self) -> bool:
+        return await self._write(lambda: self.primary.ping(), "ping")
+
+    # Internals
+
+    def hedge_delay(self) -> float:
+        """Delay before hedging: the configured percentile of primary latency"""
+        delay = self.latency.value(default=self.read_timeout / 2)
+        return max(delay, settings.REDIS_HEDGE_MIN_DELAY_MS / 1000.0)
+
+    async def _write(self, op: Callable[[], Awaitable[Any]], command: str, key: Optional[str] = None) -> Any:
+        started = time.perf_counter()
+        with span(f"redis.{command}", key=key):
+            try:
+                return await asyncio.wait_for(op(), timeout=self.write_timeout)
+            except asyncio.TimeoutError:
+                self.stats.write_timeouts += 1
+                raise
+            finally:
+                record_redis(command, time.perf_counter() - started)
+
+    async def _read(self, op: Callable[[Any], Awaitable[Any]], command: str, key: Optional[str] = None) -> Any:
+        """Hedged, time-limited read; `command` and `key` label the trace span and query counts"""
+        started = time.perf_counter()
+        with span(f"redis.{command}", key=key) as current:
+            try:
+                return await self._hedged_read(op, current)
+            finally:
+                record_redis(command, time.perf_counter() - started)
+
+    async def _hedged_read(self, op: Callable[[Any], Awaitable[Any]], current) -> Any:
+        self.stats.reads += 1
+        started = time.monotonic()
+        deadline = started + self.read_timeout
+
+        primary = asyncio.ensure_future(op(self.primary))
+
+        def _record(task):
+            if not task.cancelled() and task.exception() is None:
+                self.latency.record(time.monotonic() - started)
+        primary.add_done_callback(_record)
+
+        tasks = {primary}
+        hedge = None
+        if self.hedging and self.replica is not None:
+            done, _ = await asyncio.wait(tasks, timeout=min(self.hedge_delay(), self.read_timeout))
+            if not done:
+                self.stats.hedges_fired += 1
+                if current is not None:
+                    current.attrs["hedged"] = True
+                hedge = asyncio.ensure_future(op(self.replica))
+                tasks.add(hedge)
+
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.stats.hedges_won += 1
+                            # The primary was at least this slow; keep the tail visible
+                            self.latency.record(time.monotonic() - started)
+                        return task.result()
+                    if task is hedge:
+                        self.stats.replica_errors += 1
+                    error = task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if error is not None and not tasks:
+            raise error
+        self.stats.read_timeouts += 1
+        raise asyncio.TimeoutError(f"Redis read exceeded {self.read_timeout * 1000:.0f}ms")
+
+
+def redis_stats() -> Dict[str, Any]:
+    return hedge_stats.to_dict(max(_latency.value(default=settings.REDIS_READ_TIMEOUT_MS / 2000.0),
+                                   settings.REDIS_HEDGE_MIN_DELAY_MS / 1000.0))
@@ -0,0 +1,455 @@
+"""
+Streaming scoring worker (the docker-compose `inference` service).
+
+    python -m app.workers.inference
+
+Replicas join consumer group CONSUMER_GROUP_ID and split the partitions of
+INFERENCE_TRANSACTIONS_TOPIC. Each replica loops over micro-batches:
+
+1. poll until INFERENCE_BATCH_SIZE records or INFERENCE_BATCH_WAIT_MS have
+   passed, decoding the records on the consumer's thread;
+2. validate the batch column-wise (ColumnarBatch.from_records) and score it
+   with FeatureService.generate_features_batch and ScoringService.score_batch,
+   the same path as /batch-score/arrow, which commits the decisions and the
+   alert rows (the alerts table behind /api/v1/alerts and the alert queue)
+   to the database, without outbox rows;
+3. produce a decision per scored transaction to INFERENCE_DECISIONS_TOPIC,
+   an alert per flagged one to INFERENCE_ALERTS_TOPIC (the topic the API
+   fans out to /ws clients) and invalid records to INFERENCE_DLQ_TOPIC, keyed
+   by card so per-card order holds. The producer compresses
+   (INFERENCE_COMPRESSION) and lingers INFERENCE_LINGER_MS to fill batches;
+4. flush the producer (acks=all), check every send, and only then commit
+   the consumer offsets.
+
+Offsets therefore move only once a batch's decisions are in the database and
+its output records are acknowledged; a crash in between replays the batch
+(at-least-once, consumers of the output topics dedupe on tx_id). A batch
+that fails is not committed: the consumer is closed and rebuilt with
+backoff, and the group resumes from the last committed offset.
+
+With STATE_STORE_ENABLED, transactions keyed by card_id give each replica
+the cards of its partitions, and velocity and card history come from
+partition-local state stores (app.workers.state) instead of Redis. The
+stores' changelog records are produced in step 3 with the outputs, and are
+snapshotted after the commit and handed off in the consumer's rebalance
+callbacks.
+
+Alerts go through an AlertAggregator (app.services.alert_window): only the
+first flagged transaction of a card and reason in ALERT_WINDOW_SECONDS gets
+a row and a message, and a window that merged more has its row updated and
+is announced once more with the totals, in the first batch after it closes
+(and on a clean stop). A failed batch drops the open windows, so its
+replayed alerts open new ones.
+"""
+
+import asyncio
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from ..config import settings
+from ..core.executor import run_db
+from ..core.metrics import ERRORS, FLAGGED, SCORED, STAGE_SECONDS
+from ..services.columnar import ColumnarBatch, EncodedColumn
+from ..services.alert_window import AlertAggregator, AlertWindow, write_alert_updates
+from ..utils.kafka_client import ConsumerStats, consumer_stats, dumps, loads, new_acked_producer, new_consumer, update_lag
+from .state import KafkaChangelogReader, StateStores
+
+logger = logging.getLogger(__name__)
+
+STATS_LOG_SECONDS = 30.0
+
+
+def _strings(column: EncodedColumn) -> np.ndarray:
+    """Per-row values of a dictionary-encoded column (None for nulls)"""
+    return np.array(list(column.values) + [None], dtype=object)[column.codes]
+
+
+def build_batch(values: List[Any]) -> Tuple[Optional[ColumnarBatch], np.ndarray]:
+    """ColumnarBatch of the valid records and one error (or None) per record.
+
+    When Arrow cannot put the records in one table (a field of the wrong
+    type), they are tried one by one so the bad ones do not fail the batch.
+    """
+    errors = np.full(len(values), None, dtype=object)
+    for i, value in enumerate(values):
+        if not isinstance(value, dict):
+            errors[i] = "Record must be a JSON object"
+    keep = np.flatnonzero(np.equal(errors, None))
+    try:
+        return _batch_of(values, keep, errors)
+    except (pa.ArrowException, ValueError, TypeError):
+        pass
+    for i in keep:
+        try:
+            ColumnarBatch.from_records([values[i]])
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            errors[i] = f"Invalid record: {e}"
+    return _batch_of(values, np.flatnonzero(np.equal(errors, None)), errors)
+
+
+def _batch_of(values: List[Any], keep: np.ndarray, errors: np.ndarray) -> Tuple[Optional[ColumnarBatch], np.ndarray]:
+    if not len(keep):
+        return None, errors
+    batch, kept_errors = ColumnarBatch.from_records([values[i] for i in keep])
+    errors[keep] = kept_errors
+    batch.row_index = keep[batch.row_index]
+    return batch, errors
+
+
+class PipelineStats:
+    def __init__(self):
+        self.started = monotonic()
+        self.batches = 0
+        self.transactions = 0
+        self.invalid = 0
+        self.alerts = 0
+        self.produced = 0
+        self.restarts = 0
+        self.last_batch_ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = monotonic() - self.started
+        return {
+            "batches": self.batches,
+            "transactions": self.transactions,
+            "tx_per_second": round(self.transactions / elapsed, 1) if elapsed > 0 else 0.0,
+            "invalid": self.invalid,
+            "alerts": self.alerts,
+            "produced": self.produced,
+            "restarts": self.restarts,
+            "last_batch_ms": round(self.last_batch_ms, 2)
+        }
+
+
+class InferencePipeline:
+    """Consume -> score -> produce -> commit, one micro-batch at a time"""
+
+    def __init__(
+        self,
+        consumer_factory: Callable[[], Any],
+        producer_factory: Callable[[], Any],
+        feature_service,
+        scoring_service,
+        session_factory: Callable[[], Any],
+        batch_size: Optional[int] = None,
+        batch_wait_ms: Optional[float] = None,
+        state: Optional[StateStores] = None,
+        alerts: Optional[AlertAggregator] = None
+    ):
+        self.consumer_factory = consumer_factory
+        self.producer_factory = producer_factory
+        self.feature_service = feature_service
+        self.scoring_service = scoring_service
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.INFERENCE_BATCH_SIZE
+        self.batch_wait = (batch_wait_ms if batch_wait_ms is not None else settings.INFERENCE_BATCH_WAIT_MS) / 1000.0
+        # Touched from the consumer's thread (rebalance callbacks, snapshots)
+        # and the loop, never at the same time: a batch's steps run in turn
+        self.state = state
+        self.alerts = alerts if alerts is not None else AlertAggregator()
+        self.consumer = None
+        self.producer = None
+        # kafka-python consumers are not thread-safe: one thread owns it. The
+        # producer flush blocks, so it gets its own thread as well.
+        self._consumer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference-consumer")
+        self._producer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference-producer")
+        self.consumer_stats = consumer_stats.setdefault(settings.INFERENCE_TRANSACTIONS_TOPIC, ConsumerStats())
+        self.stats = PipelineStats()
+        self._stopping = False
+
+    def stop(self):
+        """Finish the current batch, commit it and exit run()"""
+        self._stopping = True
+
+    async def run(self):
+        backoff = settings.KAFKA_RESTART_BACKOFF_MS / 1000.0
+        last_log = monotonic()
+        try:
+            while not self._stopping:
+                try:
+                    await self._open()
+                    while not self._stopping:
+                        if await self.process_next():
+                            backoff = settings.KAFKA_RESTART_BACKOFF_MS / 1000.0
+                        if monotonic() - last_log >= STATS_LOG_SECONDS:
+                            last_log = monotonic()
+                            logger.info(f"Inference pipeline: {self.stats.to_dict()}"
+                                        + (f", state {self.state.stats()}" if self.state is not None else ""))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if self.state is not None:
+                        self.state.reset()
+                    self.alerts.reset()
+                    self.stats.restarts += 1
+                    self.consumer_stats.restarts += 1
+                    self.consumer_stats.last_error = str(e) or type(e).__name__
+                    logger.error(f"Inference batch failed ({self.consumer_stats.last_error}); "
+                                 f"restarting from the last committed offset in {backoff:.1f}s")
+                    await self._close(final=False)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, settings.KAFKA_RESTART_BACKOFF_MAX_SECONDS)
+            if self.state is not None and self.consumer is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._consumer_thread, lambda: self.state.maybe_snapshot(force=True))
+            windows = self.alerts.drain()
+            if windows:
+                await self._write_alert_updates(windows)
+                if self.producer is not None:
+                    await asyncio.get_running_loop().run_in_executor(
+                        self._producer_thread, self._produce, self._alert_updates(windows))
+        finally:
+            await asyncio.shield(self._close(final=True))
+
+    async def _open(self):
+        loop = asyncio.get_running_loop()
+        if self.consumer is None:
+            self.consumer = await loop.run_in_executor(self._consumer_thread, self.consumer_factory)
+        if self.producer is None:
+            self.producer = await loop.run_in_executor(self._producer_thread, self.producer_factory)
+
+    async def _close(self, final: bool):
+        """Close the consumer without committing (after a failure the batch replays);
+        the producer is kept across restarts and closed on the way out"""
+        loop = asyncio.get_running_loop()
+        consumer, self.consumer = self.consumer, None
+        if consumer is not None:
+            await loop.run_in_executor(self._consumer_thread, lambda: consumer.close(autocommit=False))
+        if final:
+            producer, self.producer = self.producer, None
+            if producer is not None:
+                await loop.run_in_executor(self._producer_thread, producer.close)
+            if self.state is not None:
+                await loop.run_in_executor(self._consumer_thread, self.state.close)
+
+    async def process_next(self) -> int:
+        """Poll, score and emit one micro-batch; returns the number of records"""
+        loop = asyncio.get_running_loop()
+        records = await loop.run_in_executor(self._consumer_thread, self._poll)
+        if not records:
+            return 0
+        started = perf_counter()
+        outputs = await self._score(records)
+
+        start = perf_counter()
+        await loop.run_in_executor(self._producer_thread, self._produce, outputs)
+        STAGE_SECONDS.labels("stream_produce").observe_since(start)
+
+        start = perf_counter()
+        await loop.run_in_executor(self._consumer_thread, self.consumer.commit)
+        STAGE_SECONDS.labels("stream_commit").observe_since(start)
+
+        if self.state is not None:
+            await loop.run_in_executor(self._consumer_thread, self.state.maybe_snapshot)
+
+        self.stats.batches += 1
+        self.stats.produced += len(outputs)
+        self.stats.last_batch_ms = (perf_counter() - started) * 1000
+        return len(records)
+
+    def _poll(self) -> List[Tuple[Any, Any]]:
+        """Collect up to batch_size records within batch_wait (consumer's thread)"""
+        deadline = monotonic() + self.batch_wait
+        if self.state is not None:
+            self.state.revoked.clear()
+        records = []
+        while len(records) < self.batch_size:
+            remaining = deadline - monotonic()
+            polled = self.consumer.poll(timeout_ms=max(int(remaining * 1000), 0),
+                                        max_records=self.batch_size - len(records))
+            for partition_records in polled.values():
+                records.extend(partition_records)
+            if remaining <= 0:
+                break
+        if self.state is not None and self.state.revoked:
+            # Polled before a rebalance took their partition: the new owner reads them
+            records = [record for record in records if record.partition not in self.state.revoked]
+        self.consumer_stats.polls += 1
+        decoded = []
+        for record in records:
+            try:
+                decoded.append((record, loads(record.value)))
+            except ValueError as e:
+                self.consumer_stats.decode_errors += 1
+                decoded.append((record, e))
+        if records:
+            self.consumer_stats.batches += 1
+            self.consumer_stats.records += len(records)
+            update_lag(self.consumer, self.consumer_stats)
+        return decoded
+
+    async def _score(self, records: List[Tuple[Any, Any]]) -> List[Tuple[str, Optional[bytes], bytes, Optional[int]]]:
+        """Score a polled batch; returns (topic, key, value, partition) output records"""
+        outputs = []
+        values = []
+        positions = []
+        for position, (record, value) in enumerate(records):
+            if isinstance(value, Exception):
+                outputs.append(self._dead_letter(record, f"Undecodable record: {value}"))
+            else:
+                values.append(value)
+                positions.append(position)
+
+        batch, errors = build_batch(values) if values else (None, ())
+        for position, error in zip(positions, errors):
+            if error is not None:
+                outputs.append(self._dead_letter(records[position][0], error))
+        self.stats.invalid += len(records) - (len(batch) if batch is not None else 0)
+        if batch is None or not len(batch):
+            return outputs
+
+        card_features = None
+        if self.state is not None:
+            start = perf_counter()
+            rows = [records[positions[i]][0] for i in batch.row_index]
+            card_features = self.state.features(
+                _strings(batch.card_id), batch.epoch_seconds, batch.amount, _strings(batch.country),
+                _strings(batch.device_id), np.array([record.partition for record in rows]),
+                np.array([record.offset for record in rows])
+            )
+            STAGE_SECONDS.labels("stream_state").observe_since(start)
+
+        db = self.session_factory()
+        try:
+            start = perf_counter()
+            features = await self.feature_service.generate_features_batch(batch, db, card_features)
+            STAGE_SECONDS.labels("stream_features").observe_since(start)
+            start = perf_counter()
+            scores = await run_db(self.scoring_service.score_batch, batch.tx_id, features, db, batch,
+                                  self.alerts, False)
+            STAGE_SECONDS.labels("stream_score").observe_since(start)
+            windows = self.alerts.due()
+            if windows:
+                await run_db(write_alert_updates, db, windows, False)
+        except Exception:
+            ERRORS.labels("stream").inc()
+            await run_db(db.rollback)
+            raise
+        finally:
+            await run_db(db.close)
+
+        outputs.extend(self._results(scores))
+        outputs.extend(self._alert_updates(windows))
+        if self.state is not None:
+            outputs.extend(self.state.changelog())
+        flagged = int(np.count_nonzero(scores["is_fraud"]))
+        SCORED.labels("stream").inc(len(batch))
+        FLAGGED.labels("stream").inc(flagged)
+        self.stats.transactions += len(batch)
+        self.stats.alerts += flagged
+        return outputs
+
+    def _results(self, scores: Dict[str, Any]) -> List[Tuple[str, Optional[bytes], bytes, Optional[int]]]:
+        """The decision and alert messages score_batch built (outbox rows), as output records"""
+        return [
+            (event["topic"], event["key"].encode(), event["payload"].encode(), None)
+            for event in scores["events"]
+        ]
+
+    def _alert_updates(self, windows: List[AlertWindow]) -> List[Tuple[str, Optional[bytes], bytes, Optional[int]]]:
+        return [
+            (settings.INFERENCE_ALERTS_TOPIC, window.card_id.encode(), dumps(window.update_message()), None)
+            for window in windows
+        ]
+
+    async def _write_alert_updates(self, windows: List[AlertWindow]):
+        db = self.session_factory()
+        try:
+            await run_db(write_alert_updates, db, windows, False)
+        except Exception:
+            await run_db(db.rollback)
+            raise
+        finally:
+            await run_db(db.close)
+
+    def _dead_letter(self, record, error: str) -> Tuple[str, Optional[bytes], bytes, Optional[int]]:
+        value = record.value.decode(errors="replace") if isinstance(record.value, bytes) else record.value
+        return settings.INFERENCE_DLQ_TOPIC, record.key, dumps({
+            "error": error,
+            "topic": record.topic,
+            "partition": record.partition,
+            "offset": record.offset,
+            "value": value
+        }), None
+
+    def _produce(self, outputs: List[Tuple[str, Optional[bytes], bytes, Optional[int]]]):
+        """Send and wait for every record to be acknowledged (producer's thread)"""
+        futures = [self.producer.send(topic, value=value, key=key, partition=partition)
+                   for topic, key, value, partition in outputs]
+        self.producer.flush(timeout=settings.INFERENCE_FLUSH_TIMEOUT_SECONDS)
+        for future in futures:
+            if not future.is_done:
+                raise TimeoutError(f"Output not acknowledged within {settings.INFERENCE_FLUSH_TIMEOUT_SECONDS}s")
+            if future.failed():
+                raise future.exception
+        if self.state is not None:
+            for (_, _, _, partition), future in zip(outputs, futures):
+                if partition is not None:
+                    self.state.acknowledge(partition, future.value.offset)
+
+
+def kafka_consumer(state: Optional[StateStores] = None):
+    consumer = new_consumer(
+        [],
+        settings.CONSUMER_GROUP_ID,
+        enable_auto_commit=False,
+        auto_offset_reset="earliest",
+        max_poll_records=settings.INFERENCE_BATCH_SIZE
+    )
+    listener = None
+    if state is not None:
+        from kafka import ConsumerRebalanceListener
+
+        class StateHandoff(ConsumerRebalanceListener):
+            def on_partitions_revoked(self, revoked):
+                state.on_partitions_revoked(revoked)
+
+            def on_partitions_assigned(self, assigned):
+                state.on_partitions_assigned(assigned)
+
+        listener = StateHandoff()
+    consumer.subscribe([settings.INFERENCE_TRANSACTIONS_TOPIC], listener=listener)
+    return consumer
+
+
+def kafka_producer():
+    return new_acked_producer(settings.INFERENCE_COMPRESSION, settings.INFERENCE_LINGER_MS,
+                              settings.INFERENCE_PRODUCER_BATCH_BYTES)
+
+
+async def run_worker():
+    from ..core.logging import setup_logging
+    from ..database import SessionLocal
+    from ..services.feature_service import FeatureService
+    from ..services.scoring import ScoringService
+
+    setup_logging()
+    scoring_service = ScoringService()
+    await scoring_service.initialize()
+    state = None
+    if settings.STATE_STORE_ENABLED:
+        state = StateStores(settings.INFERENCE_TRANSACTIONS_TOPIC, KafkaChangelogReader())
+    pipeline = InferencePipeline(lambda: kafka_consumer(state), kafka_producer, FeatureService(), scoring_service,
+                                 SessionLocal, state=state)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, pipeline.stop)
+    logger.info(f"Inference worker consuming {settings.INFERENCE_TRANSACTIONS_TOPIC} "
+                f"as {settings.CONSUMER_GROUP_ID} (batches of {pipeline.batch_size})")
+    await pipeline.run()
+    logger.info(f"Inference worker stopped: {pipeline.stats.to_dict()}")
+
+
+def main():
+    asyncio.run(run_worker())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Outbox relay (the docker-compose `outbox-relay` service).
+
+    python -m app.workers.outbox_relay
+
+Publishes the rows of the `outbox` table (app.services.outbox) to Kafka and
+deletes them. Each round locks up to OUTBOX_RELAY_BATCH_SIZE of the oldest
+rows (FOR UPDATE SKIP LOCKED, so extra replicas take disjoint rows), sends
+them all, flushes the producer (acks=all, OUTBOX_RELAY_COMPRESSION, large
+OUTBOX_RELAY_PRODUCER_BATCH_BYTES batches), checks every send and only then
+deletes the rows in the same transaction. A failed round rolls back and the
+rows are sent again: delivery is at-least-once, and consumers dedupe on
+tx_id. When the table is empty the relay sleeps OUTBOX_RELAY_IDLE_MS.
+"""
+
+import asyncio
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, perf_counter
+from typing import Any, Callable, Dict, Optional
+
+from ..config import settings
+from ..core.metrics import STAGE_SECONDS
+from ..models.database import OutboxEvent
+from ..utils.kafka_client import new_acked_producer
+
+logger = logging.getLogger(__name__)
+
+STATS_LOG_SECONDS = 30.0
+
+
+class RelayStats:
+    def __init__(self):
+        self.started = monotonic()
+        self.rounds = 0
+        self.published = 0
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.last_round_ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = monotonic() - self.started
+        return {
+            "rounds": self.rounds,
+            "published": self.published,
+            "per_second": round(self.published / elapsed, 1) if elapsed > 0 else 0.0,
+            "avg_batch": round(self.published / self.rounds, 1) if self.rounds else 0.0,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "last_round_ms": round(self.last_round_ms, 2)
+        }
+
+
+class OutboxRelay:
+    """Outbox rows -> Kafka, one locked batch at a time"""
+
+    def __init__(self, producer_factory: Callable[[], Any], session_factory: Callable[[], Any],
+                 batch_size: Optional[int] = None, idle_ms: Optional[float] = None):
+        self.producer_factory = producer_factory
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+        self.idle = (idle_ms if idle_ms is not None else settings.OUTBOX_RELAY_IDLE_MS) / 1000.0
+        self.producer = None
+        # Database session and producer calls all block; one thread runs a round
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox-relay")
+        self.stats = RelayStats()
+        self._stopping = False
+
+    def stop(self):
+        """Finish the current round and exit run()"""
+        self._stopping = True
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        backoff = settings.KAFKA_RESTART_BACKOFF_MS / 1000.0
+        last_log = monotonic()
+        try:
+            while not self._stopping:
+                try:
+                    published = await loop.run_in_executor(self._thread, self.relay_once)
+                    backoff = settings.KAFKA_RESTART_BACKOFF_MS / 1000.0
+                    if not published:
+                        await asyncio.sleep(self.idle)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats.restarts += 1
+                    self.stats.last_error = str(e) or type(e).__name__
+                    logger.error(f"Outbox relay round failed ({self.stats.last_error}); retrying in {backoff:.1f}s")
+                    await loop.run_in_executor(self._thread, self._close_producer)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, settings.KAFKA_RESTART_BACKOFF_MAX_SECONDS)
+                if monotonic() - last_log >= STATS_LOG_SECONDS:
+                    last_log = monotonic()
+                    logger.info(f"Outbox relay: {self.stats.to_dict()}")
+        finally:
+            await asyncio.shield(loop.run_in_executor(self._thread, self._close_producer))
+
+    def relay_once(self) -> int:
+        """Publish and delete one batch of outbox rows; returns how many (relay thread)"""
+        if self.producer is None:
+            self.producer = self.producer_factory()
+        db = self.session_factory()
+        try:
+            started = perf_counter()
+            rows = db.query(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.key, OutboxEvent.payload)\
+                .order_by(OutboxEvent.id)\
+                .limit(self.batch_size)\
+                .with_for_update(skip_locked=True)\
+                .all()
+            if not rows:
+                db.rollback()
+                return 0
+
+            start = perf_counter()
+            futures = [
+                self.producer.send(topic, value=payload.encode(), key=key.encode() if key is not None else None)
+                for _, topic, key, payload in rows
+            ]
+            self.producer.flush(timeout=settings.OUTBOX_RELAY_FLUSH_TIMEOUT_SECONDS)
+            for future in futures:
+                if not future.is_done:
+                    raise TimeoutError(
+                        f"Outbox batch not acknowledged within {settings.OUTBOX_RELAY_FLUSH_TIMEOUT_SECONDS}s")
+                if future.failed():
+                    raise future.exception
+            STAGE_SECONDS.labels("outbox_publish").observe_since(start)
+
+            db.query(OutboxEvent).filter(OutboxEvent.id.in_([row[0] for row in rows]))\
+                .delete(synchronize_session=False)
+            db.commit()
+            self.stats.rounds += 1
+            self.stats.published += len(rows)
+            self.stats.last_round_ms = (perf_counter() - started) * 1000
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _close_producer(self):
+        producer, self.producer = self.producer, None
+        if producer is not None:
+            try:
+                producer.close()
+            except Exception as e:
+                logger.debug(f"Error closing outbox producer: {e}")
+
+
+def kafka_producer():
+    return new_acked_producer(settings.OUTBOX_RELAY_COMPRESSION, settings.OUTBOX_RELAY_LINGER_MS,
+                              settings.OUTBOX_RELAY_PRODUCER_BATCH_BYTES)
+
+
+async def run_relay():
+    from ..core.logging import setup_logging
+    from ..database import Base, SessionLocal, engine
+
+    setup_logging()
+    Base.metadata.create_all(bind=engine)
+    relay = OutboxRelay(kafka_producer, SessionLocal)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, relay.stop)
+    logger.info(f"Outbox relay publishing in batches of up to {relay.batch_size} "
+                f"({settings.OUTBOX_RELAY_COMPRESSION})")
+    await relay.run()
+    logger.info(f"Outbox relay stopped: {relay.stats.to_dict()}")
+
+
+def main():
+    asyncio.run(run_relay())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Partition-local card state for the streaming scoring worker.
+
+Transactions are keyed by card_id, so every card lives in exactly one
+partition of the transactions topic and each worker replica owns the cards
+of the partitions assigned to it. A replica keeps per-card state in memory,
+one PartitionStore per owned partition:
+
+- recent (timestamp, amount, offset) events covering the longest velocity
+  window, from which the velocity features are computed exactly (sliding
+  windows in event time) instead of reading and incrementing Redis counters;
+- last seen timestamp, country and device;
+- running amount count / mean / variance (Welford).
+
+Durability follows the Kafka Streams model. Every batch's updated cards
+are produced to STATE_CHANGELOG_TOPIC (compacted, keyed by card, same
+partition number as the input) in the same flush as the batch's outputs,
+so state is durable before the input offsets are committed. Every
+STATE_SNAPSHOT_SECONDS each store is also written to STATE_DIR together
+with the changelog offset it covers.
+
+Handoff on rebalance happens in the consumer's rebalance callbacks, which
+run inside poll(), between batches:
+- revoked partitions are snapshotted and dropped; their changelog is
+  already flushed;
+- assigned partitions are restored from the local snapshot, if any, and
+  the changelog is replayed from the snapshot's offset. The replay brings
+  the store up to date even if the partition was last owned by another
+  replica.
+
+Events carry their input offset. A batch replayed after a crash (state
+already in the changelog, offsets not yet committed) is therefore not
+applied twice, and its velocity features still exclude the event itself.
+"""
+
+import logging
+import os
+from collections import deque
+from time import monotonic
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..config import settings
+from ..utils.kafka_client import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# (offset, key, value) records of one changelog partition, from a start offset
+ChangelogReader = Callable[[int, int], Iterable[Tuple[int, bytes, Optional[bytes]]]]
+
+
+class CardState:
+    __slots__ = ("last_offset", "last_ts", "last_country", "last_device", "count", "mean", "m2", "events")
+
+    def __init__(self):
+        self.last_offset = -1
+        self.last_ts: Optional[int] = None
+        self.last_country: Optional[str] = None
+        self.last_device: Optional[str] = None
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.events: Deque[Tuple[int, float, int]] = deque()
+
+    def velocity(self, ts: int, offset: int, windows: List[int]) -> List[Tuple[int, float]]:
+        """(count, amount) per window of this card's earlier events"""
+        totals = [[0, 0.0] for _ in windows]
+        for event_ts, amount, event_offset in reversed(self.events):
+            if event_offset >= offset:
+                continue
+            age = ts - event_ts
+            if age >= windows[-1] * 60:
+                break
+            for i, window in enumerate(windows):
+                if age < window * 60:
+                    totals[i][0] += 1
+                    totals[i][1] += amount
+        return [(count, amount) for count, amount in totals]
+
+    def apply(self, offset: int, ts: int, amount: float, country: Optional[str], device: Optional[str], horizon: int):
+        if offset <= self.last_offset:
+            return False
+        self.last_offset = offset
+        self.events.append((ts, amount, offset))
+        while self.events and self.events[0][0] <= ts - horizon:
+            self.events.popleft()
+        if self.last_ts is None or ts >= self.last_ts:
+            self.last_ts = ts
+            self.last_country = country or self.last_country
+            self.last_device = device or self.last_device
+        self.count += 1
+        delta = amount - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (amount - self.mean)
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "o": self.last_offset, "t": self.last_ts, "c": self.last_country, "d": self.last_device,
+            "n": self.count, "mean": self.mean, "m2": self.m2, "e": [list(event) for event in self.events]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CardState":
+        state = cls()
+        state.last_offset = data["o"]
+        state.last_ts = data["t"]
+        state.last_country = data["c"]
+        state.last_device = data["d"]
+        state.count = data["n"]
+        state.mean = data["mean"]
+        state.m2 = data["m2"]
+        state.events = deque(tuple(event) for event in data["e"])
+        return state
+
+
+class PartitionStore:
+    """Card states of one input partition"""
+
+    def __init__(self, partition: int):
+        self.partition = partition
+        self.cards: Dict[str, CardState] = {}
+        self.dirty: Set[str] = set()
+        self.evicted: Set[str] = set()
+        # Changelog offset up to which this store is durable
+        self.changelog_offset = 0
+        self.last_snapshot = monotonic()
+
+    def apply_changelog(self, offset: int, key: bytes, value: Optional[bytes]):
+        card = key.decode()
+        if value is None:
+            self.cards.pop(card, None)
+        else:
+            self.cards[card] = CardState.from_dict(loads(value))
+        self.changelog_offset = offset + 1
+
+    def evict_idle(self, ttl_seconds: float):
+        """Drop cards idle for longer than the TTL (in event time); tombstoned in the changelog"""
+        newest = max((state.last_ts for state in self.cards.values() if state.last_ts is not None), default=None)
+        if newest is None:
+            return
+        for card in [c for c, state in self.cards.items() if state.last_ts is not None and state.last_ts < newest - ttl_seconds]:
+            del self.cards[card]
+            self.dirty.discard(card)
+            self.evicted.add(card)
+
+    def snapshot(self) -> bytes:
+        return dumps({
+            "partition": self.partition,
+            "changelog_offset": self.changelog_offset,
+            "cards": {card: state.to_dict() for card, state in self.cards.items()}
+        })
+
+    @classmethod
+    def restore(cls, partition: int, data: bytes) -> "PartitionStore":
+        snapshot = loads(data)
+        store = cls(partition)
+        store.changelog_offset = snapshot["changelog_offset"]
+        store.cards = {card: CardState.from_dict(state) for card, state in snapshot["cards"].items()}
+        return store
+
+
+class StateStores:
+    """The stores of the partitions this replica owns, plus rebalance handoff"""
+
+    def __init__(self, topic: str, changelog_reader: ChangelogReader, state_dir: Optional[str] = None,
+                 changelog_topic: Optional[str] = None):
+        self.topic = topic
+        self.changelog_topic = changelog_topic or settings.STATE_CHANGELOG_TOPIC
+        self.changelog_reader = changelog_reader
+        self.state_dir = state_dir or settings.STATE_DIR
+        self.windows = sorted(settings.VELOCITY_WINDOW_MINUTES)
+        self.horizon = self.windows[-1] * 60
+        self.stores: Dict[int, PartitionStore] = {}
+        # Partitions revoked since the pipeline's last poll started
+        self.revoked: Set[int] = set()
+        self.restored_records = 0
+        self.handoffs = 0
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    # Rebalance listener (called from the consumer's thread inside poll())
+
+    def on_partitions_revoked(self, revoked):
+        for tp in revoked:
+            self.revoked.add(tp.partition)
+            store = self.stores.pop(tp.partition, None)
+            if store is not None:
+                self._write_snapshot(store)
+                self.handoffs += 1
+                logger.info(f"Handed off state of partition {tp.partition} ({len(store.cards)} cards)")
+
+    def on_partitions_assigned(self, assigned):
+        for tp in assigned:
+            self.revoked.discard(tp.partition)
+            self.store(tp.partition)
+
+    def store(self, partition: int) -> PartitionStore:
+        """The partition's store, restored on first use"""
+        store = self.stores.get(partition)
+        if store is None:
+            store = self.stores[partition] = self._restore(partition)
+        return store
+
+    def reset(self):
+        """Drop every store; after a failed batch they may hold updates the changelog never got"""
+        self.stores.clear()
+
+    def _path(self, partition: int) -> str:
+        return os.path.join(self.state_dir, f"{self.topic}-{partition}.snapshot")
+
+    def _restore(self, partition: int) -> PartitionStore:
+        started = monotonic()
+        store = PartitionStore(partition)
+        try:
+            with open(self._path(partition), "rb") as f:
+                store = PartitionStore.restore(partition, f.read())
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable state snapshot for partition {partition}: {e}")
+        from_offset = store.changelog_offset
+        replayed = 0
+        for offset, key, value in self.changelog_reader(partition, from_offset):
+            store.apply_changelog(offset, key, value)
+            replayed += 1
+        self.restored_records += replayed
+        logger.info(f"Restored state of partition {partition}: {len(store.cards)} cards, "
+                    f"{replayed} changelog records from offset {from_offset} in {(monotonic() - started) * 1000:.0f}ms")
+        return store
+
+    def _write_snapshot(self, store: PartitionStore):
+        path = self._path(store.partition)
+        with open(path + ".tmp", "wb") as f:
+            f.write(store.snapshot())
+        os.replace(path + ".tmp", path)
+        store.last_snapshot = monotonic()
+
+    # Batch processing (event loop)
+
+    def features(self, card_id: np.ndarray, timestamp: np.ndarray, amount: np.ndarray, country: np.ndarray,
+                 device_id: np.ndarray, partition: np.ndarray, offset: np.ndarray) -> Dict[str, np.ndarray]:
+        """Velocity and card-history features per row, applying each row to its card's state.
+
+        Rows are processed in offset order, so in-batch history counts as it
+        would have one transaction at a time.
+        """
+        n = len(card_id)
+        windows = self.windows
+        count = np.zeros((len(windows), n))
+        total = np.zeros((len(windows), n))
+        hours_since_last = np.full(n, 999.0)  # as FeatureService: large for a card's first transaction
+        zscore = np.zeros(n)
+        for row in np.lexsort((offset, partition)):
+            store = self.store(int(partition[row]))
+            card = card_id[row]
+            state = store.cards.get(card)
+            if state is None:
+                state = store.cards[card] = CardState()
+            ts = int(timestamp[row])
+            for i, (c, a) in enumerate(state.velocity(ts, int(offset[row]), windows)):
+                count[i, row] = c
+                total[i, row] = a
+            if state.last_ts is not None:
+                hours_since_last[row] = (ts - state.last_ts) / 3600
+            if state.count:
+                std = (state.m2 / (state.count - 1)) ** 0.5 if state.count > 1 else 1.0
+                zscore[row] = (amount[row] - state.mean) / max(std, 1.0)
+            if state.apply(int(offset[row]), ts, float(amount[row]), country[row], device_id[row], self.horizon):
+                store.dirty.add(card)
+
+        features = {}
+        for i, window in enumerate(windows):
+            features[f'velocity_{window}m_count'] = count[i]
+            features[f'velocity_{window}m_amount'] = total[i]
+        features['hours_since_last_tx'] = hours_since_last
+        features['amount_zscore'] = zscore
+        return features
+
+    def changelog(self) -> List[Tuple[str, bytes, Optional[bytes], int]]:
+        """(topic, key, value, partition) records for the cards changed since the last call"""
+        records = []
+        for partition, store in self.stores.items():
+            for card in store.dirty:
+                records.append((self.changelog_topic, card.encode(), dumps(store.cards[card].to_dict()), partition))
+            for card in store.evicted:
+                records.append((self.changelog_topic, card.encode(), None, partition))
+            store.dirty.clear()
+            store.evicted.clear()
+        return records
+
+    def acknowledge(self, partition: int, offset: int):
+        """A changelog record of `partition` was written at `offset`"""
+        store = self.stores.get(partition)
+        if store is not None and offset >= store.changelog_offset:
+            store.changelog_offset = offset + 1
+
+    def maybe_snapshot(self, force: bool = False):
+        """Snapshot stores older than STATE_SNAPSHOT_SECONDS (blocking file I/O)"""
+        now = monotonic()
+        for store in list(self.stores.values()):
+            if force or now - store.last_snapshot >= settings.STATE_SNAPSHOT_SECONDS:
+                store.evict_idle(settings.STATE_CARD_TTL_HOURS * 3600)
+                self._write_snapshot(store)
+
+    def close(self):
+        close = getattr(self.changelog_reader, "close", None)
+        if close is not None:
+            close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "partitions": sorted(self.stores),
+            "cards": sum(len(store.cards) for store in self.stores.values()),
+            "restored_records": self.restored_records,
+            "handoffs": self.handoffs
+        }
+
+
+class KafkaChangelogReader:
+    """Reads a changelog partition up to its end offset with a group-less consumer"""
+
+    def __init__(self, changelog_topic: Optional[str] = None):
+        self.changelog_topic = changelog_topic or settings.STATE_CHANGELOG_TOPIC
+        self.consumer = None
+
+    def __call__(self, partition: int, from_offset: int) -> Iterable[Tuple[int, bytes, Optional[bytes]]]:
+        from kafka import TopicPartition
+
+        from ..utils.kafka_client import new_consumer
+
+        if self.consumer is None:
+            self.consumer = new_consumer([], None, enable_auto_commit=False, auto_offset_reset="earliest")
+        tp = TopicPartition(self.changelog_topic, partition)
+        self.consumer.assign([tp])
+        end = self.consumer.end_offsets([tp])[tp]
+        if from_offset >= end:
+            return
+        self.consumer.seek(tp, from_offset)
+        while self.consumer.position(tp) < end:
+            for record in self.consumer.poll(timeout_ms=1000).get(tp, []):
+                if record.offset < end:
+                    yield record.offset, record.key, record.value
+
+    def close(self):
+        if self.consumer is not None:
+            self.consumer.close()
+            self.consumer = None